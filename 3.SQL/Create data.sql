@@ -1,3 +1,5 @@
+-- !!! CHỈ DÙNG DỰNG LẠI DB THỬ NGHIỆM: XÓA + TRUNCATE TOÀN BỘ DỮ LIỆU !!!
+-- DB production: python -m db.migrate up (db/migrations/)
 -- XÓA CÁC OBJECT CŨ (AN TOÀN)
 DROP VIEW IF EXISTS v_components_full;
 DROP TABLE IF EXISTS audit_log             CASCADE;
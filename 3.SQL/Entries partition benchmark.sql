@@ -0,0 +1,97 @@
+-- === ĐO TRƯỚC / SAU KHI PHÂN VÙNG inventory_entries ===
+-- Chạy trên cùng dữ liệu 2 lần: trước và sau
+--   SELECT inventory_entries_partition_by_month();   (db/migrations/0007_entries_partition.sql)
+-- rồi so 2 bảng kết quả (ms trung bình / lần, số partition bị quét).
+-- Các truy vấn lấy đúng dạng SQL mà modules/search.py sinh ra.
+-- Đổi :team / số lần lặp ở đầu nếu cần. Phép đo ghi hủy mỗi lần chạy
+-- (sub-transaction) → không để lại dữ liệu.
+
+\set team 1
+\set loops 50
+
+CREATE TEMP TABLE IF NOT EXISTS bench_result (
+    label TEXT, partitioned BOOLEAN, loops INTEGER, avg_ms NUMERIC,
+    partitions_scanned INTEGER, measured_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION pg_temp.bench(
+    p_label TEXT, p_sql TEXT, p_loops INTEGER, p_rollback BOOLEAN DEFAULT FALSE)
+RETURNS VOID AS $$
+DECLARE
+    t0 TIMESTAMPTZ;
+    plan JSON;
+    scanned INTEGER;
+BEGIN
+    FOR i IN 0..p_loops LOOP
+        IF i = 1 THEN
+            t0 := clock_timestamp();  -- lần 0 chỉ để làm nóng cache
+        END IF;
+        BEGIN
+            EXECUTE p_sql;
+            IF p_rollback THEN
+                RAISE EXCEPTION 'bench_rollback';
+            END IF;
+        EXCEPTION WHEN raise_exception THEN
+            NULL;
+        END;
+    END LOOP;
+    EXECUTE 'EXPLAIN (FORMAT JSON) ' || p_sql INTO plan;
+    -- Số nút quét trên bảng / partition inventory_entries* trong plan
+    SELECT COUNT(*) INTO scanned
+    FROM regexp_matches(plan::text, '"Relation Name": "inventory_entries[^"]*"', 'g');
+    INSERT INTO bench_result (label, partitioned, loops, avg_ms, partitions_scanned)
+    VALUES (p_label, inventory_entries_is_partitioned(), p_loops,
+            round(EXTRACT(EPOCH FROM clock_timestamp() - t0) * 1000 / p_loops, 3),
+            scanned);
+END;
+$$ LANGUAGE plpgsql;
+
+-- inventory_entries_is_partitioned() chưa có khi đo "trước" trên DB cũ
+CREATE OR REPLACE FUNCTION inventory_entries_is_partitioned()
+RETURNS BOOLEAN AS $$
+    SELECT EXISTS (SELECT 1 FROM pg_partitioned_table
+                   WHERE partrelid = 'public.inventory_entries'::regclass);
+$$ LANGUAGE sql STABLE;
+
+-- 1. Trang đầu lịch sử (search_entries_page, không lọc)
+SELECT pg_temp.bench('first_page', format($q$
+    SELECT id FROM inventory_entries ie WHERE ie.team_id = %s
+    ORDER BY ie.created_at DESC, ie.id DESC LIMIT 201
+$q$, :team), :loops);
+
+-- 2. Trang sâu (keyset sau 1 năm)
+SELECT pg_temp.bench('keyset_1y_back', format($q$
+    SELECT id FROM inventory_entries ie WHERE ie.team_id = %s
+      AND ie.created_at <= NOW() - INTERVAL '1 year'
+      AND (ie.created_at, ie.id) < (NOW() - INTERVAL '1 year', 9223372036854775807)
+    ORDER BY ie.created_at DESC, ie.id DESC LIMIT 201
+$q$, :team), :loops);
+
+-- 3. Lọc 1 tháng (created_from / created_to)
+SELECT pg_temp.bench('one_month', format($q$
+    SELECT id FROM inventory_entries ie WHERE ie.team_id = %s
+      AND ie.created_at >= date_trunc('month', NOW()) - INTERVAL '1 month'
+      AND ie.created_at < date_trunc('month', NOW())
+    ORDER BY ie.created_at DESC, ie.id DESC
+$q$, :team), :loops);
+
+-- 4. Full-text trong 3 tháng gần nhất
+SELECT pg_temp.bench('fts_3_months', format($q$
+    SELECT id FROM inventory_entries ie WHERE ie.team_id = %s
+      AND ie.created_at >= NOW() - INTERVAL '3 months'
+      AND ie.search_vector @@ plainto_tsquery('simple', 'a')
+    ORDER BY ie.created_at DESC, ie.id DESC LIMIT 201
+$q$, :team), :loops);
+
+-- 5. Ghi: 1000 dòng (trigger + index GIN), hủy sau mỗi lần
+SELECT pg_temp.bench('insert_1000_rows', format($q$
+    INSERT INTO inventory_entries (component_id, component_name, group_name,
+        process, model, material, team_id, quantity, movement_type, created_by)
+    SELECT 'BENCH' || g, 'bench ' || g, ARRAY['g'], ARRAY['p'], ARRAY['m'],
+           ARRAY['x'], %s, 1, 'in',
+           (SELECT MIN(id) FROM users)
+    FROM generate_series(1, 1000) g
+$q$, :team), 5, TRUE);
+
+SELECT label, partitioned, loops, avg_ms, partitions_scanned
+FROM bench_result ORDER BY measured_at, label;
@@ -16,10 +16,96 @@ DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{D
 # DATABASE_URL = "host=172.23.8.153 dbname=warehouse_db user=postgres password=wsepc port=5432 sslmode=disable"
 # print(DATABASE_URL)
 
+# Pool kết nối asyncpg dùng chung toàn ứng dụng (db/pool.py)
+DB_POOL_MIN_SIZE = int(os.getenv("WM_DB_POOL_MIN", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("WM_DB_POOL_MAX", "5"))
+DB_POOL_IDLE_TIMEOUT = 300.0        # giây – đóng kết nối rảnh quá lâu
+DB_STATEMENT_CACHE_SIZE = 200       # số prepared statement cache mỗi kết nối
+DB_PREPARED_MAX_SHAPES = 128        # số shape query động theo dõi (db/statements.py)
+DB_CONNECT_TIMEOUT = 10.0
+DB_COMMAND_TIMEOUT = 30.0
+MIGRATION_LOCK_TIMEOUT = "5s"       # migration trong transaction chờ khóa tối đa (db/migrate.py)
+
+# Đo thời gian thao tác DB (db/metrics.py, tab "Hiệu năng DB" cho admin)
+METRICS_ENABLED = True
+METRICS_SLOW_MS = 500.0             # op / câu SQL chậm hơn → ghi nhật ký chậm + log WARNING
+METRICS_EXPLAIN_SLOW = False        # True: EXPLAIN (ANALYZE, BUFFERS) câu SELECT chậm (chạy lại câu đó!)
+METRICS_EXPLAIN_COOLDOWN = 300.0    # giây – mỗi câu SQL chỉ EXPLAIN 1 lần trong khoảng này
+METRICS_SLOW_LOG_SIZE = 100
+LOG_LEVEL = os.getenv("WM_LOG_LEVEL", "WARNING")
+
+# Gom nhiều yêu cầu REFRESH current_stock thành 1 lần (modules/stock_refresh.py)
+STOCK_REFRESH_DEBOUNCE = 3.0       # giây im lặng sau lần ghi cuối
+STOCK_REFRESH_MAX_DELAY = 15.0     # trễ tối đa kể từ lần ghi đầu tiên
+
+# Sinh mã linh kiện (db/migrations/0005_component_id_counter.sql)
+CID_BLOCK_SIZE = 1                 # >1: giữ trước 1 khối số / client (có thể để lại lỗ hổng)
+
+# Phân trang keyset cho bảng lịch sử nhập/xuất (modules/search.py)
+SEARCH_PAGE_SIZE = 200
+# Xuất file trực tiếp từ DB (modules/export.py)
+EXPORT_BATCH_SIZE = 2000           # số dòng / lần fetch cursor + ghi file
+EXPORT_XLSX_ENGINE = "xlsxwriter"  # "xlsxwriter" (constant_memory) | "openpyxl" (write_only)
+# inventory_entries phân vùng theo tháng (db/migrations/0007_entries_partition.sql, tùy chọn)
+ENTRIES_PARTITIONS_AHEAD = 3       # số partition tháng tạo trước khi khởi động
+# Ảnh chụp tồn cuối ngày (db/migrations/0008_stock_snapshot.sql, modules/stock_snapshot.py)
+STOCK_SNAPSHOT_DAYS_BACK = 7       # bù các ngày chưa chụp trong khoảng này
+STOCK_SNAPSHOT_KEEP_DAYS = 90      # ảnh ngày cũ hơn bị xóa (ảnh đầu tháng giữ mãi); 0 = giữ hết
+STOCK_SNAPSHOT_CHECK_INTERVAL = 3600.0  # giây giữa 2 lần kiểm tra mốc mới
+# Tổng hợp nhập/xuất theo tuần/tháng (db/migrations/0009_entry_rollups.sql, modules/rollups.py)
+ROLLUP_REFRESH_INTERVAL = 300.0    # giây giữa 2 lần xử lý hàng đợi
+ROLLUP_BATCH_DAYS = 500            # số (team, ngày) tính lại / transaction
+# Điểm đặt hàng lại / số ngày đủ dùng (modules/reorder.py)
+REORDER_WINDOW_DAYS = 60           # số ngày lịch sử xuất để tính trung bình
+REORDER_RECENT_DAYS = 14           # trung bình ngắn hạn (nhu cầu đang tăng → dùng số lớn hơn)
+REORDER_LEAD_TIME_DAYS = 14        # thời gian chờ hàng về
+REORDER_SERVICE_Z = 1.65           # hệ số tồn an toàn (~95% không thiếu hàng)
+# Bản sao SQLite trên máy để đọc nhanh / khi mạng chậm (modules/local_mirror.py)
+LOCAL_MIRROR_ENABLED = os.getenv("WM_LOCAL_MIRROR", "0") == "1"
+LOCAL_MIRROR_PATH = os.getenv("WM_LOCAL_MIRROR_PATH", os.path.join(
+    os.getenv("LOCALAPPDATA", str(Path.home())), "WarehouseManager", "mirror.sqlite3"))
+LOCAL_MIRROR_ENTRY_DAYS = 90       # số ngày phiếu gần nhất giữ trên máy
+LOCAL_MIRROR_SYNC_INTERVAL = 30.0  # giây giữa 2 lần đồng bộ (có ghi → đồng bộ sớm hơn)
+LOCAL_MIRROR_SYNC_DELAY = 0.5      # giây chờ gom sự kiện change feed trước khi đồng bộ
+LOCAL_MIRROR_OVERLAP = 300.0       # giây lùi mốc updated_at (transaction commit muộn)
+LOCAL_MIRROR_RECONCILE_INTERVAL = 900.0  # giây giữa 2 lần đối soát khóa (dòng bị xóa)
+LOCAL_MIRROR_STALE_AFTER = 120.0   # chưa đồng bộ được quá số giây này → báo "cũ"
+
+# Cache kết quả truy vấn phía client (modules/query_cache.py)
+QUERY_CACHE_TTL = 60.0             # giây
+QUERY_CACHE_MAX_ENTRIES = 128
+QUERY_CACHE_NOTIFY = True          # NOTIFY/LISTEN để xóa cache giữa các client
+
+# Luồng thay đổi giữa các client (modules/change_feed.py)
+CHANGE_FEED_BATCH_DELAY = 0.2      # giây gom sự kiện trước khi đọc lại
+CHANGE_FEED_MAX_BATCH = 500        # nhiều hơn → UI tải lại toàn bộ
+
+# Audit log (modules/audit.py, db/migrations/0006_audit_log_partition.sql)
+AUDIT_WRITE_MODE = "inline"        # "inline": cùng transaction | "deferred": COPY theo lô sau COMMIT
+AUDIT_FLUSH_INTERVAL = 1.0         # giây (deferred)
+AUDIT_FLUSH_BATCH = 500            # đủ số dòng → ghi ngay (deferred)
+AUDIT_PARTITIONS_AHEAD = 3         # số partition tháng tạo trước
+AUDIT_RETENTION_MONTHS = 24        # cũ hơn → tách khỏi audit_log (None = giữ mãi)
+AUDIT_DROP_EXPIRED = False         # False: chuyển sang schema audit_archive, True: DROP
+
+# Gợi ý khi gõ (modules/autocomplete_worker.py)
+AUTOCOMPLETE_DEBOUNCE_MS = 150     # chờ ngừng gõ rồi mới tra
+AUTOCOMPLETE_MIN_CHARS = 2
+
 # Đường dẫn ảnh (nếu vẫn dùng folder mạng)
 IMAGES_USER = os.getenv(
     "WM_IMAGES_BASE", r"D:\Backup data all\Managementdata\Other\inventory_management_images_EOL")
 
+# Cache ảnh thu nhỏ (modules/thumbnail_cache.py) – tránh đọc lại ảnh gốc trên share mạng
+THUMB_MEMORY_BYTES = 64 * 1024 * 1024       # RAM tối đa cho QImage đã thu nhỏ
+THUMB_DISK_DIR = os.getenv("WM_THUMB_CACHE", os.path.join(
+    os.getenv("LOCALAPPDATA", str(Path.home())), "WarehouseManager", "thumbs"))
+THUMB_DISK_MAX_BYTES = 512 * 1024 * 1024
+THUMB_STAT_TTL = 30.0                       # giây nhớ kết quả stat() file gốc
+THUMB_LOADER_THREADS = 3
+THUMB_ZOOM_SIZE = (1600, 1600)              # ảnh dùng cho zoom khi hover
+THUMB_PREFETCH_RADIUS = 2                   # số dòng trên/dưới nạp trước
+
 # Table names/constants (giữ tương đồng với code cũ)
 TABLE_INPUT = "inventory_entries"
 TABLE_USERS = "users"
@@ -4,8 +4,8 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text  # ← QUAN TRỌNG
 from config.settings import DATABASE_URL
+from db.sync_wrapper import run_async
 import pandas as pd
-import asyncio
 
 
 engine = create_async_engine(
@@ -28,7 +28,7 @@ async def get_session():
 
 class DatabaseHandler:
     def read_data(self, table_name: str, columns: list):
-        return asyncio.run(self._read_async(table_name, columns))
+        return run_async(self._read_async(table_name, columns), timeout=None)
 
     async def _read_async(self, table_name: str, columns: list):
         async with get_session() as session:
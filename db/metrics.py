@@ -0,0 +1,285 @@
+# warehouse_app/db/metrics.py
+"""
+ĐO THỜI GIAN CÁC THAO TÁC DB (modules/*.py)
+- instrument_module(__name__) ở cuối mỗi module: bọc mọi hàm async công khai
+  → mỗi "op" (vd. inventory.add_entry) có histogram độ trễ, số lần lỗi,
+  số dòng trả về, thời gian chờ kết nối pool (db/pool.py báo về op đang chạy)
+- Query logger của asyncpg (>= 0.29): thời gian từng câu SQL; câu chậm hơn
+  METRICS_SLOW_MS được ghi vào nhật ký chậm, tùy chọn chạy
+  EXPLAIN (ANALYZE, BUFFERS) trong transaction READ ONLY (chỉ câu SELECT)
+- snapshot() / dump_json() cho tab quản trị (modules/ui/admin_tab.py)
+Ghi số liệu trên loop nền, đọc từ GUI thread → có khóa.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config.settings import (
+    METRICS_ENABLED, METRICS_SLOW_MS, METRICS_EXPLAIN_SLOW,
+    METRICS_EXPLAIN_COOLDOWN, METRICS_SLOW_LOG_SIZE,
+)
+
+logger = logging.getLogger("warehouse.db")
+
+# Cận trên các ô histogram (ms), ô cuối = lớn hơn mọi cận
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+_READ_ONLY_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITE_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+UPDATE|nextval|setval)\b",
+                       re.IGNORECASE)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """Ước lượng theo cận trên của ô (ô cuối → max thực tế)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class OpStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = Histogram()
+        self.errors = 0
+        self.last_error = ""
+        self.rows = 0
+        self.statements = 0
+        self.sql_ms = 0.0
+        self.pool_waits = 0
+        self.pool_wait_ms = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        h = self.latency
+        return {
+            "op": self.name,
+            "calls": h.count,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "avg_ms": round(h.total_ms / h.count, 3) if h.count else 0.0,
+            "p50_ms": h.percentile(0.5),
+            "p95_ms": h.percentile(0.95),
+            "max_ms": round(h.max_ms, 3),
+            "total_ms": round(h.total_ms, 3),
+            "rows": self.rows,
+            "statements": self.statements,
+            "sql_ms": round(self.sql_ms, 3),
+            "pool_waits": self.pool_waits,
+            "pool_wait_ms": round(self.pool_wait_ms, 3),
+            "histogram": dict(zip([f"<={b}" for b in BUCKETS_MS] + ["inf"],
+                                  h.counts)),
+        }
+
+
+def _count_rows(result: Any) -> int:
+    if isinstance(result, (list, tuple, set)):
+        return len(result)
+    if isinstance(result, dict):
+        rows = result.get("rows")
+        return len(rows) if isinstance(rows, list) else 1
+    return 0
+
+
+class Metrics:
+    def __init__(self, slow_ms: float = METRICS_SLOW_MS,
+                 explain_slow: bool = METRICS_EXPLAIN_SLOW):
+        self.slow_ms = slow_ms
+        self.explain_slow = explain_slow
+        self._lock = threading.Lock()
+        self._ops: Dict[str, OpStats] = {}
+        self._slow: deque = deque(maxlen=METRICS_SLOW_LOG_SIZE)
+        self._explained: Dict[str, float] = {}  # sql → lần EXPLAIN gần nhất
+        self._current: contextvars.ContextVar[Optional[OpStats]] = (
+            contextvars.ContextVar("db_metrics_op", default=None))
+        self.started_at = datetime.now()
+
+    def _op(self, name: str) -> OpStats:
+        op = self._ops.get(name)
+        if op is None:
+            with self._lock:
+                op = self._ops.setdefault(name, OpStats(name))
+        return op
+
+    # -------------------------------------------------------------
+    # Bọc hàm async
+    # -------------------------------------------------------------
+    def timed(self, name: str):
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                op = self._op(name)
+                token = self._current.set(op)
+                started = time.perf_counter()
+                result = error = None
+                try:
+                    result = await func(*args, **kwargs)
+                    return result
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    self._current.reset(token)
+                    ms = (time.perf_counter() - started) * 1000
+                    with self._lock:
+                        op.latency.add(ms)
+                        if error is not None:
+                            op.errors += 1
+                            op.last_error = f"{type(error).__name__}: {error}"[:300]
+                        else:
+                            op.rows += _count_rows(result)
+                    if ms >= self.slow_ms:
+                        logger.warning("[DB] %s chậm: %.0f ms", name, ms)
+
+            wrapper.metrics_name = name
+            return wrapper
+        return decorator
+
+    # -------------------------------------------------------------
+    # Hook từ db/pool.py
+    # -------------------------------------------------------------
+    def record_pool_wait(self, seconds: float):
+        op = self._current.get()
+        if op is None:
+            op = self._op("(ngoài op)")
+        with self._lock:
+            op.pool_waits += 1
+            op.pool_wait_ms += seconds * 1000
+
+    def attach(self, conn):
+        """Gắn query logger cho kết nối mới của pool."""
+        if METRICS_ENABLED and hasattr(conn, "add_query_logger"):
+            conn.add_query_logger(self._on_query)
+
+    def _on_query(self, record):
+        # asyncpg gọi qua loop.call_soon → chạy trong context của op gọi query
+        op = self._current.get()
+        ms = record.elapsed * 1000
+        if op is not None:
+            with self._lock:
+                op.statements += 1
+                op.sql_ms += ms
+        if ms < self.slow_ms:
+            return
+        entry = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "op": op.name if op is not None else None,
+            "elapsed_ms": round(ms, 3),
+            "sql": " ".join(record.query.split())[:2000],
+            "error": repr(record.exception) if record.exception else None,
+            "plan": None,
+        }
+        with self._lock:
+            self._slow.append(entry)
+        if self.explain_slow and record.exception is None and self._can_explain(record.query):
+            asyncio.get_running_loop().create_task(
+                self._explain(entry, record.query, record.args))
+
+    def _can_explain(self, sql: str) -> bool:
+        if not _READ_ONLY_RE.match(sql) or _WRITE_RE.search(sql):
+            return False  # ANALYZE chạy thật câu lệnh → chỉ câu đọc
+        now = time.monotonic()
+        last = self._explained.get(sql)
+        if last is not None and now - last < METRICS_EXPLAIN_COOLDOWN:
+            return False
+        self._explained[sql] = now
+        return True
+
+    async def _explain(self, entry: Dict[str, Any], sql: str, args):
+        from db.pool import acquire  # tránh import vòng (pool → metrics)
+        try:
+            async with acquire() as conn:
+                async with conn.transaction(readonly=True):
+                    rows = await conn.fetch(
+                        "EXPLAIN (ANALYZE, BUFFERS) " + sql, *(args or ()))
+            entry["plan"] = "\n".join(r[0] for r in rows)
+        except Exception as e:
+            entry["plan"] = f"(EXPLAIN lỗi: {e})"
+
+    # -------------------------------------------------------------
+    # Đọc số liệu
+    # -------------------------------------------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        from db.pool import get_pool_stats
+        with self._lock:
+            ops = [op.snapshot() for op in self._ops.values()]
+            slow = [dict(e) for e in self._slow]
+        ops.sort(key=lambda o: o["total_ms"], reverse=True)
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "slow_ms": self.slow_ms,
+            "pool": get_pool_stats(),
+            "ops": ops,
+            "slow": slow[::-1],  # mới nhất trước
+        }
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+            self._slow.clear()
+            self._explained.clear()
+            self.started_at = datetime.now()
+
+    def dump_json(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2, default=str)
+        return path
+
+
+metrics = Metrics()
+
+
+def instrument_module(module_name: str, exclude=()) -> List[str]:
+    """
+    Bọc mọi hàm async công khai định nghĩa trong module (gọi ở CUỐI module,
+    trước khi nơi khác import tên hàm). Tên op = "<module>.<hàm>".
+    """
+    if not METRICS_ENABLED:
+        return []
+    module = sys.modules[module_name]
+    short = module_name.rsplit(".", 1)[-1]
+    wrapped = []
+    for attr, func in list(vars(module).items()):
+        if (attr.startswith("_") or attr in exclude
+                or not inspect.iscoroutinefunction(func)
+                or getattr(func, "__module__", None) != module_name
+                or hasattr(func, "metrics_name")):
+            continue
+        setattr(module, attr, metrics.timed(f"{short}.{attr}")(func))
+        wrapped.append(attr)
+    return wrapped
+
+
+def get_metrics() -> Dict[str, Any]:
+    return metrics.snapshot()
@@ -0,0 +1,349 @@
+# warehouse_app/db/migrate.py
+"""
+CHẠY MIGRATION LƯỢC ĐỒ THEO PHIÊN BẢN (db/migrations/NNNN_ten.sql)
+- Bảng schema_migrations ghi phiên bản đã chạy + checksum + thời gian
+- File thường: chạy trọn trong 1 transaction (lock_timeout ngắn → không xếp
+  hàng chặn các client khi bảng đang bận)
+- File có dòng "-- migrate: no-transaction": tách từng câu, chạy ngoài
+  transaction; CREATE INDEX CONCURRENTLY được build online:
+    * index cũ bị INVALID (lần build trước bị ngắt) → DROP CONCURRENTLY, build lại
+    * bảng phân vùng → index ON ONLY bảng cha + CONCURRENTLY từng partition + ATTACH
+- pg_advisory_lock: 2 người chạy cùng lúc không đè nhau
+
+    python -m db.migrate status
+    python -m db.migrate up [--target 5]
+    python -m db.migrate baseline 7      # DB cũ đã chạy tay các script
+    python -m db.migrate check-indexes   # liệt kê index INVALID
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from db.pool import connect_dedicated
+from config.settings import MIGRATION_LOCK_TIMEOUT
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_LOCK_KEY = 74_200
+NO_TRANSACTION_MARK = "-- migrate: no-transaction"
+
+_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_INDEX_RE = re.compile(
+    r"^CREATE\s+(?P<unique>UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    r"(?P<name>\w+)\s+ON\s+(?:ONLY\s+)?(?P<table>\w+)\s+(?P<rest>.+)$",
+    re.IGNORECASE | re.DOTALL)
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, version: int, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, encoding="utf-8") as f:
+            self.sql = f.read().replace("\r\n", "\n")
+        self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+        self.transactional = NO_TRANSACTION_MARK not in self.sql
+
+    def __repr__(self):
+        return f"<Migration {self.version:04d}_{self.name}>"
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for fname in sorted(os.listdir(directory)):
+        m = _FILE_RE.match(fname)
+        if m:
+            migrations.append(Migration(int(m.group(1)), m.group(2),
+                                        os.path.join(directory, fname)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Trùng số phiên bản trong {directory}")
+    return migrations
+
+
+# ----------------------------------------------------------------------
+# Tách câu lệnh (cho file no-transaction)
+# ----------------------------------------------------------------------
+def split_statements(sql: str) -> List[str]:
+    """Tách theo ';' ngoài chuỗi ('...', E'...', "..."), comment và $tag$...$tag$."""
+    statements = []
+    buf: List[str] = []
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j < 0 else j + 1
+            buf.append("\n")
+            continue
+        if sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            buf.append(" ")
+            continue
+        if ch in ("'", '"'):
+            # E'...': \' / \\ là ký tự thoát (E đứng riêng, không thuộc tên khác)
+            escape = (ch == "'" and i > 0 and sql[i - 1] in "Ee"
+                      and (i < 2 or not (sql[i - 2].isalnum() or sql[i - 2] == "_")))
+            j = i + 1
+            while j < n:
+                if escape and sql[j] == "\\":
+                    j += 2
+                    continue
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:  # '' / "" là ký tự thoát
+                        j += 2
+                        continue
+                    break
+                j += 1
+            buf.append(sql[i:j + 1])
+            i = j + 1
+            continue
+        if ch == "$":
+            m = re.match(r"\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$", sql[i:])
+            if m:
+                tag = m.group(0)
+                j = sql.find(tag, i + len(tag))
+                j = n if j < 0 else j + len(tag)
+                buf.append(sql[i:j])
+                i = j
+                continue
+        if ch == ";":
+            stmt = "".join(buf).strip()
+            if stmt:
+                statements.append(stmt)
+            buf = []
+            i += 1
+            continue
+        buf.append(ch)
+        i += 1
+    stmt = "".join(buf).strip()
+    if stmt:
+        statements.append(stmt)
+    return statements
+
+
+# ----------------------------------------------------------------------
+# Index online
+# ----------------------------------------------------------------------
+async def invalid_indexes(conn) -> List[Dict[str, Any]]:
+    """Index INVALID (CONCURRENTLY bị ngắt / lỗi) – tốn công ghi, planner không dùng."""
+    rows = await conn.fetch("""
+        SELECT c.relname AS index_name, t.relname AS table_name,
+               pg_relation_size(c.oid) AS bytes
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace s ON s.oid = c.relnamespace
+        WHERE NOT i.indisvalid AND s.nspname = 'public'
+          AND t.relkind <> 'p'  -- index ON ONLY bảng cha: hợp lệ khi đủ partition
+        ORDER BY 2, 1
+    """)
+    return [dict(r) for r in rows]
+
+
+async def _index_state(conn, name: str) -> Optional[bool]:
+    """None = chưa có, True = hợp lệ, False = INVALID."""
+    return await conn.fetchval("""
+        SELECT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1 AND c.relnamespace = 'public'::regnamespace
+    """, name)
+
+
+async def build_index_online(conn, unique: bool, name: str, table: str, rest: str) -> str:
+    """
+    CREATE INDEX CONCURRENTLY (không khóa ghi). Trả về 'exists' | 'built' | 'rebuilt'.
+    Bảng phân vùng không hỗ trợ CONCURRENTLY trực tiếp → build từng partition.
+    """
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    partitioned = await conn.fetchval(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass($1)", table)
+
+    if partitioned:
+        if await _index_state(conn, name):
+            return "exists"
+        # Index cha ON ONLY (tạm INVALID, không build dữ liệu) – tức thì
+        await conn.execute(f"CREATE {kind} IF NOT EXISTS {name} ON ONLY {table} {rest}")
+        parts = await conn.fetch("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass($1)
+            ORDER BY 1
+        """, table)
+        result = "exists"
+        for p in parts:
+            part = p["relname"]
+            child = f"{part}_{name}"[:63]
+            attached = await conn.fetchval("""
+                SELECT EXISTS (SELECT 1 FROM pg_inherits
+                               WHERE inhparent = to_regclass($1)
+                                 AND inhrelid = to_regclass($2))
+            """, name, child)
+            if attached:
+                continue
+            if await build_index_online(conn, unique, child, part, rest) != "exists":
+                result = "built"
+            await conn.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+        if not await _index_state(conn, name):
+            raise MigrationError(f"Index {name} chưa hợp lệ sau khi gắn partition")
+        return result
+
+    state = await _index_state(conn, name)
+    if state:
+        return "exists"
+    if state is False:
+        print(f"[MIGRATE] {name} INVALID → build lại")
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    started = time.perf_counter()
+    await conn.execute(f"CREATE {kind} CONCURRENTLY {name} ON {table} {rest}")
+    if not await _index_state(conn, name):
+        raise MigrationError(f"Index {name} INVALID sau khi build")
+    print(f"[MIGRATE] index {name} trên {table}: {time.perf_counter() - started:.1f}s")
+    return "built" if state is None else "rebuilt"
+
+
+# ----------------------------------------------------------------------
+# Chạy migration
+# ----------------------------------------------------------------------
+async def _ensure_table(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            duration_ms INTEGER
+        )
+    """)
+
+
+async def _applied(conn) -> Dict[int, Dict[str, Any]]:
+    rows = await conn.fetch("SELECT * FROM schema_migrations ORDER BY version")
+    return {r["version"]: dict(r) for r in rows}
+
+
+async def _record(conn, m: Migration, duration_ms: Optional[int]):
+    await conn.execute("""
+        INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+        VALUES ($1, $2, $3, $4)
+    """, m.version, m.name, m.checksum, duration_ms)
+
+
+async def _apply(conn, m: Migration):
+    started = time.perf_counter()
+    if m.transactional:
+        async with conn.transaction():
+            # Chờ khóa quá lâu → hủy thay vì chặn mọi câu lệnh xếp sau nó
+            await conn.execute(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'")
+            await conn.execute(m.sql)
+            await _record(conn, m, int((time.perf_counter() - started) * 1000))
+        return
+
+    # Ngoài transaction: mỗi câu tự commit, chạy lại an toàn (IF NOT EXISTS)
+    for stmt in split_statements(m.sql):
+        idx = _INDEX_RE.match(stmt)
+        if idx:
+            await build_index_online(conn, bool(idx.group("unique")), idx.group("name"),
+                                     idx.group("table"), idx.group("rest").strip())
+        else:
+            await conn.execute(stmt)
+    await _record(conn, m, int((time.perf_counter() - started) * 1000))
+
+
+async def status() -> List[Dict[str, Any]]:
+    conn = await connect_dedicated()
+    try:
+        await _ensure_table(conn)
+        applied = await _applied(conn)
+    finally:
+        await conn.close()
+    result = []
+    for m in load_migrations():
+        row = applied.get(m.version)
+        result.append({
+            "version": m.version,
+            "name": m.name,
+            "applied_at": row["applied_at"] if row else None,
+            # File đã sửa sau khi chạy → cần migration mới thay vì sửa file cũ
+            "modified": bool(row) and row["checksum"] != m.checksum,
+        })
+    return result
+
+
+async def migrate(target: Optional[int] = None, baseline: bool = False) -> List[int]:
+    """Chạy các migration chưa áp dụng (<= target). baseline: chỉ ghi nhận, không chạy."""
+    migrations = [m for m in load_migrations() if target is None or m.version <= target]
+    conn = await connect_dedicated()
+    done = []
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_KEY)
+        try:
+            await _ensure_table(conn)
+            applied = await _applied(conn)
+            for m in migrations:
+                row = applied.get(m.version)
+                if row is not None:
+                    if row["checksum"] != m.checksum:
+                        print(f"[MIGRATE] CẢNH BÁO: {m!r} đã sửa sau khi chạy")
+                    continue
+                if baseline:
+                    await _record(conn, m, None)
+                else:
+                    print(f"[MIGRATE] Chạy {m!r}")
+                    await _apply(conn, m)
+                done.append(m.version)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_KEY)
+    finally:
+        await conn.close()
+    return done
+
+
+async def check_indexes() -> List[Dict[str, Any]]:
+    conn = await connect_dedicated()
+    try:
+        return await invalid_indexes(conn)
+    finally:
+        await conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m db.migrate")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    up = sub.add_parser("up")
+    up.add_argument("--target", type=int)
+    base = sub.add_parser("baseline")
+    base.add_argument("version", type=int)
+    sub.add_parser("check-indexes")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "status":
+        for row in asyncio.run(status()):
+            state = row["applied_at"] or "chưa chạy"
+            flag = "  (ĐÃ SỬA)" if row["modified"] else ""
+            print(f"{row['version']:04d}_{row['name']:<28} {state}{flag}")
+    elif args.cmd == "up":
+        done = asyncio.run(migrate(args.target))
+        print(f"[MIGRATE] Đã chạy {len(done)} migration")
+    elif args.cmd == "baseline":
+        done = asyncio.run(migrate(args.version, baseline=True))
+        print(f"[MIGRATE] Ghi nhận {len(done)} migration (không chạy)")
+    elif args.cmd == "check-indexes":
+        rows = asyncio.run(check_indexes())
+        for r in rows:
+            print(f"INVALID {r['index_name']} ON {r['table_name']} ({r['bytes']} bytes)")
+        if not rows:
+            print("Không có index INVALID")
+
+
+if __name__ == "__main__":
+    main()
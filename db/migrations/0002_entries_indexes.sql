@@ -0,0 +1,39 @@
+-- migrate: no-transaction
+-- === 0002 INDEX inventory_entries (BUILD ONLINE) ===
+-- Mỗi câu chạy riêng, ngoài transaction (db/migrate.py): CONCURRENTLY không
+-- khóa ghi inventory_entries. Index hỏng do lần build trước bị ngắt (invalid)
+-- được DROP + build lại; bảng đã phân vùng → build từng partition rồi ATTACH.
+-- Các index 1 cột cũ (team_id, created_at, movement_type, status, component_id)
+-- không tạo trên DB mới: đã có index ghép / cắt tỉa partition thay thế.
+
+-- Phân trang keyset (modules/search.py): ORDER BY created_at DESC, id DESC
+-- + lọc "(created_at, id) < (...)" → đọc thẳng theo index, không OFFSET.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_team_created_id
+    ON inventory_entries (team_id, created_at DESC, id DESC);
+
+-- Tồn kho / giao dịch mới nhất theo mã (stock_balance_apply)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_stock_query
+    ON inventory_entries (team_id, component_id, created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_created_by
+    ON inventory_entries (created_by);
+
+-- GIN cho array
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_group_gin
+    ON inventory_entries USING GIN (group_name);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_process_gin
+    ON inventory_entries USING GIN (process);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_material_gin
+    ON inventory_entries USING GIN (material);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_model_gin
+    ON inventory_entries USING GIN (model);
+
+-- Trigram: autocomplete tên + tìm theo mã
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_name_trgm
+    ON inventory_entries USING GIN (component_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_component_id_trgm
+    ON inventory_entries USING GIN (component_id gin_trgm_ops);
+
+-- Full-text search
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_search_gin
+    ON inventory_entries USING GIN (search_vector);
@@ -0,0 +1,151 @@
+-- === BẢNG TỒN KHO CẬP NHẬT TĂNG DẦN (stock_balance) ===
+-- Thay cho REFRESH MATERIALIZED VIEW current_stock sau mỗi lần ghi:
+-- trigger trên inventory_entries cộng/trừ đúng 1 dòng (team_id, component_id)
+-- → mỗi lần ghi tốn O(1) thay vì tính lại toàn bộ bảng.
+-- current_stock (materialized view) vẫn giữ lại cho báo cáo cũ.
+
+CREATE TABLE IF NOT EXISTS stock_balance (
+    team_id INTEGER NOT NULL REFERENCES teams(id),
+    component_id VARCHAR(100) NOT NULL,
+    -- Thuộc tính lấy từ giao dịch mới nhất (giống current_stock)
+    component_name TEXT,
+    group_name TEXT[] DEFAULT '{}',
+    process TEXT[] DEFAULT '{}',
+    model TEXT[] DEFAULT '{}',
+    size TEXT,
+    unit TEXT,
+    material TEXT[] DEFAULT '{}',
+    storage_location TEXT,
+    invoice TEXT,
+    modinvoice TEXT,
+    status TEXT,
+    note TEXT,
+    created_by INTEGER,
+    created_at TIMESTAMPTZ,
+    -- Tổng in/adjustment trừ out
+    current_quantity BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (team_id, component_id)
+);
+
+-- Chỉ các mã còn tồn (get_current_stock / search_current_stock)
+CREATE INDEX IF NOT EXISTS idx_stock_balance_in_stock
+ON stock_balance (team_id, component_id) WHERE current_quantity > 0;
+
+CREATE INDEX IF NOT EXISTS idx_stock_balance_name_trgm
+ON stock_balance USING GIN (component_name gin_trgm_ops);
+
+-- Số lượng có dấu của 1 giao dịch (out → âm)
+CREATE OR REPLACE FUNCTION entry_signed_quantity(p_movement_type TEXT, p_quantity BIGINT)
+RETURNS BIGINT AS $$
+    SELECT CASE WHEN p_movement_type = 'out' THEN -p_quantity ELSE p_quantity END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Cộng delta vào 1 dòng tồn + lấy thuộc tính từ giao dịch mới nhất
+-- (dùng idx_entries_stock_query (team_id, component_id, created_at))
+CREATE OR REPLACE FUNCTION stock_balance_apply(p_team_id INTEGER, p_component_id TEXT, p_delta BIGINT)
+RETURNS VOID AS $$
+DECLARE
+    latest inventory_entries%ROWTYPE;
+BEGIN
+    SELECT * INTO latest
+    FROM inventory_entries
+    WHERE team_id = p_team_id AND component_id = p_component_id
+    ORDER BY created_at DESC, id DESC
+    LIMIT 1;
+
+    -- Không còn giao dịch nào → bỏ dòng tồn
+    IF NOT FOUND THEN
+        DELETE FROM stock_balance
+        WHERE team_id = p_team_id AND component_id = p_component_id;
+        RETURN;
+    END IF;
+
+    INSERT INTO stock_balance AS sb (
+        team_id, component_id, component_name, group_name, process, model,
+        size, unit, material, storage_location, invoice, modinvoice, status,
+        note, created_by, created_at, current_quantity, updated_at
+    )
+    VALUES (
+        p_team_id, p_component_id, latest.component_name, latest.group_name,
+        latest.process, latest.model, latest.size, latest.unit, latest.material,
+        latest.storage_location, latest.invoice, latest.modinvoice, latest.status,
+        latest.note, latest.created_by, latest.created_at, p_delta, NOW()
+    )
+    ON CONFLICT (team_id, component_id) DO UPDATE SET
+        component_name = EXCLUDED.component_name,
+        group_name = EXCLUDED.group_name,
+        process = EXCLUDED.process,
+        model = EXCLUDED.model,
+        size = EXCLUDED.size,
+        unit = EXCLUDED.unit,
+        material = EXCLUDED.material,
+        storage_location = EXCLUDED.storage_location,
+        invoice = EXCLUDED.invoice,
+        modinvoice = EXCLUDED.modinvoice,
+        status = EXCLUDED.status,
+        note = EXCLUDED.note,
+        created_by = EXCLUDED.created_by,
+        created_at = EXCLUDED.created_at,
+        current_quantity = sb.current_quantity + EXCLUDED.current_quantity,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger: INSERT cộng, DELETE trừ, UPDATE trừ dòng cũ + cộng dòng mới
+CREATE OR REPLACE FUNCTION trg_stock_balance()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM stock_balance_apply(
+            OLD.team_id, OLD.component_id,
+            -entry_signed_quantity(OLD.movement_type, OLD.quantity));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM stock_balance_apply(
+            NEW.team_id, NEW.component_id,
+            entry_signed_quantity(NEW.movement_type, NEW.quantity));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trig_stock_balance ON inventory_entries;
+CREATE TRIGGER trig_stock_balance
+AFTER INSERT OR UPDATE OR DELETE ON inventory_entries
+FOR EACH ROW EXECUTE FUNCTION trg_stock_balance();
+
+-- Dựng lại toàn bộ (lần đầu / đối soát). Khóa ghi trong lúc dựng.
+CREATE OR REPLACE FUNCTION stock_balance_rebuild()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE inventory_entries IN SHARE MODE;
+    DELETE FROM stock_balance;
+
+    INSERT INTO stock_balance (
+        team_id, component_id, component_name, group_name, process, model,
+        size, unit, material, storage_location, invoice, modinvoice, status,
+        note, created_by, created_at, current_quantity, updated_at
+    )
+    SELECT
+        la.team_id, la.component_id, la.component_name, la.group_name,
+        la.process, la.model, la.size, la.unit, la.material,
+        la.storage_location, la.invoice, la.modinvoice, la.status, la.note,
+        la.created_by, la.created_at, s.qty, NOW()
+    FROM (
+        SELECT DISTINCT ON (team_id, component_id) *
+        FROM inventory_entries
+        ORDER BY team_id, component_id, created_at DESC, id DESC
+    ) la
+    JOIN (
+        SELECT team_id, component_id,
+               SUM(entry_signed_quantity(movement_type, quantity)) AS qty
+        FROM inventory_entries
+        GROUP BY team_id, component_id
+    ) s USING (team_id, component_id);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lần đầu (bảng còn trống) mới dựng; migration đã chạy trong 1 transaction
+SELECT stock_balance_rebuild()
+WHERE NOT EXISTS (SELECT 1 FROM stock_balance);
@@ -0,0 +1,32 @@
+-- === LUỒNG THAY ĐỔI GIỮA CÁC CLIENT (LISTEN/NOTIFY) ===
+-- Mỗi dòng inventory_entries được thêm / sửa / xóa → NOTIFY 'inventory_changes'
+-- với payload nhỏ (team, id, thao tác, mã linh kiện). Client (modules/change_feed.py)
+-- gom các sự kiện rồi đọc lại đúng các dòng đó → cập nhật bảng đang mở tại chỗ.
+-- NOTIFY chỉ được gửi khi transaction COMMIT, ROLLBACK thì không gửi gì.
+
+CREATE OR REPLACE FUNCTION trg_notify_inventory_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        r := OLD;
+    ELSE
+        r := NEW;
+    END IF;
+
+    PERFORM pg_notify('inventory_changes', json_build_object(
+        'team_id', r.team_id,
+        'id', r.id,
+        'op', left(TG_OP, 1),                       -- I / U / D
+        'component_id', r.component_id,
+        'old_component_id', CASE WHEN TG_OP = 'UPDATE' THEN OLD.component_id END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trig_notify_inventory_change ON inventory_entries;
+CREATE TRIGGER trig_notify_inventory_change
+AFTER INSERT OR UPDATE OR DELETE ON inventory_entries
+FOR EACH ROW EXECUTE FUNCTION trg_notify_inventory_change();
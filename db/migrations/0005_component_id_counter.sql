@@ -0,0 +1,91 @@
+-- === BỘ ĐẾM MÃ LINH KIỆN THEO TIỀN TỐ VỊ TRÍ (modules/inventory.py) ===
+-- Thay cho MAX(CAST(RIGHT(component_id, 3) AS INTEGER)) quét inventory_entries
+-- mỗi lần tick "tự sinh mã": 1 dòng đếm / tiền tố, cấp số bằng UPDATE ... RETURNING
+-- → O(1), 2 người cùng sinh mã không bao giờ nhận trùng số.
+-- Mã nhập tay / nhập từ file (bulk_import) đẩy bộ đếm lên qua trigger
+-- trig_component_id_counter → số cấp sau luôn lớn hơn mọi mã đã có.
+
+CREATE TABLE IF NOT EXISTS component_id_counters (
+    prefix TEXT PRIMARY KEY,                 -- vd. 'VE02' (từ cuối storage_location)
+    last_value INTEGER NOT NULL DEFAULT 0,   -- số đã cấp lớn nhất
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Khởi tạo từ mã đã có (chạy lại nhiều lần vẫn an toàn)
+INSERT INTO component_id_counters (prefix, last_value)
+SELECT LEFT(component_id, LENGTH(component_id) - 3),
+       MAX(CAST(RIGHT(component_id, 3) AS INTEGER))
+FROM inventory_entries
+WHERE component_id ~ '^[A-Z0-9]{3,}[0-9]{3}$'
+GROUP BY 1
+ON CONFLICT (prefix) DO UPDATE
+    SET last_value = GREATEST(component_id_counters.last_value, EXCLUDED.last_value);
+
+-- Cấp p_count số liên tiếp, trả về số LỚN NHẤT đã cấp
+-- (các số được cấp: kết quả - p_count + 1 .. kết quả)
+CREATE OR REPLACE FUNCTION allocate_component_ids(p_prefix TEXT, p_count INTEGER DEFAULT 1)
+RETURNS INTEGER AS $$
+DECLARE
+    v_last INTEGER;
+BEGIN
+    UPDATE component_id_counters
+    SET last_value = last_value + p_count, updated_at = NOW()
+    WHERE prefix = p_prefix
+    RETURNING last_value INTO v_last;
+    IF FOUND THEN
+        RETURN v_last;
+    END IF;
+
+    -- Tiền tố mới: khởi tạo từ dữ liệu cũ (chỉ 1 lần cho mỗi tiền tố).
+    -- So sánh bằng LEFT(...) = p_prefix, không ghép regex/LIKE (tiền tố lấy
+    -- từ storage_location, có thể chứa . ( + % _)
+    INSERT INTO component_id_counters AS c (prefix, last_value)
+    SELECT p_prefix, COALESCE(MAX(CAST(RIGHT(component_id, 3) AS INTEGER)), 0) + p_count
+    FROM inventory_entries
+    WHERE LENGTH(component_id) = LENGTH(p_prefix) + 3
+      AND LEFT(component_id, LENGTH(p_prefix)) = p_prefix
+      AND RIGHT(component_id, 3) ~ '^[0-9]{3}$'
+    ON CONFLICT (prefix) DO UPDATE
+        SET last_value = c.last_value + p_count, updated_at = NOW()
+    RETURNING last_value INTO v_last;
+    RETURN v_last;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trả lại số vừa cấp nếu chưa dùng (hủy tạo mới) – chỉ khi chưa ai cấp tiếp
+-- và chưa ai nhập tay đúng mã đó
+CREATE OR REPLACE FUNCTION release_component_id(p_prefix TEXT, p_value INTEGER)
+RETURNS BOOLEAN AS $$
+    WITH upd AS (
+        UPDATE component_id_counters
+        SET last_value = last_value - 1, updated_at = NOW()
+        WHERE prefix = p_prefix AND last_value = p_value
+          AND NOT EXISTS (
+              SELECT 1 FROM inventory_entries
+              WHERE component_id = p_prefix || lpad(p_value::text, 3, '0'))
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM upd);
+$$ LANGUAGE sql;
+
+-- Mã ghi vào inventory_entries không qua allocate_component_ids (nhập tay khi
+-- bỏ tick "tự sinh mã", bulk_import) → đẩy bộ đếm của tiền tố lên ít nhất
+-- bằng số của mã đó. Chỉ ghi khi số lớn hơn (thường không ghi, không khóa);
+-- tiền tố chưa có bộ đếm thì bỏ qua (lần cấp đầu tự khởi tạo từ MAX).
+CREATE OR REPLACE FUNCTION trg_component_id_counter()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF LENGTH(NEW.component_id) >= 6 AND RIGHT(NEW.component_id, 3) ~ '^[0-9]{3}$' THEN
+        UPDATE component_id_counters
+        SET last_value = CAST(RIGHT(NEW.component_id, 3) AS INTEGER), updated_at = NOW()
+        WHERE prefix = LEFT(NEW.component_id, LENGTH(NEW.component_id) - 3)
+          AND last_value < CAST(RIGHT(NEW.component_id, 3) AS INTEGER);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trig_component_id_counter ON inventory_entries;
+CREATE TRIGGER trig_component_id_counter
+AFTER INSERT OR UPDATE OF component_id ON inventory_entries
+FOR EACH ROW EXECUTE FUNCTION trg_component_id_counter();
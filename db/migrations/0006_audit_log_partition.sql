@@ -0,0 +1,143 @@
+-- === audit_log PHÂN VÙNG THEO THÁNG (changed_at) ===
+-- audit_log cũ là 1 heap lớn dần mãi. Chuyển sang bảng phân vùng RANGE theo
+-- changed_at, mỗi tháng 1 partition (audit_log_YYYY_MM):
+--   audit_log_ensure_partitions(n) tạo trước partition cho n tháng tới
+--   audit_log_archive(k)           tách partition cũ hơn k tháng sang schema
+--                                  audit_archive (hoặc DROP) – không DELETE từng dòng
+-- modules/audit.py gọi 2 hàm này khi ứng dụng khởi động (AUDIT_*).
+-- Chạy lại nhiều lần vẫn an toàn.
+
+CREATE SCHEMA IF NOT EXISTS audit_archive;
+
+CREATE OR REPLACE FUNCTION audit_log_ensure_partitions(
+    p_months_ahead INTEGER DEFAULT 3, p_from DATE DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    m DATE := date_trunc('month', COALESCE(p_from, CURRENT_DATE))::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE)
+                        + make_interval(months => p_months_ahead))::date;
+    part TEXT;
+    created INTEGER := 0;
+    has_default_rows BOOLEAN;
+BEGIN
+    WHILE m <= last_month LOOP
+        part := format('audit_log_%s', to_char(m, 'YYYY_MM'));
+        -- Tháng đã lưu trữ thì không tạo lại
+        IF to_regclass(format('public.%I', part)) IS NULL
+           AND to_regclass(format('audit_archive.%I', part)) IS NULL THEN
+            -- (kiểm tra default trong câu riêng: chưa có bảng thì câu EXISTS lỗi)
+            has_default_rows := FALSE;
+            IF to_regclass('public.audit_log_default') IS NOT NULL THEN
+                has_default_rows := EXISTS (
+                    SELECT 1 FROM audit_log_default
+                    WHERE changed_at >= m AND changed_at < (m + INTERVAL '1 month'));
+            END IF;
+            IF has_default_rows THEN
+                -- Tháng đã có dòng rơi vào partition default (lâu không có
+                -- client khởi động) → CREATE ... PARTITION OF sẽ lỗi. Tách default,
+                -- tạo partition tháng, chuyển các dòng đó sang, gắn default lại
+                -- → tháng vẫn được cắt tỉa / lưu trữ như bình thường
+                ALTER TABLE audit_log DETACH PARTITION audit_log_default;
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+                    part, m, (m + INTERVAL '1 month')::date);
+                WITH moved AS (
+                    DELETE FROM audit_log_default
+                    WHERE changed_at >= m AND changed_at < (m + INTERVAL '1 month')
+                    RETURNING *
+                )
+                INSERT INTO audit_log SELECT * FROM moved;
+                ALTER TABLE audit_log ATTACH PARTITION audit_log_default DEFAULT;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+                    part, m, (m + INTERVAL '1 month')::date);
+            END IF;
+            created := created + 1;
+        END IF;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION audit_log_archive(
+    p_keep_months INTEGER, p_drop BOOLEAN DEFAULT FALSE)
+RETURNS INTEGER AS $$
+DECLARE
+    r RECORD;
+    cutoff DATE := (date_trunc('month', CURRENT_DATE)
+                    - make_interval(months => p_keep_months))::date;
+    n INTEGER := 0;
+BEGIN
+    FOR r IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.audit_log'::regclass
+          AND c.relname ~ '^audit_log_[0-9]{4}_[0-9]{2}$'
+    LOOP
+        IF to_date(RIGHT(r.relname, 7), 'YYYY_MM') < cutoff THEN
+            EXECUTE format('ALTER TABLE audit_log DETACH PARTITION %I', r.relname);
+            IF p_drop THEN
+                EXECUTE format('DROP TABLE %I', r.relname);
+            ELSE
+                EXECUTE format('ALTER TABLE %I SET SCHEMA audit_archive', r.relname);
+            END IF;
+            n := n + 1;
+        END IF;
+    END LOOP;
+    RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Chuyển bảng cũ → bảng phân vùng (1 lần)
+DO $$
+DECLARE
+    oldest DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table
+               WHERE partrelid = 'public.audit_log'::regclass) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE audit_log RENAME TO audit_log_legacy;
+    ALTER TABLE audit_log_legacy RENAME CONSTRAINT audit_log_pkey TO audit_log_legacy_pkey;
+    ALTER INDEX IF EXISTS idx_audit_changed_by RENAME TO idx_audit_legacy_changed_by;
+    ALTER INDEX IF EXISTS idx_audit_changed_at RENAME TO idx_audit_legacy_changed_at;
+    -- Giữ sequence id cũ (id tiếp tục tăng, không trùng)
+    ALTER SEQUENCE audit_log_id_seq OWNED BY NONE;
+
+    CREATE TABLE audit_log (
+        id BIGINT NOT NULL DEFAULT nextval('audit_log_id_seq'),
+        table_name TEXT NOT NULL,
+        record_id BIGINT,
+        action TEXT NOT NULL CHECK (action IN ('I', 'U', 'D')),
+        old_row_data JSONB,
+        new_row_data JSONB,
+        changed_by INTEGER REFERENCES users(id),
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, changed_at)
+    ) PARTITION BY RANGE (changed_at);
+    ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id;
+
+    -- Dòng ngoài mọi partition (đồng hồ lệch, quên tạo trước) không bị từ chối
+    CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT;
+
+    SELECT COALESCE(MIN(changed_at), CURRENT_TIMESTAMP)::date INTO oldest
+    FROM audit_log_legacy;
+    PERFORM audit_log_ensure_partitions(3, oldest);
+
+    INSERT INTO audit_log (id, table_name, record_id, action, old_row_data,
+                           new_row_data, changed_by, changed_at)
+    SELECT id, table_name, record_id, action, old_row_data, new_row_data,
+           changed_by, COALESCE(changed_at, CURRENT_TIMESTAMP)
+    FROM audit_log_legacy;
+
+    DROP TABLE audit_log_legacy;
+END $$;
+
+-- Index khai báo trên bảng cha → tự có trên mọi partition
+CREATE INDEX IF NOT EXISTS idx_audit_changed_by ON audit_log (changed_by);
+CREATE INDEX IF NOT EXISTS idx_audit_changed_at ON audit_log (changed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_record ON audit_log (table_name, record_id);
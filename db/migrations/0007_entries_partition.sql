@@ -0,0 +1,196 @@
+-- === inventory_entries PHÂN VÙNG THEO THÁNG (created_at) – TÙY CHỌN ===
+-- Mọi truy vấn ở modules/search.py đều lọc team_id và thường lọc khoảng
+-- created_at; bảng 1 khối + nhiều index GIN → mỗi lần ghi cập nhật index
+-- của cả bảng lớn. Phân vùng RANGE theo created_at, mỗi tháng 1 partition
+-- (inventory_entries_YYYY_MM):
+--   - lọc created_from / created_to / keyset → chỉ quét partition liên quan
+--   - ghi mới chỉ chạm index (GIN) của partition tháng hiện tại (nhỏ)
+--   - team_id là cột đầu của index (team_id, created_at DESC, id DESC) trong
+--     mỗi partition (ít team → không tách partition theo team)
+-- Các hàm:
+--   inventory_entries_ensure_partitions(n)   tạo trước partition n tháng tới
+--                                            (ứng dụng gọi khi khởi động)
+--   inventory_entries_partition_by_month()   chuyển bảng cũ → bảng phân vùng
+-- Cần PostgreSQL 13+ (trigger BEFORE ROW trên bảng phân vùng).
+-- Chạy script này chỉ tạo hàm. Chuyển đổi (khóa bảng, chép toàn bộ dữ liệu)
+-- chạy tay 1 lần ngoài giờ làm việc, rồi khởi động lại các client:
+--   SELECT inventory_entries_partition_by_month();
+-- (không đặt trong migration tự động: khóa bảng suốt lúc chép)
+-- So sánh trước / sau: 3.SQL/Entries partition benchmark.sql
+
+CREATE OR REPLACE FUNCTION inventory_entries_is_partitioned()
+RETURNS BOOLEAN AS $$
+    SELECT EXISTS (SELECT 1 FROM pg_partitioned_table
+                   WHERE partrelid = 'public.inventory_entries'::regclass);
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION inventory_entries_ensure_partitions(
+    p_months_ahead INTEGER DEFAULT 3, p_from DATE DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    m DATE := date_trunc('month', COALESCE(p_from, CURRENT_DATE))::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE)
+                        + make_interval(months => p_months_ahead))::date;
+    part TEXT;
+    created INTEGER := 0;
+BEGIN
+    IF NOT inventory_entries_is_partitioned() THEN
+        RETURN 0;
+    END IF;
+    WHILE m <= last_month LOOP
+        part := format('inventory_entries_%s', to_char(m, 'YYYY_MM'));
+        IF to_regclass(format('public.%I', part)) IS NULL THEN
+            -- Tháng đã có dòng rơi vào partition default → không tạo được,
+            -- dòng vẫn đọc được (chỉ không được cắt tỉa)
+            IF EXISTS (SELECT 1 FROM inventory_entries_default
+                       WHERE created_at >= m
+                         AND created_at < (m + INTERVAL '1 month')) THEN
+                RAISE WARNING 'inventory_entries_default có dữ liệu tháng %, bỏ qua', m;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF inventory_entries FOR VALUES FROM (%L) TO (%L)',
+                    part, m, (m + INTERVAL '1 month')::date);
+                created := created + 1;
+            END IF;
+        END IF;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventory_entries_partition_by_month(
+    p_months_ahead INTEGER DEFAULT 3)
+RETURNS BIGINT AS $$
+DECLARE
+    oldest DATE;
+    moved BIGINT;
+    trigger_defs TEXT[];
+    stock_def TEXT;
+    stock_index_defs TEXT[];
+    def TEXT;
+BEGIN
+    IF inventory_entries_is_partitioned() THEN
+        RETURN 0;
+    END IF;
+    LOCK TABLE inventory_entries IN ACCESS EXCLUSIVE MODE;
+
+    -- Trigger (search_vector, stock_balance, change feed) tạo lại trên bảng
+    -- mới SAU khi chép dữ liệu → không tính lại tồn / không NOTIFY từng dòng
+    SELECT array_agg(pg_get_triggerdef(oid) ORDER BY tgname) INTO trigger_defs
+    FROM pg_trigger
+    WHERE tgrelid = 'public.inventory_entries'::regclass AND NOT tgisinternal;
+
+    -- current_stock (báo cáo cũ) phụ thuộc bảng cũ → lưu định nghĩa, dựng lại
+    IF to_regclass('public.current_stock') IS NOT NULL THEN
+        stock_def := pg_get_viewdef('public.current_stock'::regclass);
+        SELECT array_agg(indexdef) INTO stock_index_defs
+        FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'current_stock';
+        DROP MATERIALIZED VIEW current_stock;
+    END IF;
+
+    ALTER TABLE inventory_entries RENAME TO inventory_entries_legacy;
+    ALTER TABLE inventory_entries_legacy
+        RENAME CONSTRAINT inventory_entries_pkey TO inventory_entries_legacy_pkey;
+    -- Index cũ không cần nữa (bảng cũ sẽ bị xóa) → bỏ trước cho nhẹ + khỏi trùng tên
+    FOR def IN
+        SELECT format('DROP INDEX %s', i.indexrelid::regclass)
+        FROM pg_index i
+        WHERE i.indrelid = 'public.inventory_entries_legacy'::regclass
+          AND NOT i.indisprimary
+    LOOP
+        EXECUTE def;
+    END LOOP;
+    -- Giữ sequence id cũ (id tiếp tục tăng, không trùng)
+    ALTER SEQUENCE inventory_entries_id_seq OWNED BY NONE;
+
+    -- Khóa chính phải chứa cột phân vùng → (id, created_at); id vẫn duy nhất
+    -- nhờ sequence. created_at bắt buộc NOT NULL.
+    CREATE TABLE inventory_entries (
+        id BIGINT NOT NULL DEFAULT nextval('inventory_entries_id_seq'),
+        component_id VARCHAR(100) NOT NULL,
+        component_name TEXT NOT NULL,
+        group_name TEXT[] DEFAULT '{}',
+        process TEXT[] DEFAULT '{}',
+        model TEXT[] DEFAULT '{}',
+        size TEXT,
+        unit TEXT,
+        team_id INTEGER NOT NULL REFERENCES teams(id),
+        material TEXT[] DEFAULT '{}',
+        storage_location TEXT,
+        invoice TEXT,
+        modinvoice TEXT,
+        status TEXT,
+        note TEXT,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        movement_type VARCHAR(20) NOT NULL DEFAULT 'adjustment'
+            CHECK (movement_type IN ('in', 'out', 'adjustment')),
+        created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        created_by INTEGER NOT NULL REFERENCES users(id),
+        updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        updated_by INTEGER REFERENCES users(id),
+        search_vector TSVECTOR,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE inventory_entries_id_seq OWNED BY inventory_entries.id;
+
+    -- Dòng ngoài mọi partition (đồng hồ lệch, quên tạo trước) không bị từ chối
+    CREATE TABLE inventory_entries_default PARTITION OF inventory_entries DEFAULT;
+
+    SELECT COALESCE(MIN(created_at), CURRENT_TIMESTAMP)::date INTO oldest
+    FROM inventory_entries_legacy;
+    PERFORM inventory_entries_ensure_partitions(p_months_ahead, oldest);
+
+    INSERT INTO inventory_entries (
+        id, component_id, component_name, group_name, process, model, size,
+        unit, team_id, material, storage_location, invoice, modinvoice, status,
+        note, quantity, movement_type, created_at, created_by, updated_at,
+        updated_by, search_vector
+    )
+    SELECT id, component_id, component_name, group_name, process, model, size,
+           unit, team_id, material, storage_location, invoice, modinvoice, status,
+           note, quantity, movement_type,
+           COALESCE(created_at, updated_at, CURRENT_TIMESTAMP), created_by,
+           updated_at, updated_by, search_vector
+    FROM inventory_entries_legacy;
+    GET DIAGNOSTICS moved = ROW_COUNT;
+
+    DROP TABLE inventory_entries_legacy;
+
+    -- Index khai báo trên bảng cha → tự có trên mọi partition (kể cả tháng
+    -- tạo sau). Bỏ các index trùng / ít chọn lọc của bảng cũ:
+    --   team_id, created_at      → đầu của idx_entries_team_created_id + cắt tỉa
+    --   component_id (2 bản)     → idx_entries_stock_query (mọi truy vấn có team_id)
+    --   movement_type, status    → 2-3 giá trị, planner không dùng
+    CREATE INDEX idx_entries_team_created_id
+        ON inventory_entries (team_id, created_at DESC, id DESC);
+    CREATE INDEX idx_entries_stock_query
+        ON inventory_entries (team_id, component_id, created_at);
+    CREATE INDEX idx_entries_created_by ON inventory_entries (created_by);
+    CREATE INDEX idx_entries_group_gin ON inventory_entries USING GIN (group_name);
+    CREATE INDEX idx_entries_process_gin ON inventory_entries USING GIN (process);
+    CREATE INDEX idx_entries_material_gin ON inventory_entries USING GIN (material);
+    CREATE INDEX idx_entries_model_gin ON inventory_entries USING GIN (model);
+    CREATE INDEX idx_entries_name_trgm
+        ON inventory_entries USING GIN (component_name gin_trgm_ops);
+    CREATE INDEX idx_entries_component_id_trgm
+        ON inventory_entries USING GIN (component_id gin_trgm_ops);
+    CREATE INDEX idx_entries_search_gin ON inventory_entries USING GIN (search_vector);
+    -- Đồng bộ bản sao cục bộ (0010_mirror_sync_indexes.sql, modules/local_mirror.py)
+    CREATE INDEX idx_entries_team_updated ON inventory_entries (team_id, updated_at);
+
+    FOREACH def IN ARRAY COALESCE(trigger_defs, '{}') LOOP
+        EXECUTE def;
+    END LOOP;
+
+    IF stock_def IS NOT NULL THEN
+        EXECUTE format('CREATE MATERIALIZED VIEW current_stock AS %s', stock_def);
+        FOREACH def IN ARRAY COALESCE(stock_index_defs, '{}') LOOP
+            EXECUTE def;
+        END LOOP;
+    END IF;
+
+    ANALYZE inventory_entries;
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
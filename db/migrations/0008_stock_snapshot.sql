@@ -0,0 +1,184 @@
+-- === ẢNH CHỤP TỒN KHO THEO NGÀY (số dư cuối ngày / team / mã) ===
+-- stock_balance chỉ có tồn "bây giờ"; tồn tại 1 thời điểm cũ phải cộng lại
+-- toàn bộ inventory_entries. Bảng này lưu số dư đóng ngày:
+--   stock_snapshots       1 dòng / (team, mốc)  – mốc as_of = 0h ngày hôm sau
+--   stock_snapshot_items  số dư từng mã (≠ 0) của mọi giao dịch created_at < as_of
+--   stock_as_of(team, t)  lấy ảnh gần t nhất (trước hoặc sau) rồi chỉ cộng / trừ
+--                         các giao dịch nằm giữa ảnh và t (idx_entries_team_created_id)
+--   stock_snapshot_take   chụp 1 mốc, dựng tăng dần từ ảnh trước đó
+--   stock_snapshot_missing / stock_snapshot_prune cho modules/stock_snapshot.py
+-- Giao dịch ghi lùi ngày (nhập file, sửa, xóa dòng cũ) được trigger cộng thẳng
+-- vào các ảnh có as_of sau created_at của dòng đó → ảnh luôn khớp sổ cái.
+-- Chạy lại nhiều lần vẫn an toàn.
+
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    team_id INTEGER NOT NULL REFERENCES teams(id),
+    as_of TIMESTAMPTZ NOT NULL,
+    taken_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (team_id, as_of)
+);
+
+CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+    team_id INTEGER NOT NULL,
+    as_of TIMESTAMPTZ NOT NULL,
+    component_id VARCHAR(100) NOT NULL,
+    quantity BIGINT NOT NULL,
+    PRIMARY KEY (team_id, as_of, component_id),
+    FOREIGN KEY (team_id, as_of) REFERENCES stock_snapshots (team_id, as_of)
+        ON DELETE CASCADE
+);
+
+-- Tồn của team gồm mọi giao dịch created_at < p_cutoff
+CREATE OR REPLACE FUNCTION stock_as_of(p_team_id INTEGER, p_cutoff TIMESTAMPTZ)
+RETURNS TABLE (component_id VARCHAR, quantity BIGINT, base_as_of TIMESTAMPTZ) AS $$
+#variable_conflict use_column
+DECLARE
+    before_ts TIMESTAMPTZ;
+    after_ts TIMESTAMPTZ;
+    base TIMESTAMPTZ;
+    lo TIMESTAMPTZ;
+    hi TIMESTAMPTZ;
+    dir INTEGER := 1;
+BEGIN
+    SELECT MAX(s.as_of) INTO before_ts FROM stock_snapshots s
+    WHERE s.team_id = p_team_id AND s.as_of <= p_cutoff;
+    SELECT MIN(s.as_of) INTO after_ts FROM stock_snapshots s
+    WHERE s.team_id = p_team_id AND s.as_of > p_cutoff;
+
+    IF after_ts IS NOT NULL
+       AND (before_ts IS NULL OR after_ts - p_cutoff < p_cutoff - before_ts) THEN
+        -- Ảnh sau gần hơn: trừ ngược các giao dịch trong [cutoff, ảnh)
+        base := after_ts; lo := p_cutoff; hi := after_ts; dir := -1;
+    ELSE
+        -- Ảnh trước (hoặc chưa có ảnh nào → cộng từ đầu)
+        base := before_ts; lo := COALESCE(before_ts, '-infinity'); hi := p_cutoff;
+    END IF;
+
+    RETURN QUERY
+    SELECT t.component_id, SUM(t.qty)::BIGINT, base
+    FROM (
+        SELECT i.component_id, i.quantity AS qty
+        FROM stock_snapshot_items i
+        WHERE i.team_id = p_team_id AND i.as_of = base
+        UNION ALL
+        SELECT ie.component_id, dir * entry_signed_quantity(ie.movement_type, ie.quantity)
+        FROM inventory_entries ie
+        WHERE ie.team_id = p_team_id
+          AND ie.created_at >= lo AND ie.created_at < hi
+    ) t
+    GROUP BY t.component_id
+    HAVING SUM(t.qty) <> 0;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Chụp 1 mốc (chụp lại nếu đã có). Khóa items chờ mọi transaction đang ghi
+-- inventory_entries (trigger bên dưới giữ ROW EXCLUSIVE) COMMIT xong
+-- → không sót giao dịch created_at < as_of còn đang dở lúc chụp.
+CREATE OR REPLACE FUNCTION stock_snapshot_take(p_team_id INTEGER, p_as_of TIMESTAMPTZ)
+RETURNS INTEGER AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    LOCK TABLE stock_snapshot_items IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM stock_snapshots WHERE team_id = p_team_id AND as_of = p_as_of;
+
+    -- Cùng 1 câu: stock_as_of không thấy header mới, FK kiểm tra cuối câu
+    WITH items AS MATERIALIZED (
+        SELECT a.component_id, a.quantity FROM stock_as_of(p_team_id, p_as_of) a
+    ), header AS (
+        INSERT INTO stock_snapshots (team_id, as_of) VALUES (p_team_id, p_as_of)
+    )
+    INSERT INTO stock_snapshot_items (team_id, as_of, component_id, quantity)
+    SELECT p_team_id, p_as_of, component_id, quantity FROM items;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Các mốc đóng ngày còn thiếu trong p_days_back ngày gần nhất (cũ trước → dựng tăng dần)
+CREATE OR REPLACE FUNCTION stock_snapshot_missing(p_days_back INTEGER DEFAULT 7)
+RETURNS TABLE (team_id INTEGER, as_of TIMESTAMPTZ) AS $$
+    SELECT t.id, d.as_of
+    FROM teams t
+    CROSS JOIN generate_series(
+        date_trunc('day', NOW()) - make_interval(days => p_days_back - 1),
+        date_trunc('day', NOW()),
+        INTERVAL '1 day') AS d(as_of)
+    WHERE NOT EXISTS (SELECT 1 FROM stock_snapshots s
+                      WHERE s.team_id = t.id AND s.as_of = d.as_of)
+      -- Team chưa có giao dịch nào trước mốc thì chưa cần chụp
+      AND EXISTS (SELECT 1 FROM inventory_entries ie
+                  WHERE ie.team_id = t.id AND ie.created_at < d.as_of)
+    ORDER BY d.as_of, t.id;
+$$ LANGUAGE sql STABLE;
+
+-- Xóa ảnh ngày cũ hơn p_keep_days; ảnh đầu tháng (= tồn cuối tháng trước) giữ lại
+CREATE OR REPLACE FUNCTION stock_snapshot_prune(p_keep_days INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    n INTEGER;
+BEGIN
+    DELETE FROM stock_snapshots
+    WHERE as_of < NOW() - make_interval(days => p_keep_days)
+      AND as_of <> date_trunc('month', as_of);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cộng delta của 1 giao dịch vào mọi ảnh có mốc sau created_at của nó.
+-- Giao dịch mới (created_at = NOW()) không khớp ảnh nào → chỉ 1 lần dò index.
+CREATE OR REPLACE FUNCTION stock_snapshot_apply(
+    p_team_id INTEGER, p_component_id TEXT, p_created_at TIMESTAMPTZ, p_delta BIGINT)
+RETURNS VOID AS $$
+DECLARE
+    zero_as_of TIMESTAMPTZ[];
+BEGIN
+    WITH up AS (
+        INSERT INTO stock_snapshot_items AS si (team_id, as_of, component_id, quantity)
+        SELECT s.team_id, s.as_of, p_component_id, p_delta
+        FROM stock_snapshots s
+        WHERE s.team_id = p_team_id AND s.as_of > p_created_at
+        ON CONFLICT (team_id, as_of, component_id) DO UPDATE
+            SET quantity = si.quantity + EXCLUDED.quantity
+        RETURNING si.as_of, si.quantity
+    )
+    SELECT array_agg(up.as_of) FILTER (WHERE up.quantity = 0) INTO zero_as_of FROM up;
+
+    -- Ảnh chỉ lưu mã có tồn ≠ 0
+    IF zero_as_of IS NOT NULL THEN
+        DELETE FROM stock_snapshot_items
+        WHERE team_id = p_team_id AND component_id = p_component_id
+          AND as_of = ANY(zero_as_of);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_stock_snapshot()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Sửa ghi chú / vị trí... không đổi số dư → bỏ qua
+    IF TG_OP = 'UPDATE'
+       AND (OLD.team_id, OLD.component_id, OLD.created_at, OLD.movement_type, OLD.quantity)
+           IS NOT DISTINCT FROM
+           (NEW.team_id, NEW.component_id, NEW.created_at, NEW.movement_type, NEW.quantity) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM stock_snapshot_apply(
+            OLD.team_id, OLD.component_id, OLD.created_at,
+            -entry_signed_quantity(OLD.movement_type, OLD.quantity));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM stock_snapshot_apply(
+            NEW.team_id, NEW.component_id, NEW.created_at,
+            entry_signed_quantity(NEW.movement_type, NEW.quantity));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trig_stock_snapshot ON inventory_entries;
+CREATE TRIGGER trig_stock_snapshot
+AFTER INSERT OR UPDATE OR DELETE ON inventory_entries
+FOR EACH ROW EXECUTE FUNCTION trg_stock_snapshot();
@@ -0,0 +1,176 @@
+-- === TỔNG HỢP NHẬP / XUẤT THEO TUẦN / THÁNG (báo cáo tiêu hao) ===
+-- Báo cáo theo process / model / group phải unnest các cột mảng trên toàn bộ
+-- inventory_entries → chậm. Thay bằng bảng tổng hợp tính sẵn:
+--   entry_rollup_daily  1 dòng / (team, ngày, chiều, giá trị) – lớp nền
+--   entry_rollups       cộng từ bảng ngày theo tuần ('W') / tháng ('M')
+--   chiều (dimension):  component | process | model | group | material
+-- Cập nhật tăng dần: trigger theo câu lệnh (transition table) ghi các ngày bị
+-- đụng tới vào entry_rollup_dirty (chỉ INSERT, không khóa nhau giữa các client);
+-- entry_rollups_refresh(n) lấy tối đa n ngày trong hàng đợi, tính lại đúng các
+-- ngày đó rồi các tuần / tháng chứa chúng (modules/rollups.py gọi định kỳ).
+-- Sửa / xóa giao dịch cũ cũng đánh dấu ngày cũ → số liệu luôn khớp sổ cái.
+-- Ngày / tuần tính theo TimeZone của phiên (mặc định của server).
+-- Chạy lại nhiều lần vẫn an toàn.
+
+CREATE TABLE IF NOT EXISTS entry_rollup_daily (
+    team_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    dimension TEXT NOT NULL,
+    dim_value TEXT NOT NULL,
+    in_qty BIGINT NOT NULL DEFAULT 0,
+    out_qty BIGINT NOT NULL DEFAULT 0,
+    adj_qty BIGINT NOT NULL DEFAULT 0,
+    entries INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, day, dimension, dim_value)
+);
+
+CREATE TABLE IF NOT EXISTS entry_rollups (
+    team_id INTEGER NOT NULL,
+    grain CHAR(1) NOT NULL CHECK (grain IN ('W', 'M')),
+    period_start DATE NOT NULL,
+    dimension TEXT NOT NULL,
+    dim_value TEXT NOT NULL,
+    in_qty BIGINT NOT NULL DEFAULT 0,
+    out_qty BIGINT NOT NULL DEFAULT 0,
+    adj_qty BIGINT NOT NULL DEFAULT 0,
+    entries INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, grain, dimension, period_start, dim_value)
+);
+
+-- Hàng đợi ngày cần tính lại (trùng lặp thoải mái, gộp lúc refresh)
+CREATE TABLE IF NOT EXISTS entry_rollup_dirty (
+    team_id INTEGER NOT NULL,
+    day DATE NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION trg_entry_rollup_dirty()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO entry_rollup_dirty (team_id, day)
+        SELECT DISTINCT team_id, created_at::date FROM old_rows;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO entry_rollup_dirty (team_id, day)
+        SELECT DISTINCT team_id, created_at::date FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition table chỉ cho phép 1 sự kiện / trigger → 3 trigger
+DROP TRIGGER IF EXISTS trig_entry_rollup_ins ON inventory_entries;
+CREATE TRIGGER trig_entry_rollup_ins
+AFTER INSERT ON inventory_entries
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_entry_rollup_dirty();
+
+DROP TRIGGER IF EXISTS trig_entry_rollup_upd ON inventory_entries;
+CREATE TRIGGER trig_entry_rollup_upd
+AFTER UPDATE ON inventory_entries
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_entry_rollup_dirty();
+
+DROP TRIGGER IF EXISTS trig_entry_rollup_del ON inventory_entries;
+CREATE TRIGGER trig_entry_rollup_del
+AFTER DELETE ON inventory_entries
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_entry_rollup_dirty();
+
+-- Tính lại tối đa p_max_days (team, ngày) trong hàng đợi. Trả về số ngày đã xử lý
+-- (0 = hàng đợi trống) + các team bị ảnh hưởng (client chỉ xóa cache báo cáo của
+-- các team đó). Gọi lặp lại, mỗi lần 1 transaction, tới khi days < p_max_days.
+DROP FUNCTION IF EXISTS entry_rollups_refresh(INTEGER);
+CREATE FUNCTION entry_rollups_refresh(p_max_days INTEGER DEFAULT 500)
+RETURNS TABLE (days INTEGER, team_ids INTEGER[]) AS $$
+DECLARE
+    d_team INTEGER[];
+    d_day DATE[];
+    p_team INTEGER[];
+    p_grain CHAR(1)[];
+    p_start DATE[];
+BEGIN
+    -- 1. Lấy ra khỏi hàng đợi (các ngày cũ trước)
+    WITH pick AS (
+        SELECT DISTINCT q.team_id, q.day FROM entry_rollup_dirty q
+        ORDER BY q.day, q.team_id
+        LIMIT p_max_days
+    ), taken AS (
+        DELETE FROM entry_rollup_dirty q USING pick
+        WHERE q.team_id = pick.team_id AND q.day = pick.day
+        RETURNING q.team_id, q.day
+    ), u AS (
+        SELECT DISTINCT t.team_id, t.day FROM taken t
+    )
+    SELECT array_agg(u.team_id), array_agg(u.day) INTO d_team, d_day FROM u;
+    IF d_team IS NULL THEN
+        RETURN QUERY SELECT 0, '{}'::INTEGER[];
+        RETURN;
+    END IF;
+
+    -- 2. Bảng ngày: tính lại hoàn toàn từ inventory_entries (index team_id, created_at)
+    DELETE FROM entry_rollup_daily r
+    USING unnest(d_team, d_day) AS x(team_id, day)
+    WHERE r.team_id = x.team_id AND r.day = x.day;
+
+    INSERT INTO entry_rollup_daily (
+        team_id, day, dimension, dim_value, in_qty, out_qty, adj_qty, entries)
+    SELECT x.team_id, x.day, dv.dimension, dv.dim_value,
+           COALESCE(SUM(ie.quantity) FILTER (WHERE ie.movement_type = 'in'), 0),
+           COALESCE(SUM(ie.quantity) FILTER (WHERE ie.movement_type = 'out'), 0),
+           COALESCE(SUM(ie.quantity) FILTER (WHERE ie.movement_type = 'adjustment'), 0),
+           COUNT(*)
+    FROM unnest(d_team, d_day) AS x(team_id, day)
+    JOIN inventory_entries ie
+      ON ie.team_id = x.team_id
+     AND ie.created_at >= x.day::timestamptz
+     AND ie.created_at < (x.day + 1)::timestamptz
+    -- UNION (không ALL): giá trị lặp trong 1 mảng chỉ tính 1 lần
+    CROSS JOIN LATERAL (
+        SELECT 'component'::text, ie.component_id::text
+        UNION SELECT 'process', unnest(ie.process)
+        UNION SELECT 'model', unnest(ie.model)
+        UNION SELECT 'group', unnest(ie.group_name)
+        UNION SELECT 'material', unnest(ie.material)
+    ) AS dv(dimension, dim_value)
+    WHERE dv.dim_value IS NOT NULL AND dv.dim_value <> ''
+    GROUP BY x.team_id, x.day, dv.dimension, dv.dim_value;
+
+    -- 3. Tuần / tháng chứa các ngày trên: cộng lại từ bảng ngày
+    SELECT array_agg(pr.team_id), array_agg(pr.grain), array_agg(pr.period_start)
+    INTO p_team, p_grain, p_start
+    FROM (
+        SELECT DISTINCT x.team_id, g.grain, g.period_start
+        FROM unnest(d_team, d_day) AS x(team_id, day)
+        CROSS JOIN LATERAL (VALUES
+            ('W'::char(1), date_trunc('week', x.day)::date),
+            ('M'::char(1), date_trunc('month', x.day)::date)
+        ) AS g(grain, period_start)
+    ) pr;
+
+    DELETE FROM entry_rollups r
+    USING unnest(p_team, p_grain, p_start) AS p(team_id, grain, period_start)
+    WHERE r.team_id = p.team_id AND r.grain = p.grain AND r.period_start = p.period_start;
+
+    INSERT INTO entry_rollups (
+        team_id, grain, period_start, dimension, dim_value,
+        in_qty, out_qty, adj_qty, entries)
+    SELECT p.team_id, p.grain, p.period_start, d.dimension, d.dim_value,
+           SUM(d.in_qty), SUM(d.out_qty), SUM(d.adj_qty), SUM(d.entries)
+    FROM unnest(p_team, p_grain, p_start) AS p(team_id, grain, period_start)
+    JOIN entry_rollup_daily d
+      ON d.team_id = p.team_id
+     AND d.day >= p.period_start
+     AND d.day < p.period_start
+                 + CASE p.grain WHEN 'W' THEN INTERVAL '7 days' ELSE INTERVAL '1 month' END
+    GROUP BY p.team_id, p.grain, p.period_start, d.dimension, d.dim_value;
+
+    RETURN QUERY SELECT array_length(d_team, 1),
+                        ARRAY(SELECT DISTINCT unnest(d_team));
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lần đầu: đưa mọi ngày đã có giao dịch vào hàng đợi (modules/rollups.py xử lý dần)
+INSERT INTO entry_rollup_dirty (team_id, day)
+SELECT DISTINCT team_id, created_at::date FROM inventory_entries
+WHERE NOT EXISTS (SELECT 1 FROM entry_rollup_daily);
@@ -0,0 +1,11 @@
+-- migrate: no-transaction
+-- === 0010 INDEX CHO BẢN SAO CỤC BỘ (modules/local_mirror.py) ===
+-- Mỗi client bật bản sao đọc "các dòng đổi từ mốc T" của team mình vài chục
+-- giây 1 lần → cần đọc theo (team_id, updated_at) thay vì quét cả team.
+-- Build online như 0002 (bảng phân vùng: từng partition rồi ATTACH).
+-- inventory_entries_partition_by_month() (0007) cũng tạo lại idx_entries_team_updated.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_team_updated
+    ON inventory_entries (team_id, updated_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_stock_balance_team_updated
+    ON stock_balance (team_id, updated_at);
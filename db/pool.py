@@ -0,0 +1,171 @@
+# warehouse_app/db/pool.py
+"""
+POOL KẾT NỐI asyncpg DÙNG CHUNG TOÀN ỨNG DỤNG
+- Mọi module (inventory, search, options, teams, auth) lấy kết nối qua acquire()
+- Cấu hình min/max, idle timeout, statement cache trong config/settings.py
+- Thống kê hit/miss + thời gian chờ để theo dõi tranh chấp khi tải cao
+"""
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+import asyncpg
+from config.settings import (
+    DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE, DB_CONNECT_TIMEOUT, DB_COMMAND_TIMEOUT,
+)
+from db.statements import WarehouseConnection, registry
+from db.metrics import metrics
+
+# Pool gắn với event loop đã tạo ra nó → mỗi loop một pool
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncpg.Pool]" = (
+    weakref.WeakKeyDictionary())
+_pool_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary())
+
+
+class PoolStats:
+    """Bộ đếm hit/miss và thời gian chờ khi lấy kết nối."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.acquires = 0           # tổng số lần lấy kết nối
+        self.hits = 0               # có sẵn kết nối rảnh trong pool
+        self.misses = 0             # phải mở kết nối mới hoặc chờ
+        self.waits = 0              # pool đã đầy → phải chờ kết nối trả về
+        self.connections_opened = 0
+        self.total_wait = 0.0       # giây
+        self.max_wait = 0.0
+
+    def record(self, idle_before: int, size_before: int, max_size: int, wait: float):
+        self.acquires += 1
+        if idle_before > 0:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if size_before >= max_size:
+                self.waits += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        avg_wait = self.total_wait / self.acquires if self.acquires else 0.0
+        hit_ratio = self.hits / self.acquires if self.acquires else 0.0
+        return {
+            "acquires": self.acquires,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "hit_ratio": round(hit_ratio, 4),
+            "connections_opened": self.connections_opened,
+            "avg_wait_ms": round(avg_wait * 1000, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+stats = PoolStats()
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Gọi mỗi khi pool mở kết nối mới."""
+    stats.connections_opened += 1
+    metrics.attach(conn)  # thời gian từng câu SQL (db/metrics.py)
+    # PREPARE sẵn các query cố định (db/statements.py)
+    await registry.warm_connection(conn)
+
+
+async def _create_pool() -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        user=DB_USER,
+        password=DB_PASS,
+        database=DB_NAME,
+        host=DB_HOST,
+        port=DB_PORT,
+        ssl=False,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=DB_POOL_IDLE_TIMEOUT,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        timeout=DB_CONNECT_TIMEOUT,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        init=_init_connection,
+        connection_class=WarehouseConnection,
+    )
+
+
+async def get_pool() -> asyncpg.Pool:
+    """Trả về pool của event loop hiện tại (tạo lần đầu khi cần)."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is not None and not pool.is_closing():
+        return pool
+
+    lock = _pool_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        pool = _pools.get(loop)
+        if pool is None or pool.is_closing():
+            pool = await _create_pool()
+            _pools[loop] = pool
+    return pool
+
+
+@asynccontextmanager
+async def acquire():
+    """
+    Lấy 1 kết nối từ pool dùng chung.
+        async with acquire() as conn:
+            rows = await conn.fetch(...)
+    """
+    pool = await get_pool()
+    idle_before = pool.get_idle_size()
+    size_before = pool.get_size()
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        wait = time.perf_counter() - started
+        stats.record(idle_before, size_before, pool.get_max_size(), wait)
+        metrics.record_pool_wait(wait)  # gán cho op đang chạy
+        yield conn
+
+
+async def connect_dedicated() -> asyncpg.Connection:
+    """
+    Kết nối riêng NGOÀI pool – dùng cho LISTEN/NOTIFY (phải giữ suốt phiên).
+    Người gọi tự close().
+    """
+    return await asyncpg.connect(
+        user=DB_USER,
+        password=DB_PASS,
+        database=DB_NAME,
+        host=DB_HOST,
+        port=DB_PORT,
+        ssl=False,
+        timeout=DB_CONNECT_TIMEOUT,
+    )
+
+
+async def health_check(timeout: float = 5.0) -> bool:
+    """Kiểm tra pool còn dùng được (SELECT 1)."""
+    try:
+        async with acquire() as conn:
+            return await conn.fetchval("SELECT 1", timeout=timeout) == 1
+    except Exception as e:
+        print(f"[POOL] health check lỗi: {e}")
+        return False
+
+
+async def close_pool():
+    """Đóng pool của event loop hiện tại (gọi khi thoát ứng dụng)."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.pop(loop, None)
+    if pool is not None:
+        await pool.close()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Thống kê hit/miss, số lần chờ, thời gian chờ của pool."""
+    return stats.snapshot()
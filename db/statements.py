@@ -0,0 +1,167 @@
+# warehouse_app/db/statements.py
+"""
+SỔ ĐĂNG KÝ CÂU LỆNH SQL (PREPARED STATEMENT)
+asyncpg tự giữ statement đã PREPARE trên mỗi kết nối, khóa theo CHUỖI SQL
+(DB_STATEMENT_CACHE_SIZE). Registry bảo đảm chuỗi đó ổn định:
+- Query cố định (tồn kho, thông tin linh kiện, lịch sử gần nhất) đăng ký 1 lần
+  bằng register(), chạy sẵn khi pool mở kết nối mới (warm_connection)
+  → không phải parse/plan lúc người dùng thao tác
+- Query động (search_entries) sinh SQL theo "shape" chuẩn hóa: cùng tổ hợp
+  bộ lọc → cùng 1 chuỗi SQL → dùng lại statement đã prepare
+- Thống kê: số shape, số lần phải prepare / dùng lại theo từng kết nối,
+  generic/custom plan phía server (pg_prepared_statements)
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+from config.settings import DB_STATEMENT_CACHE_SIZE, DB_PREPARED_MAX_SHAPES
+
+
+class WarehouseConnection(asyncpg.Connection):
+    """Connection của pool – nhớ các SQL đã prepare (cùng LRU với asyncpg)."""
+
+    def seen_statements(self) -> "OrderedDict[str, None]":
+        seen = getattr(self, "_wm_seen", None)
+        if seen is None:
+            seen = self._wm_seen = OrderedDict()
+        return seen
+
+
+class ShapeStats:
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.executions = 0
+        self.prepares = 0           # lần chạy đầu trên 1 kết nối → PREPARE
+
+
+class StatementRegistry:
+    def __init__(self, max_shapes: int = DB_PREPARED_MAX_SHAPES,
+                 per_connection: int = DB_STATEMENT_CACHE_SIZE):
+        self.max_shapes = max_shapes
+        self.per_connection = per_connection
+        # SQL → thống kê; query cố định không bao giờ bị bỏ
+        self._fixed: Dict[str, ShapeStats] = {}
+        self._warm_args: Dict[str, Tuple] = {}
+        self._shapes: "OrderedDict[str, ShapeStats]" = OrderedDict()
+        self.evicted_shapes = 0
+
+    # -------------------------------------------------------------
+    # Đăng ký
+    # -------------------------------------------------------------
+    def register(self, name: str, sql: str, warm_args: Optional[Tuple] = None) -> str:
+        """
+        Query cố định. warm_args: tham số "rỗng" (vd. team_id = 0) để chạy
+        thử khi mở kết nối mới → asyncpg PREPARE sẵn vào cache của kết nối.
+        """
+        sql = canonical(sql)
+        self._fixed[sql] = ShapeStats(name, sql)
+        if warm_args is not None:
+            self._warm_args[sql] = tuple(warm_args)
+        return sql
+
+    def _shape(self, sql: str) -> ShapeStats:
+        shape = self._fixed.get(sql)
+        if shape is not None:
+            return shape
+        shape = self._shapes.get(sql)
+        if shape is not None:
+            self._shapes.move_to_end(sql)
+            return shape
+        shape = ShapeStats("q_" + hashlib.sha1(sql.encode()).hexdigest()[:10], sql)
+        self._shapes[sql] = shape
+        if len(self._shapes) > self.max_shapes:
+            self._shapes.popitem(last=False)
+            self.evicted_shapes += 1
+        return shape
+
+    def _track(self, conn, sql: str):
+        shape = self._shape(sql)
+        shape.executions += 1
+        # Ước tính: cache asyncpg dùng chung với các query ngoài registry
+        seen_fn = getattr(conn, "seen_statements", None)
+        if seen_fn is None:  # kết nối ngoài pool
+            return
+        seen = seen_fn()
+        if sql in seen:
+            seen.move_to_end(sql)
+            return
+        shape.prepares += 1
+        seen[sql] = None
+        while len(seen) > self.per_connection:
+            seen.popitem(last=False)
+
+    # -------------------------------------------------------------
+    # Thực thi (qua cache statement của asyncpg)
+    # -------------------------------------------------------------
+    async def fetch(self, conn, sql: str, *args) -> List[asyncpg.Record]:
+        sql = canonical(sql)
+        self._track(conn, sql)
+        return await conn.fetch(sql, *args)
+
+    async def fetchrow(self, conn, sql: str, *args) -> Optional[asyncpg.Record]:
+        sql = canonical(sql)
+        self._track(conn, sql)
+        return await conn.fetchrow(sql, *args)
+
+    async def fetchval(self, conn, sql: str, *args) -> Any:
+        sql = canonical(sql)
+        self._track(conn, sql)
+        return await conn.fetchval(sql, *args)
+
+    async def warm_connection(self, conn):
+        """Chạy thử các query cố định (gọi từ init của pool)."""
+        for sql, args in self._warm_args.items():
+            try:
+                await conn.fetch(sql, *args)
+                self._shape(sql).prepares += 1
+                conn.seen_statements()[sql] = None
+            except Exception as e:
+                print(f"[STATEMENTS] Không prepare được {self._fixed[sql].name}: {e}")
+
+    # -------------------------------------------------------------
+    # Thống kê
+    # -------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        shapes = list(self._fixed.values()) + list(self._shapes.values())
+        executions = sum(s.executions for s in shapes)
+        prepares = sum(s.prepares for s in shapes)
+        return {
+            "fixed": len(self._fixed),
+            "shapes": len(self._shapes),
+            "executions": executions,
+            "prepares": prepares,
+            "reuse_ratio": round(1 - prepares / executions, 4) if executions else 0.0,
+            "evicted_shapes": self.evicted_shapes,
+            "by_shape": [
+                {"name": s.name, "executions": s.executions, "prepares": s.prepares}
+                for s in sorted(shapes, key=lambda s: -s.executions)
+            ],
+        }
+
+
+def canonical(sql: str) -> str:
+    """Gộp khoảng trắng → cùng câu lệnh khác thụt lề vẫn là 1 shape."""
+    return " ".join(sql.split())
+
+
+registry = StatementRegistry()
+
+
+async def server_plan_stats(conn) -> List[Dict[str, Any]]:
+    """
+    Số generic/custom plan của các statement trên 1 kết nối
+    (pg_prepared_statements, cột generic_plans/custom_plans từ PostgreSQL 14).
+    """
+    rows = await conn.fetch("""
+        SELECT name, statement, prepare_time, generic_plans, custom_plans
+        FROM pg_prepared_statements
+        ORDER BY generic_plans + custom_plans DESC
+    """)
+    return [dict(r) for r in rows]
+
+
+def get_statement_stats() -> Dict[str, Any]:
+    return registry.stats()
@@ -1,21 +1,94 @@
 # warehouse_app/db/sync_wrapper.py
+"""
+EVENT LOOP NỀN DÙNG CHUNG TOÀN ỨNG DỤNG
+- 1 asyncio loop chạy mãi trong 1 thread riêng (daemon)
+- Mọi coroutine DB được gửi vào loop này → pool/prepared statement tái sử dụng
+- GUI dùng modules/async_worker.AsyncWorker (signal Qt), script dùng run_async()
+"""
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from modules.inventory import insert_inventory_entry, read_current_stock
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+from modules.inventory import add_entry, get_current_stock
 
 # chạy công việc async trong loop riêng
 _loop = asyncio.new_event_loop()
-_executor = ThreadPoolExecutor(1)
-asyncio.get_event_loop_policy().new_event_loop()  # optional start
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+
+
+def _run_loop():
+    asyncio.set_event_loop(_loop)
+    _loop.run_forever()
+
+
+def start_loop() -> asyncio.AbstractEventLoop:
+    """Khởi động thread chạy loop (gọi nhiều lần vẫn an toàn)."""
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(
+                target=_run_loop, name="db-event-loop", daemon=True)
+            _thread.start()
+    return _loop
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    return start_loop()
+
+
+def in_loop_thread() -> bool:
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit(coro: Coroutine) -> Future:
+    """Gửi coroutine vào loop nền, trả về concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, start_loop())
+
+
+def run_async(coro: Coroutine, timeout: Optional[float] = 10) -> Any:
+    """
+    Chạy coroutine trên loop nền và CHỜ kết quả (chặn thread gọi).
+    Chỉ dùng cho script / khởi động – trong GUI dùng AsyncWorker.
+    """
+    if in_loop_thread():
+        raise RuntimeError("run_async() không được gọi từ chính loop nền")
+    return submit(coro).result(timeout=timeout)
 
 
-def run_async(coro):
-    return asyncio.run_coroutine_threadsafe(coro, _loop).result(timeout=10)
+def stop_loop(timeout: float = 5):
+    """Đóng pool rồi dừng loop (gọi khi thoát ứng dụng)."""
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        return
+    from db.pool import close_pool
+    from modules.stock_refresh import scheduler
+    from modules.query_cache import cache
+    from modules.change_feed import feed
+    from modules.audit import writer as audit_writer
+    from modules.stock_snapshot import snapshots
+    from modules.rollups import rollups
+    from modules.local_mirror import mirror
+    try:
+        submit(feed.stop()).result(timeout=timeout)
+        submit(audit_writer.stop()).result(timeout=timeout)
+        submit(snapshots.stop()).result(timeout=timeout)
+        submit(rollups.stop()).result(timeout=timeout)
+        submit(mirror.stop()).result(timeout=timeout)
+        submit(scheduler.stop()).result(timeout=timeout)
+        submit(cache.stop()).result(timeout=timeout)
+        submit(close_pool()).result(timeout=timeout)
+    except Exception as e:
+        print(f"[LOOP] Lỗi đóng pool: {e}")
+    _loop.call_soon_threadsafe(_loop.stop)
+    _thread.join(timeout)
+    _thread = None
 
 
 class DatabaseHandlerSync:
     def read_current_stock(self, team_id):
-        return run_async(read_current_stock(team_id))
+        return run_async(get_current_stock(team_id))
 
     def insert_entry(self, payload):
-        return run_async(insert_inventory_entry(payload))
+        return run_async(add_entry(**payload))
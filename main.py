@@ -5,7 +5,6 @@ import os
 import sys
 import re
 import json
-import asyncio
 import logging
 import warnings
 import shutil
@@ -52,9 +51,17 @@ from PySide6.QtCore import (
 # from PySide6.QtCore import QTimer, Qt
 # from PySide6.QtGui import QPixmap
 from modules.ui.login import LoginScreen
-from modules.ui.main_window import MainWindow
+from modules.ui.main_window import MainWindow, load_categories_once
 from modules.teams import get_team_by_id
+from modules.async_worker import AsyncWorker
+from db.sync_wrapper import start_loop, stop_loop, submit
+from modules.audit import audit_maintenance
+from modules.inventory import ensure_entry_partitions
+from modules.stock_snapshot import start_stock_snapshots
+from modules.rollups import start_rollups
+from modules.local_mirror import start_local_mirror, track_team
 from config.global_vars import update_folders, get_folders
+from config.settings import LOG_LEVEL
 
 
 async def build_user_with_team(user: dict):
@@ -68,12 +75,32 @@ async def build_user_with_team(user: dict):
         user["image_folder"] = team.get("image_folder") or "images/default/"
         user["invoice_folder"] = team.get(
             "invoice_folder") or "invoices/default/"
+    # Bản sao SQLite của team (WM_LOCAL_MIRROR=1): đồng bộ lần đầu chạy nền
+    await track_team(team_id)
+    # Nạp sẵn options để MainWindow không phải chờ DB trên GUI thread
+    await load_categories_once(team_id)
     return user
 
 
 def main():
+    # Log theo mức (WM_LOG_LEVEL) thay vì tắt toàn bộ; thao tác DB chậm → WARNING
+    logging.basicConfig(
+        level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = QApplication(sys.argv)
 
+    # === LOOP NỀN DÙNG CHUNG CHO MỌI THAO TÁC DB ===
+    start_loop()
+    app.aboutToQuit.connect(stop_loop)
+    # Partition audit_log / inventory_entries tháng tới + lưu trữ tháng hết hạn (chạy nền)
+    submit(audit_maintenance())
+    submit(ensure_entry_partitions())
+    # Ảnh chụp tồn cuối ngày cho get_stock_as_of (kiểm tra lại định kỳ)
+    submit(start_stock_snapshots())
+    # Tổng hợp tuần/tháng cho tab Báo cáo (tăng dần từ phiếu mới)
+    submit(start_rollups())
+    # Bản sao đọc cục bộ (tắt mặc định – LOCAL_MIRROR_ENABLED)
+    submit(start_local_mirror())
+
     # === CHỐT: GIỚI HẠN KÍCH THƯỚC TỐI ĐA ===
     screen = app.primaryScreen().availableGeometry()
     # max_w = screen.width() - 100
@@ -82,7 +109,13 @@ def main():
     login = LoginScreen()
 
     def on_login_success(user_info):
-        user_info = asyncio.run(build_user_with_team(user_info))
+        worker = AsyncWorker(build_user_with_team, user_info)
+        worker.finished.connect(open_main_window)
+        worker.error.connect(
+            lambda msg: QMessageBox.critical(login, "Lỗi", msg))
+        worker.start()
+
+    def open_main_window(user_info):
         update_folders(
             user_info.get("image_folder"),
             user_info.get("invoice_folder")
@@ -90,6 +123,7 @@ def main():
         get_folders()
 
         window = MainWindow(user_info)
+        login.main_window = window  # giữ tham chiếu (mở từ callback)
         window.showMaximized()
         login.close()
 
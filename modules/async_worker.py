@@ -0,0 +1,58 @@
+# warehouse_app/modules/async_worker.py
+"""
+CẦU NỐI asyncio ↔ Qt
+Chạy coroutine trên loop nền dùng chung (db/sync_wrapper.py), trả kết quả
+về GUI thread qua signal → không bao giờ chặn UI, không tạo loop mới mỗi lần.
+"""
+from PySide6.QtCore import QObject, Signal, Slot
+from db.sync_wrapper import submit
+
+# Giữ tham chiếu tới worker đang chạy (tránh bị GC trước khi xong)
+_running = set()
+
+
+class AsyncWorker(QObject):
+    finished = Signal(object)
+    error = Signal(str)
+    _done = Signal(object, object)  # (result, exception) – nội bộ
+
+    def __init__(self, coro, *args, **kwargs):
+        super().__init__()
+        self.coro = coro
+        self.args = args
+        self.kwargs = kwargs
+        self.future = None
+        # Slot thuộc QObject ở GUI thread → emit từ loop nền sẽ được queue
+        self._done.connect(self._deliver)
+
+    def start(self):
+        _running.add(self)
+        self.future = submit(self.coro(*self.args, **self.kwargs))
+        self.future.add_done_callback(self._on_future_done)
+        return self
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+
+    def isRunning(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    def _on_future_done(self, future):
+        # Chạy trong thread của loop nền
+        if future.cancelled():
+            self._done.emit(None, None)
+            return
+        exc = future.exception()
+        self._done.emit(None if exc else future.result(), exc)
+
+    @Slot(object, object)
+    def _deliver(self, result, exc):
+        # Chạy trong GUI thread
+        _running.discard(self)
+        if self.future is not None and self.future.cancelled():
+            return
+        if exc is not None:
+            self.error.emit(str(exc))
+        else:
+            self.finished.emit(result)
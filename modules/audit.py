@@ -0,0 +1,161 @@
+# warehouse_app/modules/audit.py
+"""
+GHI AUDIT LOG THEO LÔ
+- Nơi ghi lấy dữ liệu cũ/mới từ RETURNING của chính câu lệnh ghi
+  (RETURNING to_jsonb(...)) – không SELECT lại dòng vừa ghi
+- audited_transaction(conn): mở transaction, gom mọi dòng audit của
+  transaction rồi ghi 1 lần:
+    AUDIT_WRITE_MODE = "inline"   → 1 INSERT ... unnest() trước COMMIT
+                                    (audit và dữ liệu cùng commit)
+    AUDIT_WRITE_MODE = "deferred" → sau COMMIT đẩy vào hàng đợi, AuditWriter
+                                    COPY theo lô (nhanh hơn, mất audit nếu
+                                    ứng dụng chết trước lần flush)
+- audit_maintenance(): tạo trước partition tháng tới + lưu trữ partition cũ
+  (db/migrations/0006_audit_log_partition.sql)
+Chạy trên loop nền (db/sync_wrapper.py).
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from db.pool import acquire
+from db.metrics import instrument_module
+from config.settings import (
+    AUDIT_WRITE_MODE, AUDIT_FLUSH_INTERVAL, AUDIT_FLUSH_BATCH,
+    AUDIT_PARTITIONS_AHEAD, AUDIT_RETENTION_MONTHS, AUDIT_DROP_EXPIRED,
+)
+
+AUDIT_COLUMNS = ["table_name", "record_id", "action", "old_row_data",
+                 "new_row_data", "changed_by", "changed_at"]
+MAINTENANCE_LOCK_KEY = 74_202  # chỉ 1 client tạo/tách partition cùng lúc
+
+
+class AuditBatch:
+    """Các dòng audit của 1 transaction."""
+
+    def __init__(self, table_name: str = "inventory_entries"):
+        self.table_name = table_name
+        self.rows: List[tuple] = []
+
+    def add(self, action: str, record_id: int, old: Optional[str] = None,
+            new: Optional[str] = None, changed_by: Optional[int] = None):
+        """old/new: JSON (chuỗi) lấy từ RETURNING to_jsonb(...)."""
+        self.rows.append((self.table_name, record_id, action, old, new,
+                          changed_by, datetime.now(timezone.utc)))
+
+    def add_rows(self, action: str, rows, changed_by: Optional[int] = None):
+        """rows: record có cột id, old_data và/hoặc new_data."""
+        for r in rows:
+            self.add(action, r["id"], r.get("old_data"), r.get("new_data"),
+                     changed_by if changed_by is not None else r.get("changed_by"))
+
+    async def write(self, conn):
+        if not self.rows:
+            return
+        cols = list(zip(*self.rows))
+        await conn.execute("""
+            INSERT INTO audit_log (table_name, record_id, action, old_row_data,
+                                   new_row_data, changed_by)
+            SELECT * FROM unnest($1::text[], $2::bigint[], $3::text[],
+                                 $4::jsonb[], $5::jsonb[], $6::int[])
+        """, list(cols[0]), list(cols[1]), list(cols[2]),
+            list(cols[3]), list(cols[4]), list(cols[5]))
+
+
+@asynccontextmanager
+async def audited_transaction(conn, table_name: str = "inventory_entries"):
+    """
+        async with audited_transaction(conn) as audit:
+            row = await conn.fetchrow("... RETURNING id, to_jsonb(t) AS new_data")
+            audit.add("I", row["id"], new=row["new_data"], changed_by=user_id)
+    """
+    batch = AuditBatch(table_name)
+    async with conn.transaction():
+        yield batch
+        if AUDIT_WRITE_MODE != "deferred":
+            await batch.write(conn)
+    if AUDIT_WRITE_MODE == "deferred":
+        writer.enqueue(batch.rows)
+
+
+# ----------------------------------------------------------------------
+# Ghi trễ theo lô (AUDIT_WRITE_MODE = "deferred")
+# ----------------------------------------------------------------------
+class AuditWriter:
+    def __init__(self, interval: float = AUDIT_FLUSH_INTERVAL,
+                 batch_size: int = AUDIT_FLUSH_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._buffer: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"enqueued": 0, "written": 0, "flushes": 0, "failures": 0}
+
+    def enqueue(self, rows: List[tuple]):
+        if not rows:
+            return
+        self._buffer.extend(rows)
+        self.stats["enqueued"] += len(rows)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._buffer:
+            if len(self._buffer) < self.batch_size:
+                await asyncio.sleep(self.interval)
+            if not await self.flush():
+                await asyncio.sleep(self.interval * 5)  # lỗi → thử lại sau
+
+    async def flush(self) -> bool:
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return True
+        try:
+            async with acquire() as conn:
+                await conn.copy_records_to_table(
+                    "audit_log", records=rows, columns=AUDIT_COLUMNS)
+        except Exception as e:
+            print(f"[AUDIT] Lỗi ghi {len(rows)} dòng: {e}")
+            self.stats["failures"] += 1
+            self._buffer[:0] = rows  # giữ lại, thử lại lần sau
+            return False
+        self.stats["written"] += len(rows)
+        self.stats["flushes"] += 1
+        return True
+
+    async def stop(self):
+        """Ghi nốt hàng đợi khi thoát ứng dụng."""
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+
+
+writer = AuditWriter()
+
+
+# ----------------------------------------------------------------------
+# Bảo trì partition
+# ----------------------------------------------------------------------
+async def audit_maintenance() -> Dict[str, Any]:
+    """Tạo trước partition + lưu trữ partition hết hạn (gọi khi khởi động)."""
+    try:
+        async with acquire() as conn:
+            async with conn.transaction():
+                if not await conn.fetchval(
+                        "SELECT pg_try_advisory_xact_lock($1)", MAINTENANCE_LOCK_KEY):
+                    return {"created": 0, "archived": 0}
+                created = await conn.fetchval(
+                    "SELECT audit_log_ensure_partitions($1)", AUDIT_PARTITIONS_AHEAD)
+                archived = 0
+                if AUDIT_RETENTION_MONTHS:
+                    archived = await conn.fetchval(
+                        "SELECT audit_log_archive($1, $2)",
+                        AUDIT_RETENTION_MONTHS, AUDIT_DROP_EXPIRED)
+        return {"created": created, "archived": archived}
+    except Exception as e:
+        print(f"[AUDIT] Lỗi bảo trì partition: {e}")
+        return {"created": 0, "archived": 0, "error": str(e)}
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
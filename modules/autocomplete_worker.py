@@ -1,29 +1,113 @@
 # modules/autocomplete_worker.py
-from PySide6.QtCore import QThread, Signal, QObject
-import asyncio
+"""
+DỊCH VỤ GỢI Ý (AUTOCOMPLETE) DÙNG CHUNG
+- Debounce: chỉ tra khi ngừng gõ AUTOCOMPLETE_DEBOUNCE_MS
+- Gõ tiếp khi query cũ đang chạy → hủy future cũ (loop nền dùng chung)
+- Mỗi lần tra có số thứ tự: kết quả đến muộn / sai thứ tự bị bỏ
+- Đo thời gian từng lần tra (ms) → signal + stats()
+"""
+import time
+from typing import Any, Dict, List
 
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+from db.sync_wrapper import submit
+from config.settings import AUTOCOMPLETE_DEBOUNCE_MS, AUTOCOMPLETE_MIN_CHARS
 
-class AutocompleteWorker(QObject):
-    finished = Signal(list)
 
-    def __init__(self, team_id: int, prefix: str, func):
-        super().__init__()
-        self.team_id = team_id
-        self.prefix = prefix
+class AutocompleteService(QObject):
+    # (chuỗi đã tra, gợi ý, thời gian ms)
+    suggestions_ready = Signal(str, list, float)
+    _done = Signal(int, str, object, float)  # nội bộ: loop nền → GUI thread
+
+    def __init__(self, func, team_id: int, limit: int = 20,
+                 debounce_ms: int = AUTOCOMPLETE_DEBOUNCE_MS,
+                 min_chars: int = AUTOCOMPLETE_MIN_CHARS, parent=None):
+        """func: async func(team_id, text, limit) -> list[str]"""
+        super().__init__(parent)
         self.func = func
+        self.team_id = team_id
+        self.limit = limit
+        self.min_chars = min_chars
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._dispatch)
+        self._done.connect(self._deliver)
+
+        self._text = ""
+        self._seq = 0
+        self._future = None
+        self._latencies: List[float] = []
+        self._stats = {"requests": 0, "queries": 0, "cancelled": 0,
+                       "stale": 0, "errors": 0}
+
+    # -------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------
+    def request(self, text: str):
+        """Gọi mỗi lần ô nhập đổi (textChanged)."""
+        self._stats["requests"] += 1
+        self._text = text.strip()
+        self._cancel_inflight()
+        if len(self._text) < self.min_chars:
+            self._timer.stop()
+            self._seq += 1  # kết quả nào còn bay về đều bị bỏ
+            self.suggestions_ready.emit(self._text, [], 0.0)
+            return
+        self._timer.start()  # start lại = debounce
+
+    def cancel(self):
+        self._timer.stop()
+        self._seq += 1
+        self._cancel_inflight()
+
+    def stats(self) -> Dict[str, Any]:
+        lat = sorted(self._latencies)
+        return {
+            **self._stats,
+            "last_ms": round(self._latencies[-1], 2) if lat else 0.0,
+            "avg_ms": round(sum(lat) / len(lat), 2) if lat else 0.0,
+            "p95_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 2) if lat else 0.0,
+        }
+
+    # -------------------------------------------------------------
+    # Nội bộ
+    # -------------------------------------------------------------
+    def _cancel_inflight(self):
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+            self._stats["cancelled"] += 1
+        self._future = None
+
+    def _dispatch(self):
+        self._seq += 1
+        seq, text = self._seq, self._text
+        started = time.perf_counter()
+        self._stats["queries"] += 1
+        future = submit(self.func(self.team_id, text, self.limit))
+        self._future = future
+
+        def on_done(f):
+            # Chạy trong thread loop nền
+            if f.cancelled():
+                return
+            elapsed = (time.perf_counter() - started) * 1000
+            exc = f.exception()
+            self._done.emit(seq, text, exc if exc else f.result(), elapsed)
+
+        future.add_done_callback(on_done)
 
-    def run(self):
-        # print(
-        #     f"[WORKER] Bắt đầu tìm: team_id={self.team_id}, prefix='{self.prefix}'")
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            suggestions = loop.run_until_complete(
-                self.func(self.team_id, self.prefix))
-            # print(f"[WORKER] Hoàn thành: {suggestions}")
-            self.finished.emit(suggestions)
-        except Exception as e:
-            print(f"[WORKER] Lỗi: {e}")
-            self.finished.emit([])
-        finally:
-            loop.close()
+    @Slot(int, str, object, float)
+    def _deliver(self, seq: int, text: str, result, elapsed_ms: float):
+        if seq != self._seq:
+            self._stats["stale"] += 1  # đã có lần tra mới hơn
+            return
+        self._future = None
+        if isinstance(result, BaseException):
+            self._stats["errors"] += 1
+            print(f"[AUTOCOMPLETE] Lỗi: {result}")
+            result = []
+        self._latencies.append(elapsed_ms)
+        del self._latencies[:-200]  # giữ 200 lần gần nhất
+        self.suggestions_ready.emit(text, list(result or []), elapsed_ms)
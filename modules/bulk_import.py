@@ -0,0 +1,251 @@
+# warehouse_app/modules/bulk_import.py
+"""
+NHẬP HÀNG LOẠT PHIẾU KHO TỪ FILE CSV / XLSX
+- Kiểm tra từng dòng bằng InventoryEntryCreate (db/models.py)
+- COPY (copy_records_to_table) vào bảng tạm → 1 câu INSERT ... SELECT vào
+  inventory_entries + audit_log cho cả lô, trong 1 transaction
+- Dòng "out" trong file: khóa dòng tồn (FOR UPDATE) và kiểm tra trong CÙNG
+  transaction, thiếu tồn ở bất kỳ mã nào → không ghi gì (như pick list)
+- Chỉ yêu cầu refresh view tồn kho 1 lần ở cuối, báo tốc độ dòng/giây
+"""
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple
+
+from pydantic import ValidationError
+from db.models import InventoryEntryCreate
+from db.pool import acquire
+from db.metrics import instrument_module
+from modules.stock_refresh import request_refresh
+from modules.query_cache import notify_team_changed, invalidate_team
+from modules.name_index import note_component_names
+from modules.pick_list import PickListError
+
+IMPORT_COLUMNS = [
+    "component_id", "component_name", "group_name", "process", "model", "size",
+    "unit", "team_id", "material", "storage_location", "invoice", "modinvoice",
+    "status", "note", "quantity", "movement_type", "created_by",
+]
+LIST_COLUMNS = ("group_name", "process", "model", "material")
+# Trường bắt buộc kiểu chuỗi: ô trống → "" thay vì lỗi thiếu trường
+REQUIRED_TEXT_COLUMNS = ("size", "invoice", "modinvoice", "note")
+MOVEMENT_TYPES = ("in", "out", "adjustment")
+
+
+# ----------------------------------------------------------------------
+# 1. Đọc file
+# ----------------------------------------------------------------------
+def read_import_file(path: str) -> List[Dict[str, Any]]:
+    """Đọc CSV/XLSX → list dict, tên cột chuẩn hóa (chữ thường, '_')."""
+    import pandas as pd
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    elif ext in (".xlsx", ".xls"):
+        df = pd.read_excel(path, dtype=str, keep_default_na=False)
+    else:
+        raise ValueError(f"Không hỗ trợ định dạng: {ext}")
+
+    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    return df.to_dict("records")
+
+
+# ----------------------------------------------------------------------
+# 2. Kiểm tra dữ liệu
+# ----------------------------------------------------------------------
+def _normalize_row(raw: Dict[str, Any], team_id: int, created_by: int,
+                   default_movement_type: str) -> Dict[str, Any]:
+    row = {}
+    for key in IMPORT_COLUMNS:
+        value = raw.get(key)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ""):
+            if key in REQUIRED_TEXT_COLUMNS:
+                row[key] = ""
+            continue
+        if key in LIST_COLUMNS and isinstance(value, str):
+            value = [x.strip() for x in value.split(",") if x.strip()]
+        row[key] = value
+
+    row["team_id"] = team_id          # luôn nhập vào team đang đăng nhập
+    row["created_by"] = created_by
+    row.setdefault("movement_type", default_movement_type)
+    if "component_id" in row:
+        row["component_id"] = str(row["component_id"]).upper()
+    return row
+
+
+def validate_rows(
+    raw_rows: List[Dict[str, Any]], team_id: int, created_by: int,
+    default_movement_type: str = "in",
+) -> Tuple[List[InventoryEntryCreate], List[Tuple[int, str]]]:
+    """Trả về (các dòng hợp lệ, [(số dòng trong file, lỗi)])."""
+    valid: List[InventoryEntryCreate] = []
+    errors: List[Tuple[int, str]] = []
+
+    for i, raw in enumerate(raw_rows, start=2):  # dòng 1 là header
+        try:
+            entry = InventoryEntryCreate(
+                **_normalize_row(raw, team_id, created_by, default_movement_type))
+        except ValidationError as e:
+            msg = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}"
+                for err in e.errors())
+            errors.append((i, msg))
+            continue
+
+        # inventory_entries.quantity là INTEGER > 0
+        if entry.quantity <= 0 or entry.quantity != int(entry.quantity):
+            errors.append((i, f"quantity phải là số nguyên > 0: {entry.quantity}"))
+            continue
+        if entry.movement_type not in MOVEMENT_TYPES:
+            errors.append((i, f"movement_type không hợp lệ: {entry.movement_type}"))
+            continue
+        valid.append(entry)
+
+    return valid, errors
+
+
+# ----------------------------------------------------------------------
+# 3. Ghi hàng loạt (COPY + 1 INSERT ... SELECT + audit theo lô)
+# ----------------------------------------------------------------------
+def _to_record(entry: InventoryEntryCreate) -> tuple:
+    values = []
+    for col in IMPORT_COLUMNS:
+        value = getattr(entry, col)
+        if col in LIST_COLUMNS:
+            value = list(value or [])
+        elif col == "quantity":
+            value = int(value)
+        values.append(value)
+    return tuple(values)
+
+
+# Khóa theo thứ tự (team, mã) → không deadlock với pick list / xuất lẻ
+LOCK_STOCK_SQL = """
+    SELECT sb.team_id, sb.component_id, sb.current_quantity
+    FROM stock_balance sb
+    JOIN unnest($1::int[], $2::text[]) AS k(team_id, component_id)
+      ON sb.team_id = k.team_id AND sb.component_id = k.component_id
+    ORDER BY sb.team_id, sb.component_id
+    FOR UPDATE OF sb
+"""
+
+
+async def _check_out_stock(conn, entries: List[InventoryEntryCreate]) -> None:
+    """
+    Tồn hiện tại + dòng nhập trong cùng lô phải đủ cho tổng dòng "out"
+    của từng mã; thiếu → PickListError (transaction rollback).
+    """
+    out_qty: Dict[Tuple[int, str], int] = defaultdict(int)
+    in_qty: Dict[Tuple[int, str], int] = defaultdict(int)
+    for e in entries:
+        key = (e.team_id, e.component_id)
+        if e.movement_type == "out":
+            out_qty[key] += int(e.quantity)
+        else:
+            in_qty[key] += int(e.quantity)
+    if not out_qty:
+        return
+
+    keys = sorted(out_qty)
+    rows = await conn.fetch(
+        LOCK_STOCK_SQL, [k[0] for k in keys], [k[1] for k in keys])
+    stock = {(r["team_id"], r["component_id"]): int(r["current_quantity"] or 0)
+             for r in rows}
+    shortages = []
+    for key in keys:
+        available = stock.get(key, 0) + in_qty.get(key, 0)
+        if out_qty[key] > available:
+            shortages.append({"component_id": key[1],
+                              "requested": out_qty[key], "available": available})
+    if shortages:
+        raise PickListError(shortages)
+
+
+async def bulk_insert_entries(entries: List[InventoryEntryCreate]) -> Dict[str, Any]:
+    """Ghi cả lô trong 1 transaction, trả về số dòng + tốc độ."""
+    if not entries:
+        return {"rows": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+
+    started = time.perf_counter()
+    records = [_to_record(e) for e in entries]
+    teams = {e.team_id for e in entries}
+    cols = ", ".join(IMPORT_COLUMNS)
+
+    async with acquire() as conn:
+        async with conn.transaction():
+            await _check_out_stock(conn, entries)
+            await conn.execute("""
+                CREATE TEMP TABLE import_staging (
+                    component_id VARCHAR(100), component_name TEXT,
+                    group_name TEXT[], process TEXT[], model TEXT[], size TEXT,
+                    unit TEXT, team_id INTEGER, material TEXT[],
+                    storage_location TEXT, invoice TEXT, modinvoice TEXT,
+                    status TEXT, note TEXT, quantity INTEGER,
+                    movement_type VARCHAR(20), created_by INTEGER
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table(
+                "import_staging", records=records, columns=IMPORT_COLUMNS)
+
+            # audit_log ghi từ RETURNING của chính câu INSERT (không SELECT lại);
+            # lô lớn luôn ghi trong cùng câu lệnh, không qua modules/audit.py
+            # (tránh kéo JSON từng dòng về client)
+            inserted = await conn.fetchval(f"""
+                WITH ins AS (
+                    INSERT INTO inventory_entries (
+                        {cols}, updated_by, created_at, updated_at
+                    )
+                    SELECT {cols}, created_by, NOW(), NOW()
+                    FROM import_staging
+                    RETURNING *
+                ), aud AS (
+                    INSERT INTO audit_log (table_name, record_id, action, new_row_data, changed_by)
+                    SELECT 'inventory_entries', ins.id, 'I', to_jsonb(ins), ins.created_by
+                    FROM ins
+                    RETURNING 1
+                )
+                SELECT COUNT(*) FROM aud
+            """)
+            txid = None
+            for team_id in teams:
+                txid = await notify_team_changed(conn, team_id)
+
+    # Chỉ 1 lần refresh view / xóa cache cho cả lô
+    for team_id in teams:
+        invalidate_team(team_id)
+        note_component_names(
+            team_id, {e.component_name for e in entries if e.team_id == team_id})
+    request_refresh(txid)
+
+    seconds = time.perf_counter() - started
+    rows_per_sec = inserted / seconds if seconds > 0 else 0.0
+    print(f"[BULK IMPORT] {inserted} dòng trong {seconds:.2f}s "
+          f"({rows_per_sec:,.0f} dòng/giây)")
+    return {"rows": inserted, "seconds": seconds, "rows_per_sec": rows_per_sec}
+
+
+async def import_file(path: str, team_id: int, created_by: int,
+                      default_movement_type: str = "in") -> Dict[str, Any]:
+    """
+    Đọc + kiểm tra file (ngoài loop, tránh chặn DB khác) rồi ghi hàng loạt.
+    Có dòng lỗi → KHÔNG ghi gì, trả về danh sách lỗi.
+    """
+    raw_rows = await asyncio.to_thread(read_import_file, path)
+    entries, errors = await asyncio.to_thread(
+        validate_rows, raw_rows, team_id, created_by, default_movement_type)
+    if errors:
+        return {"rows": 0, "total": len(raw_rows), "errors": errors}
+
+    result = await bulk_insert_entries(entries)
+    result.update({"total": len(raw_rows), "errors": []})
+    return result
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
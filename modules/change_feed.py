@@ -0,0 +1,193 @@
+# warehouse_app/modules/change_feed.py
+"""
+LUỒNG THAY ĐỔI TỪ CÁC CLIENT KHÁC (LISTEN 'inventory_changes')
+- Trigger trg_notify_inventory_change (db/migrations/0004_change_feed.sql) NOTIFY mỗi dòng
+- Gom sự kiện theo team trong CHANGE_FEED_BATCH_DELAY giây → 2 query:
+  đọc lại các phiếu (id = ANY) + số tồn của các mã bị ảnh hưởng
+- Giao cho subscriber 1 "change set" để UI cập nhật bảng tại chỗ,
+  quá nhiều sự kiện (nhập hàng loạt) → báo reload thay vì từng dòng
+Chạy trên loop nền (db/sync_wrapper.py); callback được gọi trong thread loop.
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, List, Set
+
+from db.pool import acquire, connect_dedicated
+from db.metrics import instrument_module
+from modules.query_cache import invalidate_team
+from modules.name_index import note_component_names, forget_team
+from config.settings import CHANGE_FEED_BATCH_DELAY, CHANGE_FEED_MAX_BATCH
+
+CHANGE_CHANNEL = "inventory_changes"
+RECONNECT_DELAY = 5.0
+
+
+class ChangeFeed:
+    def __init__(self, batch_delay: float = CHANGE_FEED_BATCH_DELAY,
+                 max_batch: int = CHANGE_FEED_MAX_BATCH):
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+        self._subscribers: Dict[int, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._pending: Dict[int, List[Dict[str, Any]]] = {}
+        self._flush_handles: Dict[int, asyncio.TimerHandle] = {}
+        self._listener = None
+        self._reconnect_task = None
+
+    # -------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------
+    async def subscribe(self, team_id: int, callback: Callable[[Dict[str, Any]], None]):
+        self._subscribers.setdefault(team_id, []).append(callback)
+        await self._ensure_listener()
+
+    def unsubscribe(self, team_id: int, callback):
+        callbacks = self._subscribers.get(team_id, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    async def stop(self):
+        self._subscribers.clear()  # không reconnect / reload khi đóng
+        for handle in self._flush_handles.values():
+            handle.cancel()
+        self._flush_handles.clear()
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._listener is not None:
+            try:
+                await self._listener.close()
+            except Exception:
+                pass
+            self._listener = None
+
+    # -------------------------------------------------------------
+    # LISTEN + tự kết nối lại
+    # -------------------------------------------------------------
+    async def _ensure_listener(self):
+        if self._listener is not None:
+            return
+        try:
+            conn = await connect_dedicated()
+            await conn.add_listener(CHANGE_CHANNEL, self._on_notify)
+            conn.add_termination_listener(self._on_terminated)
+            self._listener = conn
+        except Exception as e:
+            print(f"[CHANGE FEED] Không LISTEN được: {e}")
+            self._schedule_reconnect()
+
+    def _on_terminated(self, conn):
+        # Mất kết nối → có thể đã lỡ sự kiện, bảo UI tải lại toàn bộ
+        self._listener = None
+        for team_id in list(self._subscribers):
+            self._deliver(team_id, {"team_id": team_id, "reload": True})
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            return
+
+        async def _reconnect():
+            await asyncio.sleep(RECONNECT_DELAY)
+            if self._subscribers:
+                await self._ensure_listener()
+
+        self._reconnect_task = asyncio.get_running_loop().create_task(_reconnect())
+
+    # -------------------------------------------------------------
+    # Gom sự kiện
+    # -------------------------------------------------------------
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+            team_id = int(event["team_id"])
+        except (ValueError, KeyError, TypeError):
+            return
+        if not self._subscribers.get(team_id):
+            return
+        self._pending.setdefault(team_id, []).append(event)
+        if team_id not in self._flush_handles:
+            loop = asyncio.get_running_loop()
+            self._flush_handles[team_id] = loop.call_later(
+                self.batch_delay,
+                lambda: loop.create_task(self._flush(team_id)))
+
+    async def _flush(self, team_id: int):
+        self._flush_handles.pop(team_id, None)
+        events = self._pending.pop(team_id, [])
+        if not events:
+            return
+        # Dữ liệu team đã đổi → bỏ cache truy vấn (modules/query_cache.py)
+        invalidate_team(team_id)
+
+        if len(events) > self.max_batch:
+            forget_team(team_id)  # gợi ý tên nạp lại khi cần
+            self._deliver(team_id, {"team_id": team_id, "reload": True})
+            return
+        try:
+            changes = await self._load_changes(team_id, events)
+            note_component_names(
+                team_id, (r["component_name"] for r in changes["upserted"]))
+        except Exception as e:
+            print(f"[CHANGE FEED] Lỗi đọc thay đổi: {e}")
+            changes = {"team_id": team_id, "reload": True}
+        self._deliver(team_id, changes)
+
+    async def _load_changes(self, team_id: int, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Sự kiện cuối cùng của mỗi id quyết định (I rồi D → chỉ còn D)
+        last_op: Dict[int, str] = {}
+        components: Set[str] = set()
+        for ev in events:
+            last_op[int(ev["id"])] = ev["op"]
+            components.add(ev["component_id"])
+            if ev.get("old_component_id"):
+                components.add(ev["old_component_id"])
+
+        live_ids = [i for i, op in last_op.items() if op != "D"]
+        async with acquire() as conn:
+            entries = await conn.fetch("""
+                SELECT id, component_id, component_name, group_name,
+                       process, model, size, unit, material,
+                       storage_location, invoice, modinvoice,
+                       status, note, quantity, movement_type,
+                       created_at, created_by
+                FROM inventory_entries
+                WHERE team_id = $1 AND id = ANY($2::bigint[])
+                ORDER BY created_at DESC, id DESC
+            """, team_id, live_ids) if live_ids else []
+            stock = await conn.fetch("""
+                SELECT component_id, component_name, current_quantity,
+                       unit, status, note
+                FROM stock_balance
+                WHERE team_id = $1 AND component_id = ANY($2::text[])
+                  AND current_quantity > 0
+            """, team_id, list(components))
+
+        upserted = [dict(r) for r in entries]
+        found = {r["id"] for r in upserted}
+        in_stock = {r["component_id"] for r in stock}
+        return {
+            "team_id": team_id,
+            "reload": False,
+            "upserted": upserted,
+            # Bị xóa, hoặc đã xóa tiếp trước khi kịp đọc lại
+            "deleted": [i for i in last_op if i not in found],
+            "stock": [dict(r) for r in stock],
+            "stock_removed": sorted(components - in_stock),
+        }
+
+    def _deliver(self, team_id: int, changes: Dict[str, Any]):
+        for callback in list(self._subscribers.get(team_id, [])):
+            try:
+                callback(changes)
+            except Exception as e:
+                print(f"[CHANGE FEED] Lỗi subscriber: {e}")
+
+
+feed = ChangeFeed()
+
+
+async def subscribe(team_id: int, callback):
+    await feed.subscribe(team_id, callback)
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
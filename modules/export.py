@@ -0,0 +1,302 @@
+# warehouse_app/modules/export.py
+"""
+XUẤT FILE TRỰC TIẾP TỪ DB (XLSX / CSV / PARQUET)
+- Đọc bằng server-side cursor (search.iter_entries / iter_current_stock) với
+  đúng bộ lọc tab đang dùng → không đọc lại chữ trong bảng giao diện
+- Ghi từng lô ngay khi nhận → bộ nhớ chỉ giữ 1-2 lô, dù xuất hàng triệu dòng
+  (xlsxwriter constant_memory / openpyxl write_only, csv, pyarrow ParquetWriter)
+- Giữ kiểu cột: số là số, thời gian là ngày giờ, mảng là list (Parquet)
+  hoặc chuỗi "a, b" (Excel / CSV)
+- Ghi file trong thread phụ (asyncio.to_thread), song song với fetch lô sau
+- Hủy (task bị cancel) → đóng cursor, xóa file dở
+"""
+import asyncio
+import csv
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import EXPORT_BATCH_SIZE, EXPORT_XLSX_ENGINE
+from db.metrics import instrument_module
+from modules.search import ENTRY_COLUMNS, STOCK_COLUMNS, iter_entries, iter_current_stock
+
+EXCEL_MAX_ROWS = 1_048_576   # giới hạn 1 sheet (kể cả dòng tiêu đề)
+
+INT_COLUMNS = {"id", "quantity", "current_quantity", "team_id", "created_by"}
+DATETIME_COLUMNS = {"created_at", "updated_at"}
+LIST_COLUMNS = {"group_name", "process", "model", "material"}
+
+
+def _column_names(select_list: str) -> List[str]:
+    """ENTRY_COLUMNS / STOCK_COLUMNS → tên cột (bỏ tiền tố bảng)."""
+    return [c.strip().split(".")[-1] for c in select_list.split(",") if c.strip()]
+
+
+# kind → (hàm duyệt lô, tên cột theo đúng thứ tự SELECT)
+SOURCES = {
+    "entries": (iter_entries, _column_names(ENTRY_COLUMNS)),
+    "stock": (iter_current_stock, _column_names(STOCK_COLUMNS)),
+}
+
+
+def _local(value: datetime) -> datetime:
+    # Excel không có múi giờ → đổi về giờ máy, bỏ tzinfo
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+
+
+def _flat(value: Any) -> Any:
+    """Giá trị cho Excel / CSV (không có kiểu mảng)."""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    if isinstance(value, datetime):
+        return _local(value)
+    return value
+
+
+# Ô CSV bắt đầu bằng các ký tự này bị Excel hiểu là công thức
+# (ghi chú do người dùng nhập) → thêm ' phía trước, giống strings_to_formulas=False
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_value(value: Any) -> Any:
+    value = _flat(value)
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+# ----------------------------------------------------------------------
+# 1. Bộ ghi: open() → write_rows(lô) … → close(); abort() khi hủy / lỗi
+# ----------------------------------------------------------------------
+class _Writer:
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.columns = columns
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def abort(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class CsvWriter(_Writer):
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        # utf-8-sig: Excel mở đúng tiếng Việt
+        self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(columns)
+
+    def write_rows(self, rows):
+        cols = self.columns
+        self._csv.writerows([_csv_value(r.get(c)) for c in cols] for r in rows)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxWriter(_Writer):
+    """xlsxwriter constant_memory: mỗi dòng ghi xong là xả ra đĩa."""
+
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        import xlsxwriter
+
+        self._book = xlsxwriter.Workbook(path, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            # Giữ nguyên chuỗi như "=A1" hay URL dài (ghi chú do người dùng nhập)
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+        })
+        self._bold = self._book.add_format({"bold": True})
+        self._sheet = None
+        self._sheets = 0
+        self._row = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._sheets += 1
+        self._sheet = self._book.add_worksheet(
+            "Data" if self._sheets == 1 else f"Data{self._sheets}")
+        self._sheet.write_row(0, 0, self.columns, self._bold)
+        self._sheet.freeze_panes(1, 0)
+        self._row = 1
+
+    def write_rows(self, rows):
+        cols = self.columns
+        for r in rows:
+            if self._row >= EXCEL_MAX_ROWS:
+                self._new_sheet()
+            # write() tự chọn write_number / write_datetime / write_string;
+            # None → ô trống
+            self._sheet.write_row(self._row, 0, [_flat(r.get(c)) for c in cols])
+            self._row += 1
+
+    def close(self):
+        self._book.close()
+
+
+class OpenpyxlWriter(_Writer):
+    """openpyxl write_only – dùng khi không có xlsxwriter."""
+
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        from openpyxl import Workbook
+
+        self._book = Workbook(write_only=True)
+        self._sheet = None
+        self._sheets = 0
+        self._row = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._sheets += 1
+        self._sheet = self._book.create_sheet(
+            "Data" if self._sheets == 1 else f"Data{self._sheets}")
+        self._sheet.freeze_panes = "A2"
+        self._sheet.append(self.columns)
+        self._row = 1
+
+    def write_rows(self, rows):
+        cols = self.columns
+        for r in rows:
+            if self._row >= EXCEL_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.append([self._value(r.get(c)) for c in cols])
+            self._row += 1
+
+    def _value(self, value):
+        # openpyxl tự coi chuỗi "=..." là công thức → ép thành ô chuỗi
+        value = _flat(value)
+        if isinstance(value, str) and value.startswith("="):
+            from openpyxl.cell import WriteOnlyCell
+
+            cell = WriteOnlyCell(self._sheet, value)
+            cell.data_type = "s"
+            return cell
+        return value
+
+    def close(self):
+        self._book.save(self.path)
+
+
+class ParquetWriter(_Writer):
+    """pyarrow: schema cố định theo cột → mảng giữ nguyên list<string>."""
+
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        def field_type(name):
+            if name in INT_COLUMNS:
+                return pa.int64()
+            if name in DATETIME_COLUMNS:
+                return pa.timestamp("us", tz="UTC")
+            if name in LIST_COLUMNS:
+                return pa.list_(pa.string())
+            return pa.string()
+
+        self._pa = pa
+        self._schema = pa.schema([(c, field_type(c)) for c in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write_rows(self, rows):
+        self._writer.write_table(
+            self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _xlsx_writer(path, columns):
+    if EXPORT_XLSX_ENGINE == "xlsxwriter":
+        try:
+            return XlsxWriter(path, columns)
+        except ImportError:
+            pass
+    return OpenpyxlWriter(path, columns)
+
+
+WRITERS: Dict[str, Callable[[str, List[str]], _Writer]] = {
+    ".xlsx": _xlsx_writer,
+    ".csv": CsvWriter,
+    ".parquet": ParquetWriter,
+}
+
+
+def open_writer(path: str, columns: List[str]) -> _Writer:
+    ext = os.path.splitext(path)[1].lower()
+    factory = WRITERS.get(ext)
+    if factory is None:
+        raise ValueError(f"Không hỗ trợ định dạng: {ext}")
+    return factory(path, columns)
+
+
+# ----------------------------------------------------------------------
+# 2. Xuất
+# ----------------------------------------------------------------------
+async def export_to_file(
+    kind: str,
+    team_id: int,
+    filters: Optional[Dict[str, Any]],
+    path: str,
+    progress: Optional[Callable[[int], None]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    kind: "entries" (lịch sử nhập/xuất) | "stock" (tồn kho).
+    progress(số dòng đã ghi) gọi sau mỗi lô, trên loop nền.
+    Trả về {"path", "rows", "seconds"}.
+    """
+    iterate, columns = SOURCES[kind]
+    started = time.perf_counter()
+    writer = await asyncio.to_thread(open_writer, path, columns)
+    written = 0
+    pending = None  # lô đang ghi trong thread phụ
+    batches = iterate(team_id, filters, batch_size=batch_size)
+    try:
+        async for rows in batches:
+            if pending is not None:
+                # shield: hủy export không hủy ngang lô đang ghi trong thread
+                await asyncio.shield(pending)
+            pending = asyncio.ensure_future(asyncio.to_thread(writer.write_rows, rows))
+            written += len(rows)
+            if progress:
+                progress(written)
+        if pending is not None:
+            await asyncio.shield(pending)
+        await asyncio.to_thread(writer.close)
+    except BaseException:
+        # Hủy / lỗi giữa chừng: chờ lô đang ghi (thread không dừng được) rồi xóa file dở
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        await batches.aclose()
+        await asyncio.to_thread(writer.abort)
+        raise
+    return {
+        "path": path,
+        "rows": written,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
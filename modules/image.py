@@ -1,44 +1,19 @@
 # warehouse_app/modules/image.py
 import os
 from PySide6.QtGui import QPixmap
-from PySide6.QtCore import QThread, Signal, Qt
+from PySide6.QtCore import QSize, Qt
 from config.settings import IMAGE_LABEL_SIZE, DEFAULT_IMAGE_PATH
 from config.global_vars import get_folders  # ← DÙNG CHUNG
+from modules.thumbnail_cache import get_thumbnail_cache  # cache RAM + đĩa
 
-# Cache ảnh
-_image_cache = {}
 
-
-class ImageLoader(QThread):
-    finished = Signal(str, QPixmap)
-
-    def __init__(self, image_path, size=IMAGE_LABEL_SIZE, parent=None):
-        super().__init__(parent)
-        self.image_path = image_path
-        self.size = size
-
-    def run(self):
-        try:
-            if not os.path.isfile(self.image_path):
-                raise FileNotFoundError()
-
-            pixmap = QPixmap(self.image_path)
-            if pixmap.isNull():
-                raise ValueError("Invalid image")
-
-            scaled = pixmap.scaled(
-                *self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.finished.emit(self.image_path, scaled)
-
-        except Exception:
-            # ẨN LỖI "KHÔNG TÌM THẤY" → DÙNG DEFAULT
-            default = QPixmap(DEFAULT_IMAGE_PATH)
-            if default.isNull():
-                default = QPixmap(*self.size)
-                default.fill(Qt.lightGray)
-            scaled = default.scaled(
-                *self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.finished.emit(self.image_path, scaled)
+def _set_scaled(label, img, size):
+    pixmap = QPixmap.fromImage(img)
+    if pixmap.isNull():
+        pixmap = QPixmap(*size)
+        pixmap.fill(Qt.lightGray)
+    label.setPixmap(pixmap.scaled(
+        *size, Qt.KeepAspectRatio, Qt.SmoothTransformation))
 
 
 def display_image_async(component_id: str, label, size=IMAGE_LABEL_SIZE):
@@ -47,35 +22,38 @@ def display_image_async(component_id: str, label, size=IMAGE_LABEL_SIZE):
     """
     if not component_id:
         label.clear()
+        label.pending_image_path = None
+        label.pending_image_size = None
         return
 
     image_folder, _ = get_folders()  # ← LẤY TỪ CẤU HÌNH
     image_path = os.path.join(image_folder, f"{component_id}.jpg")
-
-    # Cache
-    if image_path in _image_cache:
-        label.setPixmap(_image_cache[image_path])
+    cache = get_thumbnail_cache()
+    qsize = QSize(*size)
+    label.pending_image_path = image_path
+    label.pending_image_size = tuple(size)
+
+    img = cache.peek(image_path, qsize)
+    if img is not None:
+        _set_scaled(label, img, size)
         return
 
-    # Hủy loader cũ
-    if hasattr(label, 'current_loader') and label.current_loader:
-        old = label.current_loader
-        if old.isRunning():
-            old.quit()
-            old.wait(1000)
-        old.deleteLater()
-
-    # Tải mới
-    loader = ImageLoader(image_path, size=size)
-    label.current_loader = loader
-
-    def on_finished(path, pixmap):
-        if not pixmap.isNull():
-            _image_cache[path] = pixmap
-            label.setPixmap(pixmap)
-        if hasattr(label, 'current_loader') and label.current_loader == loader:
-            label.current_loader = None
-        loader.deleteLater()
-
-    loader.finished.connect(on_finished)
-    loader.start()
+    # Nối signal 1 lần cho mỗi label, chỉ nhận ảnh của lần gọi cuối
+    # (đường dẫn + kích thước đọc từ label, không lấy từ lần gọi đầu tiên)
+    if not getattr(label, "_thumbnail_connected", False):
+        def on_ready(path, ready_size, loaded):
+            want = getattr(label, "pending_image_size", None)
+            if (path != getattr(label, "pending_image_path", None) or want is None
+                    or (ready_size.width(), ready_size.height()) != want):
+                return
+            if loaded.isNull() and path != DEFAULT_IMAGE_PATH:
+                # ẨN LỖI "KHÔNG TÌM THẤY" → DÙNG DEFAULT
+                label.pending_image_path = DEFAULT_IMAGE_PATH
+                cache.request(DEFAULT_IMAGE_PATH, QSize(*want))
+                return
+            _set_scaled(label, loaded, want)
+
+        cache.signals.ready.connect(on_ready)
+        label._thumbnail_connected = True
+
+    cache.request(image_path, qsize)
@@ -1,11 +1,12 @@
 # warehouse_app/modules/image_hover_preview.py
 from PySide6.QtWidgets import QLabel, QGraphicsOpacityEffect
 from PySide6.QtGui import QPixmap, QWheelEvent, QImage
-from PySide6.QtCore import Qt, QPropertyAnimation, Signal, QObject
+from PySide6.QtCore import Qt, QPropertyAnimation, Signal, QObject, QSize
+from modules.thumbnail_cache import get_thumbnail_cache
+from config.settings import THUMB_ZOOM_SIZE, DEFAULT_IMAGE_PATH
 import logging
-logging.basicConfig(level=logging.DEBUG)
+# Mức log cấu hình 1 chỗ trong main.py (LOG_LEVEL) – debug ở đây mặc định ẩn
 logger = logging.getLogger(__name__)
-logging.disable(logging.CRITICAL)  # ← TẮT TẤT CẢ LOG TRONG TOÀN BỘ APP
 
 
 class ImageHoverController(QObject):
@@ -36,7 +37,10 @@ class HoverPreviewLabel(QLabel):
 
         self.image_path = None
         self.original_image = None
+        self.fallback_path = DEFAULT_IMAGE_PATH  # ảnh khi không có ảnh linh kiện (dùng chung image.py)
         self.controller = controller or ImageHoverController()
+        # Ảnh nạp 1 lần ở cỡ zoom (cache RAM/đĩa), thumbnail thu nhỏ từ đó
+        get_thumbnail_cache().signals.ready.connect(self._on_thumbnail_ready)
 
         # ZOOM LABEL
         self.zoom_label = QLabel(parent)
@@ -71,24 +75,15 @@ class HoverPreviewLabel(QLabel):
     def update_image_from_path(self, path: str):
         if not path or path == self.image_path:
             return
-        self.image_path = path
-        self._load_and_display_thumbnail()
+        self.set_image(path)
 
-    # === Tải và hiển thị thumbnail ===
+    # === Hiển thị thumbnail (thu nhỏ từ ảnh đã nạp, không đọc lại file) ===
     def _load_and_display_thumbnail(self):
-        if not self.image_path:
-            self.clear()
-            self.original_image = None
-            return
-
-        img = QImage(self.image_path)
-        if img.isNull():
+        if not self.original_image:
             self.clear()
-            self.original_image = None
-            # self.setToolTip("Không tải được ảnh")
             return
 
-        self.original_image = img
+        img = self.original_image
         scaled = img.scaled(
             self.size(),
             Qt.KeepAspectRatio,
@@ -117,10 +112,30 @@ class HoverPreviewLabel(QLabel):
             self.show_zoom()
         event.accept()
 
+    def thumbnail_size(self) -> QSize:
+        return QSize(*THUMB_ZOOM_SIZE)
+
     def set_image(self, path: str):
-        """Load ảnh + CẬP NHẬT ZOOM NGAY LẬP TỨC nếu đang hover"""
+        """Load ảnh (qua cache) + CẬP NHẬT ZOOM NGAY LẬP TỨC nếu đang hover"""
         self.image_path = path
-        img = QImage(path)
+        cache = get_thumbnail_cache()
+        img = cache.peek(path, self.thumbnail_size()) if path else None
+        if img is not None:
+            self._show_image(img)
+        elif path:
+            cache.request(path, self.thumbnail_size())
+        else:
+            self._show_image(QImage())
+
+    def _on_thumbnail_ready(self, path, size, img):
+        if path != self.image_path or size != self.thumbnail_size():
+            return  # đã chọn dòng khác
+        if img.isNull() and self.fallback_path and path != self.fallback_path:
+            self.set_image(self.fallback_path)
+            return
+        self._show_image(img)
+
+    def _show_image(self, img: QImage):
         if img.isNull():
             self.original_image = None
             self.clear()
@@ -1,20 +1,17 @@
 # warehouse_app/modules/inventory.py
-import asyncpg
-from config.settings import DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME
 import re
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+from db.pool import acquire
+from db.metrics import instrument_module
+from db.statements import registry
+from modules.stock_refresh import request_refresh
+from modules.query_cache import cached_query, notify_team_changed, invalidate_team
+from modules.name_index import note_component_names
+from modules.audit import audited_transaction
+from modules import local_mirror
+from config.settings import CID_BLOCK_SIZE, ENTRIES_PARTITIONS_AHEAD
 
-
-async def get_connection():
-    """Kết nối asyncpg – dùng cho test & các hàm khác."""
-    return await asyncpg.connect(
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME,
-        host=DB_HOST,
-        port=DB_PORT,
-        ssl=False,
-    )
+PARTITION_LOCK_KEY = 74_203  # pg_advisory_xact_lock – 1 client tạo partition
 
 # ----------------------------------------------------------------------
 # 1. Edit entry – update
@@ -29,23 +26,23 @@ async def update_entry(
     quantity: float, created_by: int
     # ← XÓA movement_type KHỎI THAM SỐ
 ):
-    conn = await get_connection()
-    try:
-        async with conn.transaction():
-            # Lấy dữ liệu cũ để audit
-            old_data = await conn.fetchrow(
-                "SELECT to_jsonb(t) FROM inventory_entries t WHERE id=$1", id
-            )
-
+    async with acquire() as conn:
+        async with audited_transaction(conn) as audit:
             # Cập nhật – KHÔNG ĐỘNG VÀO movement_type
+            # Dòng cũ (khóa) + dòng mới đều lấy từ RETURNING để audit
             sql = """
-                UPDATE inventory_entries SET
+                UPDATE inventory_entries ie SET
                     component_id=$1, component_name=$2, group_name=$3, process=$4,
                     model=$5, size=$6, unit=$7, material=$8, storage_location=$9,
                     invoice=$10, modinvoice=$11, status=$12, note=$13,
                     quantity=$14, updated_by=$15, updated_at=NOW()
-                WHERE id=$16 AND team_id=$17
-                RETURNING id
+                FROM (
+                    SELECT * FROM inventory_entries
+                    WHERE id=$16 AND team_id=$17
+                    FOR UPDATE
+                ) old
+                WHERE ie.id = old.id AND ie.created_at = old.created_at
+                RETURNING ie.id, to_jsonb(old) AS old_data, to_jsonb(ie) AS new_data
             """
             row = await conn.fetchrow(sql,
                                       component_id, component_name, group_name, process, model, size, unit,
@@ -54,17 +51,15 @@ async def update_entry(
                                       )
 
             # Audit log
-            await conn.execute("""
-                INSERT INTO audit_log (table_name, record_id, action, old_row_data, new_row_data, changed_by)
-                VALUES ('inventory_entries', $1, 'U', $2,
-                        (SELECT row_to_json(t) FROM inventory_entries t WHERE t.id = $1),
-                        $3)
-            """, id, old_data["to_jsonb"], created_by)
+            audit.add("U", row["id"], row["old_data"], row["new_data"], created_by)
+            txid = await notify_team_changed(conn, team_id)
 
-        await refresh_current_stock()
-        return row["id"]
-    finally:
-        await conn.close()
+    # stock_balance đã được trigger cập nhật trong cùng transaction,
+    # view current_stock chỉ cần refresh gộp (debounce)
+    invalidate_team(team_id)
+    note_component_names(team_id, [component_name])
+    request_refresh(txid)
+    return row["id"]
 
 # ----------------------------------------------------------------------
 # 2. Thêm phiếu nhập / xuất / điều chỉnh
@@ -78,18 +73,17 @@ async def add_entry(
     invoice: str, modinvoice: str, status: str, note: str,
     quantity: float, movement_type: str, created_by: int
 ):
-    conn = await get_connection()
-    try:
-        async with conn.transaction():
+    async with acquire() as conn:
+        async with audited_transaction(conn) as audit:
             sql = """
-                INSERT INTO inventory_entries (
+                INSERT INTO inventory_entries AS ie (
                     component_id, component_name, group_name, process, model, size,
                     unit, team_id, material, storage_location, invoice, modinvoice,
                     status, note, quantity, movement_type, created_by, updated_by,
                     created_at, updated_at
                 )
                 VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12,$13,$14,$15,$16,$17,$18,NOW(),NOW())
-                RETURNING id
+                RETURNING ie.id, to_jsonb(ie) AS new_data
             """
             row = await conn.fetchrow(
                 sql,
@@ -99,153 +93,260 @@ async def add_entry(
             )
             entry_id = row["id"]
 
-            # audit log
-            await conn.execute(
-                """
-                INSERT INTO audit_log (table_name, record_id, action, new_row_data, changed_by)
-                VALUES ('inventory_entries', $1, 'I',
-                        (SELECT row_to_json(t) FROM inventory_entries t WHERE t.id = $1),
-                        $2)
-                """,
-                entry_id, created_by,
+            # audit log (từ RETURNING, không SELECT lại)
+            audit.add("I", entry_id, new=row["new_data"], changed_by=created_by)
+            txid = await notify_team_changed(conn, team_id)
+    # tồn kho (stock_balance) đã được trigger cập nhật, không cần REFRESH ngay
+    invalidate_team(team_id)
+    note_component_names(team_id, [component_name])
+    request_refresh(txid)
+    return entry_id
+
+
+# ----------------------------------------------------------------------
+# 2b. Xuất kho an toàn khi nhiều người cùng xuất
+#     Khóa dòng stock_balance (FOR UPDATE) → kiểm tra → ghi phiếu out
+#     trong CÙNG transaction; trigger trừ tồn, trả về tồn mới
+# ----------------------------------------------------------------------
+class InsufficientStockError(ValueError):
+    def __init__(self, component_id: str, requested: int, available: int):
+        self.component_id = component_id
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Không đủ tồn {component_id}: cần {requested}, còn {available}")
+
+
+async def issue_entry(
+    component_id: str, component_name: str, group_name: list[str],
+    process: list[str], model: list[str], size: str, unit: str,
+    team_id: int, material: list[str], storage_location: str,
+    invoice: str, modinvoice: str, status: str, note: str,
+    quantity: int, created_by: int
+) -> Dict[str, int]:
+    """Ghi 1 phiếu out, trả về {"id": ..., "balance": tồn sau khi xuất}."""
+    async with acquire() as conn:
+        async with audited_transaction(conn) as audit:
+            # Người xuất thứ 2 chờ ở đây đến khi người thứ 1 COMMIT,
+            # rồi đọc số tồn đã bị trừ
+            available = await conn.fetchval("""
+                SELECT current_quantity FROM stock_balance
+                WHERE team_id = $1 AND component_id = $2
+                FOR UPDATE
+            """, team_id, component_id) or 0
+            if quantity > available:
+                raise InsufficientStockError(component_id, quantity, available)
+
+            row = await conn.fetchrow("""
+                INSERT INTO inventory_entries AS ie (
+                    component_id, component_name, group_name, process, model, size,
+                    unit, team_id, material, storage_location, invoice, modinvoice,
+                    status, note, quantity, movement_type, created_by, updated_by,
+                    created_at, updated_at
+                )
+                VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12,$13,$14,$15,'out',$16,$16,NOW(),NOW())
+                RETURNING ie.id, to_jsonb(ie) AS new_data
+            """,
+                component_id, component_name, group_name, process, model, size, unit,
+                team_id, material, storage_location, invoice, modinvoice, status,
+                note, quantity, created_by,
             )
-        # luôn làm mới tồn kho ngay sau khi thêm
-        await refresh_current_stock()
-        return entry_id
-    finally:
-        await conn.close()
+            audit.add("I", row["id"], new=row["new_data"], changed_by=created_by)
+            # Trigger trig_stock_balance đã trừ tồn trong transaction này
+            balance = await conn.fetchval("""
+                SELECT current_quantity FROM stock_balance
+                WHERE team_id = $1 AND component_id = $2
+            """, team_id, component_id)
+            txid = await notify_team_changed(conn, team_id)
+
+    invalidate_team(team_id)
+    request_refresh(txid)
+    return {"id": row["id"], "balance": int(balance or 0)}
 
 
 # ----------------------------------------------------------------------
 # 3. Liệt kê giao dịch gần nhất (được dùng trong test)
 # ----------------------------------------------------------------------
+LIST_ENTRIES_SQL = registry.register("list_entries", """
+    SELECT id, component_id, component_name, group_name, quantity,
+           unit, movement_type, status, created_at, note
+    FROM inventory_entries
+    WHERE team_id = $1
+    ORDER BY created_at DESC
+    LIMIT $2
+""")
+
+
 async def list_entries(team_id: int, limit: int = 50):
     """Lấy `limit` giao dịch mới nhất của team."""
-    conn = await get_connection()
-    try:
-        rows = await conn.fetch(
-            """
-            SELECT id, component_id, component_name, group_name, quantity,
-                   unit, movement_type, status, created_at, note
-            FROM inventory_entries
-            WHERE team_id = $1
-            ORDER BY created_at DESC
-            LIMIT $2
-            """,
-            team_id, limit,
-        )
+    async with acquire() as conn:
+        rows = await registry.fetch(conn, LIST_ENTRIES_SQL, team_id, limit)
         return [dict(r) for r in rows]
-    finally:
-        await conn.close()
 
 
 # ----------------------------------------------------------------------
-# 4. Tồn kho hiện tại (materialized view)
+# 4. Tồn kho hiện tại (bảng stock_balance – trigger cập nhật tăng dần)
 # ----------------------------------------------------------------------
+CURRENT_STOCK_SQL = registry.register("current_stock", """
+    SELECT component_id, component_name, current_quantity, unit, status, note
+    FROM stock_balance
+    WHERE team_id = $1 AND current_quantity > 0
+    ORDER BY component_id
+""", warm_args=(0,))
+CURRENT_STOCK_FILTERED_SQL = registry.register("current_stock_filtered", """
+    SELECT component_id, component_name, current_quantity, unit, status, note
+    FROM stock_balance
+    WHERE team_id = $1 AND current_quantity > 0 AND component_id ILIKE $2
+    ORDER BY component_id
+""")
+
+
+@cached_query
 async def get_current_stock(team_id: int, component_filter: str = ""):
-    conn = await get_connection()
-    try:
-        sql = """
-            SELECT component_id, component_name, current_quantity, unit, status, note
-            FROM current_stock
-            WHERE team_id = $1
-        """
-        params = [team_id]
+    if local_mirror.is_serving(team_id):
+        return await local_mirror.current_stock(team_id, component_filter)
+    async with acquire() as conn:
         if component_filter:
-            sql += " AND component_id ILIKE $2"
-            params.append(f"%{component_filter}%")
-        sql += " ORDER BY component_id"
-        rows = await conn.fetch(sql, *params)
+            rows = await registry.fetch(conn, CURRENT_STOCK_FILTERED_SQL,
+                                        team_id, f"%{component_filter}%")
+        else:
+            rows = await registry.fetch(conn, CURRENT_STOCK_SQL, team_id)
         return [dict(r) for r in rows]
-    finally:
-        await conn.close()
 
 
 # ----------------------------------------------------------------------
 # 5. Làm mới materialized view (CONCURRENTLY)
+#    Chỉ còn dùng cho báo cáo cũ – app đọc tồn từ stock_balance
 # ----------------------------------------------------------------------
 async def refresh_current_stock():
-    conn = await get_connection()
-    try:
+    async with acquire() as conn:
         await conn.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY current_stock")
-    finally:
-        await conn.close()
 
 
 # ----------------------------------------------------------------------
 # 6. Xóa giao dịch + audit log
 # ----------------------------------------------------------------------
 async def delete_entry(entry_id: int, user_id: int):
-    conn = await get_connection()
-    try:
-        async with conn.transaction():
+    async with acquire() as conn:
+        async with audited_transaction(conn) as audit:
             old_data = await conn.fetchrow(
-                "SELECT to_jsonb(t) FROM inventory_entries t WHERE id=$1", entry_id
-            )
-            await conn.execute("DELETE FROM inventory_entries WHERE id=$1", entry_id)
-            await conn.execute(
                 """
-                INSERT INTO audit_log (table_name, record_id, action, old_row_data, changed_by)
-                VALUES ('inventory_entries', $1, 'D', $2, $3)
+                DELETE FROM inventory_entries t WHERE id=$1
+                RETURNING t.id, t.team_id, to_jsonb(t) AS old_data
                 """,
-                entry_id, old_data["to_jsonb"], user_id,
+                entry_id,
             )
-        await refresh_current_stock()
-    finally:
-        await conn.close()
+            audit.add("D", entry_id, old=old_data["old_data"], changed_by=user_id)
+            txid = await notify_team_changed(conn, old_data["team_id"])
+    invalidate_team(old_data["team_id"])
+    request_refresh(txid)
 
 # ----------------------------------------------------------------------
 # 7. Sinh Component ID
+#    Bộ đếm theo tiền tố (db/migrations/0005_component_id_counter.sql): cấp số bằng
+#    UPDATE ... RETURNING → O(1), không trùng giữa các client.
+#    CID_BLOCK_SIZE > 1: giữ trước 1 khối số, cấp dần trong bộ nhớ.
 # ----------------------------------------------------------------------
+_cid_blocks: Dict[str, List[int]] = {}  # prefix → [số kế tiếp, số cuối của khối]
+
+
+def cid_prefix(storage_location: str) -> str:
+    """'Kho A VE02' → 'VE02' ('' nếu không hợp lệ)."""
+    parts = (storage_location or "").strip().split()
+    suffix = parts[-1].upper() if parts else ""
+    return suffix if len(suffix) >= 3 else ""
+
+
+def _format_cid(prefix: str, number: int) -> str:
+    return f"{prefix}{str(number).zfill(3)}"
 
 
-# modules/inventory.py
 async def generate_next_cid(storage_location: str) -> str:
-    conn = await get_connection()
     try:
-        suffix = storage_location.strip().split()[-1].upper()
-        if len(suffix) < 3:
+        prefix = cid_prefix(storage_location)  # VE02
+        if not prefix:
             return ""
 
-        prefix = suffix  # VE02
-        pattern = f"{prefix}___"  # VE02___
-
-        # DÙNG SQL: Tìm số lớn nhất trong 3 chữ số cuối
-        sql = """
-            SELECT MAX(CAST(RIGHT(component_id, 3) AS INTEGER)) AS max_num
-            FROM inventory_entries
-            WHERE component_id LIKE $1
-        """
-        row = await conn.fetchrow(sql, f"{prefix}%")
+        block = _cid_blocks.get(prefix)
+        if block and block[0] <= block[1]:
+            number = block[0]
+            block[0] += 1
+            return _format_cid(prefix, number)
 
-        max_num = row["max_num"] or 0
-        next_num = max_num + 1
-        return f"{prefix}{str(next_num).zfill(3)}"
+        async with acquire() as conn:
+            last = await conn.fetchval(
+                "SELECT allocate_component_ids($1, $2)", prefix, CID_BLOCK_SIZE)
+        first = last - CID_BLOCK_SIZE + 1
+        _cid_blocks[prefix] = [first + 1, last]
+        return _format_cid(prefix, first)
 
     except Exception as e:
         print(f"[generate_next_cid] Lỗi: {e}")
         return ""
-    finally:
-        await conn.close()
+
+
+async def release_cid(component_id: str) -> bool:
+    """Trả lại mã vừa sinh nhưng không dùng (hủy tạo mới)."""
+    m = re.fullmatch(r"(.+)(\d{3})", (component_id or "").strip().upper())
+    if not m:
+        return False
+    prefix, number = m.group(1), int(m.group(2))
+    block = _cid_blocks.get(prefix)
+    if block and block[0] == number + 1:
+        block[0] = number  # cấp lại cho lần sinh sau
+        if CID_BLOCK_SIZE > 1:
+            return True
+        _cid_blocks.pop(prefix, None)
+    try:
+        async with acquire() as conn:
+            return await conn.fetchval(
+                "SELECT release_component_id($1, $2)", prefix, number)
+    except Exception as e:
+        print(f"[release_cid] Lỗi: {e}")
+        return False
 
 # inventory.py → THÊM HÀM NÀY
 
 
+STOCK_INFO_SQL = registry.register("component_info_from_stock", """
+    SELECT
+        component_id, component_name, group_name, process, model, size, unit,
+        material, storage_location, invoice, modinvoice, status, note,
+        current_quantity
+    FROM stock_balance
+    WHERE team_id = $1 AND component_id = $2 AND current_quantity > 0
+""", warm_args=(0, ""))
+
+
 async def get_component_info_from_stock(team_id: int, component_id: str) -> Optional[Dict[str, any]]:
     """
-    Lấy toàn bộ thông tin linh kiện từ current_stock (Materialized View)
-    """
-    sql = """
-        SELECT 
-            component_id, component_name, group_name, process, model, size, unit,
-            material, storage_location, invoice, modinvoice, status, note,
-            current_quantity
-        FROM current_stock 
-        WHERE team_id = $1 AND component_id = $2
+    Lấy toàn bộ thông tin linh kiện từ stock_balance (tồn kho tăng dần)
     """
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow(sql, team_id, component_id)
+    async with acquire() as conn:
+        row = await registry.fetchrow(conn, STOCK_INFO_SQL, team_id, component_id)
         return dict(row) if row else None
-    finally:
-        await conn.close()
+
+
+# ----------------------------------------------------------------------
+# 8. Partition tháng cho inventory_entries (db/migrations/0007_entries_partition.sql)
+# ----------------------------------------------------------------------
+async def ensure_entry_partitions(months_ahead: int = ENTRIES_PARTITIONS_AHEAD) -> int:
+    """Tạo trước partition các tháng tới (bảng chưa phân vùng → bỏ qua)."""
+    try:
+        async with acquire() as conn:
+            async with conn.transaction():
+                if await conn.fetchval(
+                        "SELECT to_regproc('inventory_entries_ensure_partitions')") is None:
+                    return 0
+                if not await conn.fetchval(
+                        "SELECT pg_try_advisory_xact_lock($1)", PARTITION_LOCK_KEY):
+                    return 0
+                return await conn.fetchval(
+                    "SELECT inventory_entries_ensure_partitions($1)", months_ahead)
+    except Exception as e:
+        print(f"[ensure_entry_partitions] Lỗi: {e}")
+        return 0
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
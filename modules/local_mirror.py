@@ -0,0 +1,662 @@
+# warehouse_app/modules/local_mirror.py
+"""
+BẢN SAO CHỈ ĐỌC TRÊN MÁY (SQLite) – BẬT BẰNG WM_LOCAL_MIRROR=1
+- Mỗi team đã đăng nhập: tồn kho (stock_balance, mã còn tồn), options và phiếu
+  LOCAL_MIRROR_ENTRY_DAYS ngày gần nhất chép vào 1 file SQLite (LOCAL_MIRROR_PATH)
+- Đồng bộ tăng dần theo mốc updated_at (lùi LOCAL_MIRROR_OVERLAP giây: NOW() là giờ
+  BẮT ĐẦU transaction, dòng commit muộn vẫn được lấy lại; ghi đè theo khóa nên lấy
+  trùng vô hại). Dòng bị xóa: change feed báo id / mã ngay, đối soát theo khóa (id)
+  lúc mở app + mỗi LOCAL_MIRROR_RECONCILE_INTERVAL bắt phần còn sót
+- search_current_stock / search_entries (modules/search.py), get_current_stock
+  (modules/inventory.py), get_all_categories (modules/options.py) đọc từ đây khi
+  bản sao đã theo kịp; mọi thao tác GHI vẫn vào Postgres
+- Vừa có ghi (máy này hoặc client khác) → đọc Postgres tới khi đồng bộ xong
+- Mất kết nối Postgres: vẫn trả lời từ bản sao, get_mirror_status() cho thanh
+  trạng thái biết bản sao cũ bao lâu
+SQLite chạy trong thread phụ (asyncio.to_thread), 1 kết nối + khóa.
+"""
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from db.pool import acquire
+from db.metrics import instrument_module
+from db.statements import registry
+from modules.query_cache import on_team_invalidated
+from modules.change_feed import feed
+from config.settings import (
+    LOCAL_MIRROR_ENABLED, LOCAL_MIRROR_PATH, LOCAL_MIRROR_ENTRY_DAYS,
+    LOCAL_MIRROR_SYNC_INTERVAL, LOCAL_MIRROR_SYNC_DELAY, LOCAL_MIRROR_OVERLAP,
+    LOCAL_MIRROR_RECONCILE_INTERVAL, LOCAL_MIRROR_STALE_AFTER,
+)
+
+MIRROR_SCHEMA_VERSION = 1
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Lỗi coi như "không tới được Postgres" → dùng tạm dữ liệu bản sao
+OFFLINE_ERRORS = (OSError, asyncio.TimeoutError)
+
+# Cùng thứ tự cột với modules/search.py → bảng UI không đổi thứ tự cột
+STOCK_FIELDS = (
+    "component_id", "component_name", "group_name", "process", "model",
+    "size", "unit", "team_id", "material", "storage_location", "invoice",
+    "modinvoice", "status", "note", "created_by", "created_at",
+    "current_quantity",
+)
+ENTRY_FIELDS = (
+    "id", "component_id", "component_name", "group_name",
+    "process", "model", "size", "unit", "material",
+    "storage_location", "invoice", "modinvoice",
+    "status", "note", "quantity", "movement_type",
+    "created_at", "created_by",
+)
+CURRENT_STOCK_FIELDS = (
+    "component_id", "component_name", "current_quantity", "unit", "status", "note",
+)
+ARRAY_FIELDS = frozenset({"group_name", "process", "model", "material"})
+TIME_FIELDS = frozenset({"created_at"})
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS stock (
+    component_id TEXT NOT NULL, component_name TEXT, group_name TEXT,
+    process TEXT, model TEXT, size TEXT, unit TEXT, team_id INTEGER NOT NULL,
+    material TEXT, storage_location TEXT, invoice TEXT, modinvoice TEXT,
+    status TEXT, note TEXT, created_by INTEGER, created_at INTEGER,
+    current_quantity INTEGER NOT NULL,
+    PRIMARY KEY (team_id, component_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY, team_id INTEGER NOT NULL,
+    component_id TEXT, component_name TEXT, group_name TEXT, process TEXT,
+    model TEXT, size TEXT, unit TEXT, material TEXT, storage_location TEXT,
+    invoice TEXT, modinvoice TEXT, status TEXT, note TEXT, quantity INTEGER,
+    movement_type TEXT, created_at INTEGER, created_by INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_team_created
+    ON entries (team_id, created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS options (
+    team_id INTEGER NOT NULL, category TEXT NOT NULL, value TEXT NOT NULL,
+    sort_order INTEGER
+);
+CREATE INDEX IF NOT EXISTS options_team ON options (team_id, category, sort_order);
+-- Mốc thời gian lưu dạng micro giây từ 1970 (UTC); synced_at = time.time()
+CREATE TABLE IF NOT EXISTS sync_state (
+    team_id INTEGER PRIMARY KEY, stock_mark INTEGER, entry_mark INTEGER,
+    horizon INTEGER, synced_at REAL, reconciled_at REAL
+);
+"""
+DROP_SQL = """
+DROP TABLE IF EXISTS stock;
+DROP TABLE IF EXISTS entries;
+DROP TABLE IF EXISTS options;
+DROP TABLE IF EXISTS sync_state;
+"""
+
+# --- Postgres: đọc thay đổi (idx_*_team_updated – 0010_mirror_sync_indexes.sql) ---
+ENTRY_SELECT = ", ".join(f"ie.{f}" for f in ENTRY_FIELDS)
+
+MIRROR_STOCK_SQL = registry.register("mirror_stock", f"""
+    SELECT {", ".join(STOCK_FIELDS)}, updated_at
+    FROM stock_balance
+    WHERE team_id = $1 AND updated_at >= $2::timestamptz
+""")
+MIRROR_ENTRIES_SQL = registry.register("mirror_entries", f"""
+    SELECT {ENTRY_SELECT}, ie.updated_at
+    FROM inventory_entries ie
+    WHERE ie.team_id = $1 AND ie.created_at >= $2::timestamptz
+      AND ie.updated_at >= $3::timestamptz
+""")
+MIRROR_ENTRY_IDS_SQL = registry.register("mirror_entry_ids", """
+    SELECT COALESCE(array_agg(ie.id), '{}')
+    FROM inventory_entries ie
+    WHERE ie.team_id = $1 AND ie.created_at >= $2::timestamptz
+""")
+MIRROR_ENTRIES_BY_ID_SQL = registry.register("mirror_entries_by_id", f"""
+    SELECT {ENTRY_SELECT}, ie.updated_at
+    FROM inventory_entries ie
+    WHERE ie.team_id = $1 AND ie.id = ANY($2::bigint[])
+""")
+MIRROR_OPTIONS_SQL = registry.register("mirror_options", """
+    SELECT category, value, sort_order
+    FROM options
+    WHERE team_id = $1 AND is_active = TRUE
+""")
+
+
+# ----------------------------------------------------------------------
+# 1. Chuyển kiểu Postgres ↔ SQLite
+# ----------------------------------------------------------------------
+def _to_us(ts: datetime) -> int:
+    # Không có múi giờ → giờ máy (giống asyncpg khi gửi timestamptz)
+    return (ts.astimezone(timezone.utc) - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_us(us: Optional[int]) -> Optional[datetime]:
+    return None if us is None else EPOCH + timedelta(microseconds=us)
+
+
+def _encode(field: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if field in ARRAY_FIELDS:
+        return json.dumps(list(value), ensure_ascii=False)
+    if field in TIME_FIELDS:
+        return _to_us(value)
+    return value
+
+
+def _decode_rows(fields, rows) -> List[Dict[str, Any]]:
+    decoders = [json.loads if f in ARRAY_FIELDS else _from_us if f in TIME_FIELDS else None
+                for f in fields]
+    return [
+        {f: v if d is None or v is None else d(v) for f, d, v in zip(fields, decoders, row)}
+        for row in rows
+    ]
+
+
+# Hàm SQL thay cho ILIKE '%x%' / && / @> của Postgres
+@functools.lru_cache(maxsize=256)
+def _json_set(text: str) -> frozenset:
+    return frozenset(json.loads(text))
+
+
+def _contains_ci(value, needle) -> bool:
+    # needle đã casefold; casefold hiểu cả chữ có dấu (LIKE của SQLite chỉ ASCII)
+    return value is not None and needle in value.casefold()
+
+
+def _arr_overlap(value, wanted) -> bool:
+    return value is not None and not _json_set(wanted).isdisjoint(json.loads(value))
+
+
+def _arr_contains(value, wanted) -> bool:
+    return value is not None and _json_set(wanted).issubset(json.loads(value))
+
+
+def _json_param(values) -> str:
+    return json.dumps(sorted(values), ensure_ascii=False)
+
+
+# ----------------------------------------------------------------------
+# 2. File SQLite (đồng bộ – gọi qua asyncio.to_thread)
+# ----------------------------------------------------------------------
+class MirrorStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None: tự BEGIN / COMMIT
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != MIRROR_SCHEMA_VERSION:
+            # Bản sao bỏ đi được: khác phiên bản → dựng lại từ đầu
+            self._conn.executescript(DROP_SQL)
+        self._conn.executescript(SCHEMA_SQL)
+        self._conn.execute(f"PRAGMA user_version = {MIRROR_SCHEMA_VERSION}")
+        for name, func in (("contains_ci", _contains_ci),
+                           ("arr_overlap", _arr_overlap),
+                           ("arr_contains", _arr_contains)):
+            self._conn.create_function(name, 2, func, deterministic=True)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def state(self) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT team_id, stock_mark, entry_mark, horizon, synced_at, reconciled_at"
+                " FROM sync_state")
+            names = [d[0] for d in cur.description]
+            return {row[0]: dict(zip(names, row)) for row in cur.fetchall()}
+
+    def entry_ids(self, team_id: int) -> Set[int]:
+        with self._lock:
+            return {r[0] for r in self._conn.execute(
+                "SELECT id FROM entries WHERE team_id = ?", (team_id,))}
+
+    def query(self, fields, sql: str, params) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return _decode_rows(fields, rows)
+
+    def apply(self, team_id: int, *, stock, stock_full: bool, entries, options,
+              removed_ids, removed_components, keep_ids, state: Dict[str, Any]) -> int:
+        """Ghi 1 lần đồng bộ trong 1 transaction. Trả về số dòng thay đổi."""
+        entry_cols = ("team_id",) + ENTRY_FIELDS
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                # Xóa trước, ghi sau: dòng vừa đọc mới hơn sự kiện xóa đã nhận
+                if stock_full:
+                    cur.execute("DELETE FROM stock WHERE team_id = ?", (team_id,))
+                gone = [(team_id, c) for c in removed_components]
+                gone += [(team_id, r["component_id"]) for r in stock
+                         if r["current_quantity"] <= 0]
+                cur.executemany(
+                    "DELETE FROM stock WHERE team_id = ? AND component_id = ?", gone)
+                live = [tuple(_encode(f, r[f]) for f in STOCK_FIELDS)
+                        for r in stock if r["current_quantity"] > 0]
+                cur.executemany(
+                    f"INSERT OR REPLACE INTO stock ({', '.join(STOCK_FIELDS)})"
+                    f" VALUES ({', '.join('?' * len(STOCK_FIELDS))})", live)
+
+                cur.executemany("DELETE FROM entries WHERE id = ?",
+                                [(i,) for i in removed_ids])
+                if keep_ids is not None:
+                    cur.execute("CREATE TEMP TABLE IF NOT EXISTS keep_ids (id INTEGER PRIMARY KEY)")
+                    cur.execute("DELETE FROM keep_ids")
+                    cur.executemany("INSERT INTO keep_ids VALUES (?)", [(i,) for i in keep_ids])
+                    cur.execute("DELETE FROM entries WHERE team_id = ?"
+                                " AND id NOT IN (SELECT id FROM keep_ids)", (team_id,))
+                cur.execute("DELETE FROM entries WHERE team_id = ? AND created_at < ?",
+                            (team_id, state["horizon"]))
+                cur.executemany(
+                    f"INSERT OR REPLACE INTO entries ({', '.join(entry_cols)})"
+                    f" VALUES ({', '.join('?' * len(entry_cols))})",
+                    [(team_id,) + tuple(_encode(f, r[f]) for f in ENTRY_FIELDS)
+                     for r in entries])
+
+                cur.execute("DELETE FROM options WHERE team_id = ?", (team_id,))
+                cur.executemany(
+                    "INSERT INTO options (team_id, category, value, sort_order) VALUES (?, ?, ?, ?)",
+                    [(team_id, r["category"], r["value"], r["sort_order"]) for r in options])
+
+                cur.execute("""
+                    INSERT OR REPLACE INTO sync_state
+                        (team_id, stock_mark, entry_mark, horizon, synced_at, reconciled_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (team_id, state["stock_mark"], state["entry_mark"], state["horizon"],
+                      state["synced_at"], state["reconciled_at"]))
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+        return len(gone) + len(live) + len(removed_ids) + len(entries)
+
+
+# ----------------------------------------------------------------------
+# 3. Đồng bộ (loop nền)
+# ----------------------------------------------------------------------
+class _TeamSync:
+    """Trạng thái đồng bộ của 1 team – chỉ sửa trên loop nền."""
+
+    def __init__(self, saved: Optional[Dict[str, Any]]):
+        saved = saved or {}
+        self.stock_mark = _from_us(saved.get("stock_mark")) or EPOCH
+        self.entry_mark = _from_us(saved.get("entry_mark")) or EPOCH
+        self.horizon: Optional[int] = saved.get("horizon")        # micro giây
+        self.synced_at: Optional[float] = saved.get("synced_at")  # có từ phiên trước
+        self.reconciled_at: float = saved.get("reconciled_at") or 0.0
+        # version tăng mỗi lần team bị ghi; bản sao chỉ trả lời khi đã đồng bộ
+        # tới version hiện tại (phiên này chưa đồng bộ lần nào → -1)
+        self.version = 0
+        self.synced_version = -1
+        self.reconcile = False
+        self.error: Optional[str] = None
+        self.offline = False   # lỗi cuối thuộc OFFLINE_ERRORS (không tới được Postgres)
+        self.removed_ids: Set[int] = set()
+        self.removed_components: Set[str] = set()
+
+
+class LocalMirror:
+    def __init__(self, path: str = LOCAL_MIRROR_PATH, enabled: bool = LOCAL_MIRROR_ENABLED,
+                 interval: float = LOCAL_MIRROR_SYNC_INTERVAL,
+                 entry_days: int = LOCAL_MIRROR_ENTRY_DAYS):
+        self.path = path
+        self.enabled = enabled
+        self.interval = interval
+        self.entry_days = entry_days
+        self.store: Optional[MirrorStore] = None
+        self._saved: Dict[int, Dict[str, Any]] = {}
+        self._teams: Dict[int, _TeamSync] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        if enabled:
+            on_team_invalidated(self._mark_dirty)
+
+    def start(self):
+        """Gọi trên loop nền (submit)."""
+        if not self.enabled:
+            return
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.store is not None:
+            await asyncio.to_thread(self.store.close)
+            self.store = None
+            self.enabled = False
+
+    async def track(self, team_id: int):
+        """Bắt đầu giữ bản sao cho team (gọi sau khi đăng nhập)."""
+        if not self.enabled or team_id in self._teams:
+            return
+        if self.store is None:
+            try:
+                self.store = await asyncio.to_thread(MirrorStore, self.path)
+                self._saved = await asyncio.to_thread(self.store.state)
+            except (OSError, sqlite3.Error) as e:
+                print(f"[MIRROR] Không mở được bản sao cục bộ: {e}")
+                self.enabled = False
+                return
+        self._teams[team_id] = _TeamSync(self._saved.get(team_id))
+        try:
+            await feed.subscribe(team_id, self._on_change)
+        except Exception as e:
+            print(f"[MIRROR] Không theo dõi được thay đổi: {e}")
+        self.start()
+        self._wake.set()
+
+    def serving(self, team_id: int) -> bool:
+        team = self._teams.get(team_id) if self.enabled else None
+        if team is None or team.synced_at is None:
+            return False
+        # Mất kết nối → trả lời bằng dữ liệu cũ (thanh trạng thái báo đã cũ bao lâu);
+        # lỗi khác (quyền, lược đồ, SQLite...) → đọc Postgres
+        return team.synced_version == team.version or team.offline
+
+    def status(self, team_id: int) -> Dict[str, Any]:
+        team = self._teams.get(team_id) if self.enabled else None
+        if team is None:
+            return {"enabled": False}
+        age = None if team.synced_at is None else max(0.0, time.time() - team.synced_at)
+        return {
+            "enabled": True,
+            "serving": self.serving(team_id),
+            "synced_at": None if team.synced_at is None else datetime.fromtimestamp(team.synced_at),
+            "age": age,
+            "stale": age is None or age > LOCAL_MIRROR_STALE_AFTER or team.error is not None,
+            "error": team.error,
+        }
+
+    # -------------------------------------------------------------
+    # Sự kiện ghi (chạy trong thread loop)
+    # -------------------------------------------------------------
+    def _mark_dirty(self, team_id: int):
+        team = self._teams.get(team_id)
+        if team is None:
+            return
+        team.version += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    def _on_change(self, changes: Dict[str, Any]):
+        team = self._teams.get(changes["team_id"])
+        if team is None:
+            return
+        if changes.get("reload"):
+            team.reconcile = True  # có thể đã lỡ sự kiện xóa
+        else:
+            team.removed_ids.update(changes["deleted"])
+            team.removed_components.update(changes["stock_removed"])
+        self._mark_dirty(changes["team_id"])
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+                # Gom các sự kiện change feed của cùng 1 lần ghi
+                await asyncio.sleep(LOCAL_MIRROR_SYNC_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            for team_id in list(self._teams):
+                await self.sync(team_id)
+
+    # -------------------------------------------------------------
+    # 1 lần đồng bộ
+    # -------------------------------------------------------------
+    async def sync(self, team_id: int) -> Dict[str, Any]:
+        team = self._teams[team_id]
+        version = team.version
+        started = time.time()
+        full = (team.reconcile or team.synced_version < 0
+                or started - team.reconciled_at >= LOCAL_MIRROR_RECONCILE_INTERVAL)
+        removed_ids, team.removed_ids = team.removed_ids, set()
+        removed_components, team.removed_components = team.removed_components, set()
+        team.reconcile = False
+        horizon = datetime.now(timezone.utc) - timedelta(days=self.entry_days)
+        overlap = timedelta(seconds=LOCAL_MIRROR_OVERLAP)
+        try:
+            async with acquire() as conn:
+                # Đối soát: tồn đọc lại cả team (ít dòng), phiếu so theo id
+                stock = await registry.fetch(
+                    conn, MIRROR_STOCK_SQL, team_id,
+                    EPOCH if full else team.stock_mark - overlap)
+                entries = await registry.fetch(
+                    conn, MIRROR_ENTRIES_SQL, team_id, horizon, team.entry_mark - overlap)
+                keep_ids = None
+                if full:
+                    keep_ids = await registry.fetchval(
+                        conn, MIRROR_ENTRY_IDS_SQL, team_id, horizon)
+                    have = await asyncio.to_thread(self.store.entry_ids, team_id)
+                    have.update(r["id"] for r in entries)
+                    missing = [i for i in keep_ids if i not in have]
+                    if missing:
+                        entries = list(entries) + await registry.fetch(
+                            conn, MIRROR_ENTRIES_BY_ID_SQL, team_id, missing)
+                options = await registry.fetch(conn, MIRROR_OPTIONS_SQL, team_id)
+
+            stock_mark = max([team.stock_mark] + [r["updated_at"] for r in stock])
+            entry_mark = max([team.entry_mark] + [r["updated_at"] for r in entries
+                                                  if r["updated_at"] is not None])
+            state = {
+                "stock_mark": _to_us(stock_mark),
+                "entry_mark": _to_us(entry_mark),
+                "horizon": _to_us(horizon),
+                "synced_at": started,
+                "reconciled_at": started if full else team.reconciled_at,
+            }
+            changed = await asyncio.to_thread(
+                self.store.apply, team_id, stock=stock, stock_full=full, entries=entries,
+                options=options, removed_ids=removed_ids,
+                removed_components=removed_components, keep_ids=keep_ids, state=state)
+        except Exception as e:
+            # Giữ lại việc chưa làm cho lần sau
+            team.removed_ids |= removed_ids
+            team.removed_components |= removed_components
+            team.reconcile = team.reconcile or full
+            if team.error is None:
+                print(f"[MIRROR] Lỗi đồng bộ team {team_id}: {e}")
+            team.error = str(e)
+            team.offline = isinstance(e, OFFLINE_ERRORS)
+            return {"changed": 0, "error": str(e)}
+
+        team.stock_mark, team.entry_mark = stock_mark, entry_mark
+        team.horizon = state["horizon"]
+        team.synced_at = started
+        team.reconciled_at = state["reconciled_at"]
+        team.synced_version = version
+        team.error = None
+        team.offline = False
+        return {"changed": changed, "full": full}
+
+
+mirror = LocalMirror()
+
+
+# ----------------------------------------------------------------------
+# 4. Điều kiện lọc (cùng ngữ nghĩa modules/search.py, cú pháp SQLite)
+# ----------------------------------------------------------------------
+def _stock_where(team_id: int, filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    where = ["team_id = ?", "current_quantity > 0"]
+    params: List[Any] = [team_id]
+    if "component_id" in filters:
+        where.append("component_id = ?")
+        params.append(filters["component_id"])
+    for key, col in (("component_name_contains", "component_name"), ("size", "size"),
+                     ("invoice", "invoice"), ("modinvoice", "modinvoice"),
+                     ("note_contains", "note")):
+        if key in filters:
+            where.append(f"contains_ci({col}, ?)")
+            params.append(str(filters[key]).casefold())
+    if "status" in filters:
+        where.append("status = ?")
+        params.append(filters["status"])
+    for key in ("group_name", "process", "model", "material"):
+        if filters.get(key):
+            where.append(f"arr_contains({key}, ?)")
+            params.append(_json_param(filters[key]))
+    return where, params
+
+
+def _entry_where(team_id: int, movement_type: Optional[str],
+                 filters: Optional[Dict[str, Any]]) -> Optional[Tuple[List[str], List[Any], Any]]:
+    """None = bộ lọc chỉ Postgres làm được (full-text 'q')."""
+    from modules.search import _time_bounds  # search.py import module này
+
+    filters = dict(filters or {})
+    if filters.get("q"):
+        return None
+    where = ["team_id = ?"]
+    params: List[Any] = [team_id]
+
+    movement_type = filters.pop("movement_type", None) or movement_type
+    if movement_type in ("in", "out"):
+        where.append("movement_type IN ('in', 'adjustment')" if movement_type == "in"
+                     else "movement_type = 'out'")
+
+    if filters.get("component_id_exact"):
+        where.append("component_id = ?")
+        params.append(filters["component_id_exact"])
+    elif filters.get("component_id"):
+        where.append("contains_ci(component_id, ?)")
+        params.append(str(filters["component_id"]).casefold())
+
+    for key in ("component_name", "invoice", "modinvoice", "size"):
+        if filters.get(key):
+            where.append(f"contains_ci({key}, ?)")
+            params.append(str(filters[key]).casefold())
+
+    for key, col in (("groups", "group_name"), ("process", "process"),
+                     ("model", "model"), ("material", "material")):
+        if filters.get(key) and isinstance(filters[key], (list, tuple)):
+            where.append(f"arr_overlap({col}, ?)")
+            params.append(_json_param(filters[key]))
+
+    for field in ("storage_location", "status"):
+        val = filters.get(field)
+        if val:
+            values = list(val) if isinstance(val, (list, tuple)) else [val]
+            where.append(f"{field} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+    if filters.get("note_contains"):
+        where.append("contains_ci(note, ?)")
+        params.append(str(filters["note_contains"]).casefold())
+    if filters.get("note_not_contains"):
+        # NOT ILIKE của Postgres bỏ qua note NULL
+        where.append("note IS NOT NULL AND NOT contains_ci(note, ?)")
+        params.append(str(filters["note_not_contains"]).casefold())
+    if filters.get("note_is_empty"):
+        where.append("(note IS NULL OR note = '')")
+    if filters.get("note_is_not_empty"):
+        where.append("(note IS NOT NULL AND note != '')")
+
+    created_from, created_to = _time_bounds(
+        filters.get("created_from"), filters.get("created_to"))
+    if created_from:
+        where.append("created_at >= ?")
+        params.append(_to_us(created_from))
+    if created_to:
+        where.append("created_at < ?")
+        params.append(_to_us(created_to))
+    return where, params, created_from
+
+
+# ----------------------------------------------------------------------
+# 5. API (loop nền)
+# ----------------------------------------------------------------------
+async def start_local_mirror():
+    mirror.start()
+
+
+async def track_team(team_id: int):
+    await mirror.track(team_id)
+
+
+def is_serving(team_id: int) -> bool:
+    return mirror.serving(team_id)
+
+
+def get_mirror_status(team_id: int) -> Dict[str, Any]:
+    """Đọc được từ GUI thread (chỉ đọc thuộc tính)."""
+    return mirror.status(team_id)
+
+
+async def search_stock(team_id: int, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    where, params = _stock_where(team_id, filters)
+    sql = (f"SELECT {', '.join(STOCK_FIELDS)} FROM stock WHERE {' AND '.join(where)}"
+           " ORDER BY component_id LIMIT 1000")
+    return await asyncio.to_thread(mirror.store.query, STOCK_FIELDS, sql, params)
+
+
+async def current_stock(team_id: int, component_filter: str = "") -> List[Dict[str, Any]]:
+    sql = (f"SELECT {', '.join(CURRENT_STOCK_FIELDS)} FROM stock"
+           " WHERE team_id = ? AND current_quantity > 0")
+    params: List[Any] = [team_id]
+    if component_filter:
+        sql += " AND contains_ci(component_id, ?)"
+        params.append(component_filter.casefold())
+    sql += " ORDER BY component_id"
+    return await asyncio.to_thread(mirror.store.query, CURRENT_STOCK_FIELDS, sql, params)
+
+
+async def search_entries(
+    team_id: int,
+    movement_type: Optional[str],
+    filters: Optional[Dict[str, Any]],
+    limit: Optional[int],
+    offset: int = 0,
+    after: Optional[Tuple[Any, int]] = None,
+) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+    """
+    (dòng, đủ). Bản sao chỉ có phiếu từ mốc horizon → "đủ" khi khoảng ngày lọc
+    nằm trong đó, hoặc đã lấy đủ limit dòng (các dòng mới nhất đều có ở máy).
+    (None, False): bộ lọc không làm được trên bản sao.
+    """
+    built = _entry_where(team_id, movement_type, filters)
+    if built is None:
+        return None, False
+    where, params, created_from = built
+    if after:
+        where.append("(created_at < ? OR (created_at = ? AND id < ?))")
+        after_us = _to_us(after[0])
+        params.extend([after_us, after_us, after[1]])
+    sql = (f"SELECT {', '.join(ENTRY_FIELDS)} FROM entries WHERE {' AND '.join(where)}"
+           " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?")
+    params.extend([-1 if limit is None else limit, offset or 0])
+    rows = await asyncio.to_thread(mirror.store.query, ENTRY_FIELDS, sql, params)
+
+    horizon = mirror._teams[team_id].horizon
+    complete = ((created_from is not None and horizon is not None
+                 and _to_us(created_from) >= horizon)
+                or (limit is not None and len(rows) >= limit))
+    return rows, complete
+
+
+async def get_categories(team_id: int) -> Dict[str, List[str]]:
+    rows = await asyncio.to_thread(
+        mirror.store.query, ("category", "value"),
+        "SELECT category, value FROM options WHERE team_id = ? ORDER BY category, sort_order",
+        [team_id])
+    result: Dict[str, List[str]] = {}
+    for r in rows:
+        result.setdefault(r["category"], []).append(r["value"])
+    return result
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
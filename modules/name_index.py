@@ -0,0 +1,160 @@
+# warehouse_app/modules/name_index.py
+"""
+CHỈ MỤC GỢI Ý TÊN LINH KIỆN TRONG BỘ NHỚ (THEO TEAM)
+- Nạp 1 lần bằng SELECT DISTINCT component_name của team
+- Khóa so khớp bỏ dấu + chữ thường (giống immutable_unaccent/ILIKE phía DB)
+- Mảng khóa đã sắp xếp → tìm tiền tố bằng bisect
+- Postings 2/3 ký tự (n-gram) → tìm chuỗi con chỉ trên ứng viên
+- add_entry / update_entry / bulk import / change feed thêm tên mới tại chỗ
+Tên không còn dùng (phiếu bị xóa) vẫn được gợi ý đến lần nạp lại sau.
+"""
+import asyncio
+import bisect
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+from db.pool import acquire
+from db.metrics import instrument_module
+
+
+def fold(text: str) -> str:
+    """Bỏ dấu tiếng Việt + chữ thường: 'Cảm Biến Đo' → 'cam bien do'."""
+    text = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def _grams(key: str, n: int) -> Set[str]:
+    return {key[i:i + n] for i in range(len(key) - n + 1)}
+
+
+class NameIndex:
+    def __init__(self, names: Iterable[str] = ()):
+        self._lock = threading.Lock()  # đọc từ GUI thread, ghi từ loop nền
+        self._names: List[str] = []            # id → tên gốc
+        self._keys: List[str] = []             # id → khóa đã fold
+        self._sorted: List[tuple] = []         # (khóa, id) đã sắp xếp
+        self._postings: Dict[str, List[int]] = {}  # id tăng dần
+        self._seen: Dict[str, int] = {}        # tên gốc → id
+        for name in names:
+            self._add(name)
+        # Nạp ban đầu: sort 1 lần; add() sau đó chèn bằng insort
+        self._sorted = sorted(zip(self._keys, range(len(self._keys))))
+
+    def __len__(self):
+        return len(self._names)
+
+    # -------------------------------------------------------------
+    # Ghi
+    # -------------------------------------------------------------
+    def add(self, name: Optional[str]) -> bool:
+        with self._lock:
+            i = self._add(name)
+            if i is None:
+                return False
+            bisect.insort(self._sorted, (self._keys[i], i))
+            return True
+
+    def _add(self, name: Optional[str]) -> Optional[int]:
+        name = (name or "").strip()
+        if not name or name in self._seen:
+            return None
+        i = len(self._names)
+        key = fold(name)
+        self._names.append(name)
+        self._keys.append(key)
+        self._seen[name] = i
+        for n in (2, 3):
+            for g in _grams(key, n):
+                self._postings.setdefault(g, []).append(i)
+        return i
+
+    # -------------------------------------------------------------
+    # Tìm
+    # -------------------------------------------------------------
+    def search(self, text: str, limit: int = 20) -> List[str]:
+        """Tiền tố trước (theo thứ tự chữ cái), sau đó các tên chứa chuỗi."""
+        q = fold(text.strip())
+        if not q:
+            return []
+        with self._lock:
+            result: List[str] = []
+            taken: Set[int] = set()
+            pos = bisect.bisect_left(self._sorted, (q, -1))
+            while pos < len(self._sorted) and len(result) < limit:
+                key, i = self._sorted[pos]
+                if not key.startswith(q):
+                    break
+                result.append(self._names[i])
+                taken.add(i)
+                pos += 1
+            if len(result) >= limit:
+                return result
+
+            candidates = self._candidates(q)
+            contains = sorted((self._keys[i], i) for i in candidates
+                              if i not in taken and q in self._keys[i])
+            result.extend(self._names[i] for _, i in contains[:limit - len(result)])
+            return result
+
+    def _candidates(self, q: str) -> Iterable[int]:
+        if len(q) < 2:
+            return range(len(self._keys))  # 1 ký tự: quét (UI yêu cầu >= 2)
+        n = 3 if len(q) >= 3 else 2
+        lists = sorted((self._postings.get(g, []) for g in _grams(q, n)), key=len)
+        candidates = set(lists[0])
+        for other in lists[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(other)
+        return candidates
+
+
+# ----------------------------------------------------------------------
+# Chỉ mục theo team (chạy trên loop nền – db/sync_wrapper.py)
+# ----------------------------------------------------------------------
+_indexes: Dict[int, NameIndex] = {}
+_loading: Dict[int, asyncio.Task] = {}
+
+
+async def _load(team_id: int) -> NameIndex:
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT DISTINCT component_name
+            FROM inventory_entries
+            WHERE team_id = $1 AND component_name IS NOT NULL
+        """, team_id)
+    # Dựng chỉ mục ngoài loop (vài chục nghìn tên → không chặn query khác)
+    index = await asyncio.to_thread(NameIndex, [r["component_name"] for r in rows])
+    _indexes[team_id] = index
+    return index
+
+
+async def get_name_index(team_id: int) -> NameIndex:
+    index = _indexes.get(team_id)
+    if index is not None:
+        return index
+    task = _loading.get(team_id)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_load(team_id))
+        _loading[team_id] = task
+        task.add_done_callback(lambda _t: _loading.pop(team_id, None))
+    return await asyncio.shield(task)
+
+
+def note_component_names(team_id: Optional[int], names: Iterable[str]):
+    """Thêm tên mới vào chỉ mục (nếu team đã được nạp)."""
+    index = _indexes.get(team_id)
+    if index is None:
+        return
+    for name in names:
+        index.add(name)
+
+
+def forget_team(team_id: int):
+    """Bỏ chỉ mục của team – lần gợi ý sau sẽ nạp lại từ DB."""
+    _indexes.pop(team_id, None)
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
@@ -1,23 +1,12 @@
 # modules/options.py
-import asyncpg
-from config.settings import DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME
-
-
-async def get_connection():
-    return await asyncpg.connect(
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME,
-        host=DB_HOST,
-        port=DB_PORT,
-        ssl=False
-    )
+from db.pool import acquire
+from db.metrics import instrument_module
+from modules import local_mirror
 
 
 # ✅ Lấy danh sách theo category
 async def get_options(team_id: int, category: str, only_active=True):
-    conn = await get_connection()
-    try:
+    async with acquire() as conn:
         sql = """
             SELECT id, value, sort_order, is_active, created_at, updated_at
             FROM options
@@ -29,14 +18,11 @@ async def get_options(team_id: int, category: str, only_active=True):
 
         rows = await conn.fetch(sql, team_id, category)
         return [dict(r) for r in rows]
-    finally:
-        await conn.close()
 
 
 # ✅ Thêm / cập nhật danh sách options
 async def upsert_options(team_id: int, category: str, values: list[str], created_by: int = 0):
-    conn = await get_connection()
-    try:
+    async with acquire() as conn:
         async with conn.transaction():
             # Xóa dữ liệu cũ
             await conn.execute(
@@ -53,23 +39,19 @@ async def upsert_options(team_id: int, category: str, values: list[str], created
                     )
                     VALUES ($1, $2, $3, TRUE, $4, NOW(), $5, NOW(), $6)
                 """, team_id, category, v.strip(), idx, created_by, created_by)
-    finally:
-        await conn.close()
 
 
 # ✅ Xóa toàn bộ options theo team
 async def clear_team_options(team_id: int):
-    conn = await get_connection()
-    try:
+    async with acquire() as conn:
         await conn.execute("DELETE FROM options WHERE team_id = $1", team_id)
-    finally:
-        await conn.close()
 
 
 # ✅ Lấy toàn bộ danh mục (grouped theo category)
 async def get_all_categories(team_id: int):
-    conn = await get_connection()
-    try:
+    if local_mirror.is_serving(team_id):
+        return await local_mirror.get_categories(team_id)
+    async with acquire() as conn:
         rows = await conn.fetch("""
             SELECT category, value, sort_order, is_active
             FROM options
@@ -82,5 +64,7 @@ async def get_all_categories(team_id: int):
             cat = r["category"]
             result.setdefault(cat, []).append(r["value"])
         return result
-    finally:
-        await conn.close()
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
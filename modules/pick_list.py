@@ -0,0 +1,138 @@
+# warehouse_app/modules/pick_list.py
+"""
+XUẤT KHO NHIỀU DÒNG (PICK LIST)
+- Gộp các dòng trùng mã → mỗi mã 1 phiếu "out"
+- Kiểm tra tồn của TẤT CẢ mã bằng 1 query (FOR UPDATE – khóa dòng tồn
+  đến hết transaction, 2 người xuất cùng lúc không vượt tồn)
+- 1 câu INSERT ... SELECT cho mọi phiếu out, audit_log ghi theo lô từ
+  RETURNING (modules/audit.py), trong 1 transaction; thiếu hàng ở bất kỳ dòng nào → không ghi gì
+- Xóa cache / refresh view 1 lần ở cuối
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from db.pool import acquire
+from db.metrics import instrument_module
+from modules.stock_refresh import request_refresh
+from modules.query_cache import notify_team_changed, invalidate_team
+from modules.inventory import InsufficientStockError
+from modules.audit import audited_transaction
+
+
+class PickListError(InsufficientStockError):
+    """Có dòng không đủ tồn / không có mã – kèm danh sách thiếu."""
+
+    def __init__(self, shortages: List[Dict[str, Any]]):
+        self.shortages = shortages
+        first = shortages[0]
+        super().__init__(first["component_id"], first["requested"], first["available"])
+        lines = [f"{s['component_id']}: cần {s['requested']}, tồn {s['available']}"
+                 for s in shortages[:20]]
+        self.args = ("Không đủ tồn kho:\n" + "\n".join(lines),)
+
+
+def normalize_lines(lines: Iterable[Tuple[str, int]]) -> "OrderedDict[str, int]":
+    """[(mã, số lượng)] → {MÃ: tổng số lượng} (giữ thứ tự quét)."""
+    merged: "OrderedDict[str, int]" = OrderedDict()
+    for component_id, quantity in lines:
+        cid = (component_id or "").strip().upper()
+        qty = int(quantity)
+        if not cid:
+            continue
+        if qty <= 0:
+            raise ValueError(f"Số lượng phải > 0: {cid}")
+        merged[cid] = merged.get(cid, 0) + qty
+    return merged
+
+
+STOCK_SQL = """
+    SELECT component_id, component_name, unit, storage_location, current_quantity
+    FROM stock_balance
+    WHERE team_id = $1 AND component_id = ANY($2::text[])
+    ORDER BY component_id
+"""
+
+
+def _compare(merged: Dict[str, int], rows) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    stock = {r["component_id"]: dict(r) for r in rows}
+    result, shortages = [], []
+    for cid, qty in merged.items():
+        info = stock.get(cid, {})
+        available = int(info.get("current_quantity") or 0)
+        line = {
+            "component_id": cid,
+            "component_name": info.get("component_name", ""),
+            "unit": info.get("unit", ""),
+            "storage_location": info.get("storage_location", ""),
+            "requested": qty,
+            "available": available,
+            "ok": qty <= available,
+        }
+        result.append(line)
+        if not line["ok"]:
+            shortages.append(line)
+    return result, shortages
+
+
+async def check_pick_list(team_id: int, lines: Iterable[Tuple[str, int]]) -> Dict[str, Any]:
+    """Xem trước: tồn của mọi dòng bằng 1 query (không khóa)."""
+    merged = normalize_lines(lines)
+    async with acquire() as conn:
+        rows = await conn.fetch(STOCK_SQL, team_id, list(merged))
+    result, shortages = _compare(merged, rows)
+    return {"lines": result, "shortages": shortages}
+
+
+async def issue_pick_list(team_id: int, lines: Iterable[Tuple[str, int]],
+                          created_by: int, note: str = "") -> Dict[str, Any]:
+    """Ghi tất cả phiếu out trong 1 transaction, trả về id + thời gian."""
+    merged = normalize_lines(lines)
+    if not merged:
+        return {"ids": [], "rows": 0, "seconds": 0.0}
+
+    started = time.perf_counter()
+    ids = list(merged)
+    async with acquire() as conn:
+        async with audited_transaction(conn) as audit:
+            # Khóa theo thứ tự mã → không deadlock giữa 2 pick list
+            rows = await conn.fetch(STOCK_SQL + " FOR UPDATE", team_id, ids)
+            _, shortages = _compare(merged, rows)
+            if shortages:
+                raise PickListError(shortages)
+
+            # Thuộc tính lấy từ dòng tồn (giống xuất từng mã trên tab Output)
+            inserted = await conn.fetch("""
+                WITH lines AS (
+                    SELECT * FROM unnest($2::text[], $3::int[])
+                        AS l(component_id, quantity)
+                ), ins AS (
+                    INSERT INTO inventory_entries (
+                        component_id, component_name, group_name, process, model,
+                        size, unit, team_id, material, storage_location, invoice,
+                        modinvoice, status, note, quantity, movement_type,
+                        created_by, updated_by, created_at, updated_at
+                    )
+                    SELECT sb.component_id, sb.component_name, sb.group_name,
+                           sb.process, sb.model, sb.size, sb.unit, $1, sb.material,
+                           sb.storage_location, sb.invoice, sb.modinvoice, sb.status,
+                           $4, l.quantity, 'out', $5, $5, NOW(), NOW()
+                    FROM lines l
+                    JOIN stock_balance sb
+                      ON sb.team_id = $1 AND sb.component_id = l.component_id
+                    RETURNING *
+                )
+                SELECT id, component_id, to_jsonb(ins) AS new_data FROM ins
+            """, team_id, ids, [merged[c] for c in ids], note or "", created_by)
+            audit.add_rows("I", inserted, created_by)
+            txid = await notify_team_changed(conn, team_id)
+
+    invalidate_team(team_id)
+    request_refresh(txid)
+    seconds = time.perf_counter() - started
+    print(f"[PICK LIST] {len(inserted)} phiếu out trong {seconds:.3f}s")
+    return {"ids": [r["id"] for r in inserted], "rows": len(inserted), "seconds": seconds}
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
@@ -0,0 +1,282 @@
+# warehouse_app/modules/query_cache.py
+"""
+CACHE KẾT QUẢ TRUY VẤN PHÍA CLIENT (TTL + LRU)
+- Khóa = (hàm, team_id, tham số đã chuẩn hóa) → chuyển tab / bấm tìm lại /
+  tải lại sau khi lưu không query lại DB nếu dữ liệu chưa đổi
+- add_entry / update_entry / delete_entry (+ bulk import) xóa đúng cache của
+  team bị ảnh hưởng + NOTIFY 'inventory_cache_invalidate' cho client khác
+- Nhiều lệnh giống nhau cùng lúc → chỉ 1 query (các lệnh sau chờ kết quả)
+Chạy hoàn toàn trên loop nền (db/sync_wrapper.py) nên không cần khóa.
+Kết quả trả về được dùng chung – nơi gọi KHÔNG được sửa tại chỗ.
+"""
+import asyncio
+import functools
+import inspect
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db.pool import connect_dedicated
+from db.metrics import instrument_module
+from config.settings import (
+    QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_NOTIFY
+)
+
+INVALIDATE_CHANNEL = "inventory_cache_invalidate"
+RECONNECT_DELAY = 5.0
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0             # chờ chung 1 query đang chạy
+        self.expired = 0
+        self.evictions = 0          # bị đẩy ra do vượt max_entries
+        self.invalidations = 0      # số mục bị xóa do ghi dữ liệu
+        self.remote_invalidations = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+        }
+
+
+def _normalize(value: Any) -> Any:
+    """Biến dict/list lồng nhau thành tuple có thứ tự (hashable, ổn định)."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, set):
+        return tuple(sorted(_normalize(v) for v in value))
+    return value
+
+
+class QueryCache:
+    def __init__(self, ttl: float = QUERY_CACHE_TTL,
+                 max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        # key → (hết hạn lúc, team_id, kết quả)
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._team_gen: Dict[Any, int] = {}   # tăng mỗi lần team bị ghi
+        self._listener = None
+        self._reconnect_task = None
+        self._stopped = False
+        # Gọi sau mỗi lần team bị ghi (local + client khác) – modules/local_mirror.py
+        self._on_invalidate: List[Callable[[Any], None]] = []
+
+    # -------------------------------------------------------------
+    # Đọc / ghi cache
+    # -------------------------------------------------------------
+    def get(self, key: Tuple):
+        item = self._entries.get(key)
+        if item is None:
+            return False, None
+        expires_at, _team, value = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.stats.expired += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: Tuple, team_id: Any, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, team_id, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get_or_load(self, key: Tuple, team_id: Any, loader):
+        await self._ensure_listener()
+        found, value = self.get(key)
+        if found:
+            self.stats.hits += 1
+            return value
+        self.stats.misses += 1
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats.shared += 1
+            return await asyncio.shield(pending)
+
+        # Query chạy thành task riêng: người gọi đầu bị hủy (đóng dialog, tìm
+        # lại...) chỉ thôi chờ, những người đang chờ chung vẫn nhận kết quả
+        gen = self._team_gen.get(team_id, 0)
+        task = asyncio.get_running_loop().create_task(loader())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._load_done(key, team_id, gen, t))
+        return await asyncio.shield(task)
+
+    def _load_done(self, key: Tuple, team_id: Any, gen: int, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return  # exception() đánh dấu đã xử lý nếu không ai chờ
+        # Có lần ghi trong lúc query → kết quả có thể cũ, không lưu
+        if self._team_gen.get(team_id, 0) == gen:
+            self.put(key, team_id, task.result())
+
+    # -------------------------------------------------------------
+    # Xóa cache
+    # -------------------------------------------------------------
+    def invalidate_team(self, team_id: Any) -> int:
+        self._team_gen[team_id] = self._team_gen.get(team_id, 0) + 1
+        keys = [k for k, (_, t, _) in self._entries.items() if t == team_id]
+        for k in keys:
+            del self._entries[k]
+        self.stats.invalidations += len(keys)
+        for callback in self._on_invalidate:
+            try:
+                callback(team_id)
+            except Exception as e:
+                print(f"[QUERY CACHE] Lỗi callback xóa cache: {e}")
+        return len(keys)
+
+    def invalidate_query(self, name: str, team_id: Any) -> int:
+        """Chỉ các kết quả của 1 hàm (dữ liệu gốc của team không đổi)."""
+        self._team_gen[team_id] = self._team_gen.get(team_id, 0) + 1
+        keys = [k for k, (_, t, _) in self._entries.items() if t == team_id and k[0] == name]
+        for k in keys:
+            del self._entries[k]
+        self.stats.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        # Cả team chỉ có query đang chạy → kết quả về sau cũng không được lưu
+        teams = {t for _, t, _ in self._entries.values()} | {k[1] for k in self._inflight}
+        for team_id in teams:
+            self._team_gen[team_id] = self._team_gen.get(team_id, 0) + 1
+        self._entries.clear()
+
+    # -------------------------------------------------------------
+    # NOTIFY từ client khác
+    # -------------------------------------------------------------
+    async def _ensure_listener(self):
+        if self._listener is not None or not QUERY_CACHE_NOTIFY or self._stopped:
+            return
+        self._listener = False  # đang kết nối / chờ kết nối lại → không thử mỗi lần
+        try:
+            conn = await connect_dedicated()
+            await conn.add_listener(INVALIDATE_CHANNEL, self._on_remote_invalidate)
+            conn.add_termination_listener(self._on_terminated)
+            self._listener = conn
+        except Exception as e:
+            print(f"[QUERY CACHE] Không LISTEN được: {e}")
+            self._schedule_reconnect()
+
+    def _on_terminated(self, conn):
+        if self._stopped:
+            return
+        # Mất kết nối → có thể đã lỡ NOTIFY của client khác: bỏ toàn bộ cache
+        self._listener = False
+        self.clear()
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            return
+
+        async def _reconnect():
+            await asyncio.sleep(RECONNECT_DELAY)
+            self._listener = None
+            await self._ensure_listener()
+
+        self._reconnect_task = asyncio.get_running_loop().create_task(_reconnect())
+
+    def _on_remote_invalidate(self, conn, pid, channel, payload):
+        try:
+            team_id = int(payload)
+        except (TypeError, ValueError):
+            self.clear()
+            return
+        self.stats.remote_invalidations += 1
+        self.invalidate_team(team_id)
+
+    async def stop(self):
+        self._stopped = True  # không kết nối lại khi đóng
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._listener:
+            try:
+                await self._listener.close()
+            except Exception:
+                pass
+        self._listener = None
+
+
+cache = QueryCache()
+
+
+def cached_query(func):
+    """
+    Decorator cho hàm đọc async có tham số team_id.
+    Khóa cache = (tên hàm, team_id, các tham số còn lại đã chuẩn hóa).
+    """
+    sig = inspect.signature(func)
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        team_id = params.pop("team_id", None)
+        key = (name, team_id, _normalize(params))
+        return await cache.get_or_load(
+            key, team_id, lambda: func(*args, **kwargs))
+
+    wrapper.uncached = func
+    wrapper.cache_name = name
+    return wrapper
+
+
+async def notify_team_changed(conn, team_id: Optional[int]) -> Optional[int]:
+    """
+    Gọi TRONG transaction ghi: NOTIFY chỉ được gửi khi COMMIT.
+    Trả về txid của transaction (cùng lượt gọi DB) → request_refresh(txid)
+    biết lần ghi đã nằm trong snapshot refresh của client khác chưa.
+    """
+    if QUERY_CACHE_NOTIFY and team_id is not None:
+        row = await conn.fetchrow("SELECT pg_notify($1, $2), txid_current()",
+                                  INVALIDATE_CHANNEL, str(team_id))
+        return row[1]
+    return None
+
+
+def invalidate_team(team_id: Optional[int]):
+    """Gọi SAU khi COMMIT: xóa cache local của team (None → xóa hết)."""
+    if team_id is None:
+        cache.clear()
+    else:
+        cache.invalidate_team(team_id)
+
+
+def invalidate_query(func, team_id: Optional[int]):
+    """Xóa cache của riêng 1 hàm @cached_query cho 1 team (vd. báo cáo tổng hợp)."""
+    cache.invalidate_query(func.cache_name, team_id)
+
+
+def on_team_invalidated(callback: Callable[[Any], None]):
+    """callback(team_id) chạy trên loop nền mỗi khi dữ liệu 1 team bị ghi."""
+    cache._on_invalidate.append(callback)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return {"entries": len(cache._entries), **cache.stats.snapshot()}
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
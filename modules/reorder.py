@@ -0,0 +1,187 @@
+# warehouse_app/modules/reorder.py
+"""
+ĐIỂM ĐẶT HÀNG LẠI / SỐ NGÀY CÒN ĐỦ DÙNG – TÍNH CHO CẢ TEAM 1 LẦN
+- 1 query: tồn hiện tại (stock_balance) + chuỗi xuất theo ngày của từng mã
+  trong cửa sổ REORDER_WINDOW_DAYS (entry_rollup_daily, chiều 'component'),
+  mỗi mã 1 dòng, chuỗi ngày dạng mảng
+- compute_reorder(): NumPy trên toàn bộ mã cùng lúc (bincount, không lặp / mã)
+    avg_daily     = tổng xuất / số ngày cửa sổ (ngày không xuất tính là 0)
+    rate          = max(avg_daily, trung bình REORDER_RECENT_DAYS ngày gần nhất)
+    std_daily     = độ lệch chuẩn nhu cầu ngày
+    reorder_point = rate × lead_time + z × std_daily × √lead_time
+    days_of_cover = tồn / rate
+- Cờ: "out" (hết hàng nhưng vẫn đang dùng), "reorder" (tồn ≤ điểm đặt hàng)
+- python -m modules.reorder --bench 50000: đo phần tính trên dữ liệu giả
+"""
+import asyncio
+import math
+import time
+from datetime import date, timedelta
+from itertools import chain
+from typing import Any, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from db.pool import acquire
+from db.metrics import instrument_module
+from db.statements import registry
+from config.settings import (
+    REORDER_WINDOW_DAYS, REORDER_RECENT_DAYS, REORDER_LEAD_TIME_DAYS, REORDER_SERVICE_Z,
+)
+
+FLAG_OUT = "out"
+FLAG_REORDER = "reorder"
+
+# Mã còn tồn hoặc có xuất trong cửa sổ; days = số ngày kể từ $2
+REORDER_SQL = registry.register("reorder_series", """
+    SELECT sb.component_id, sb.current_quantity,
+           COALESCE(m.days, '{}') AS days, COALESCE(m.qty, '{}') AS qty
+    FROM stock_balance sb
+    LEFT JOIN (
+        SELECT d.dim_value, array_agg(d.day - $2::date) AS days, array_agg(d.out_qty) AS qty
+        FROM entry_rollup_daily d
+        WHERE d.team_id = $1 AND d.dimension = 'component'
+          AND d.day >= $2::date AND d.day < $3::date AND d.out_qty > 0
+        GROUP BY d.dim_value
+    ) m ON m.dim_value = sb.component_id
+    WHERE sb.team_id = $1 AND (sb.current_quantity > 0 OR m.dim_value IS NOT NULL)
+    ORDER BY sb.component_id
+""")
+
+
+# ----------------------------------------------------------------------
+# 1. Tính (không đụng DB)
+# ----------------------------------------------------------------------
+def compute_reorder(
+    component_ids: Sequence[str],
+    stock: np.ndarray,
+    rows: np.ndarray,
+    offsets: np.ndarray,
+    qty: np.ndarray,
+    window: int = REORDER_WINDOW_DAYS,
+    recent_days: int = REORDER_RECENT_DAYS,
+    lead_time: float = REORDER_LEAD_TIME_DAYS,
+    z: float = REORDER_SERVICE_Z,
+) -> pd.DataFrame:
+    """
+    Dạng thưa: phần tử k = mã rows[k] xuất qty[k] vào ngày offsets[k]
+    (0 … window-1, window-1 = hôm qua). Trả về 1 dòng / mã.
+    """
+    n = len(component_ids)
+    stock = np.asarray(stock, dtype=np.float64)
+    rows = np.asarray(rows, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    qty = np.asarray(qty, dtype=np.float64)
+    recent_days = min(recent_days, window)
+
+    total = np.bincount(rows, weights=qty, minlength=n)
+    sumsq = np.bincount(rows, weights=qty * qty, minlength=n)
+    recent = offsets >= window - recent_days
+    recent_total = np.bincount(rows[recent], weights=qty[recent], minlength=n)
+
+    avg = total / window
+    rate = np.maximum(avg, recent_total / recent_days)
+    std = np.sqrt(np.maximum(sumsq / window - avg * avg, 0.0))
+    reorder_point = np.ceil(rate * lead_time + z * std * math.sqrt(lead_time))
+
+    using = rate > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(using, stock / rate, np.inf)
+    flag = np.where(using & (stock <= 0), FLAG_OUT,
+                    np.where(using & (stock <= reorder_point), FLAG_REORDER, ""))
+
+    return pd.DataFrame({
+        "component_id": component_ids,
+        "current_quantity": stock,
+        "avg_daily": np.round(rate, 3),
+        "std_daily": np.round(std, 3),
+        "days_of_cover": np.round(cover, 1),
+        "reorder_point": reorder_point,
+        "reorder_flag": flag,
+    })
+
+
+def _from_records(records, window: int, **params) -> pd.DataFrame:
+    """Dòng DB (mảng / mã) → dạng thưa cho compute_reorder."""
+    lengths = np.fromiter((len(r["days"]) for r in records), dtype=np.int64,
+                          count=len(records))
+    nnz = int(lengths.sum())
+    return compute_reorder(
+        [r["component_id"] for r in records],
+        np.fromiter((r["current_quantity"] for r in records), dtype=np.float64,
+                    count=len(records)),
+        np.repeat(np.arange(len(records)), lengths),
+        np.fromiter(chain.from_iterable(r["days"] for r in records), dtype=np.int64, count=nnz),
+        np.fromiter(chain.from_iterable(r["qty"] for r in records), dtype=np.float64, count=nnz),
+        window=window, **params)
+
+
+def reorder_flag(quantity: float, rate: float, reorder_point: float) -> str:
+    """Cờ cho 1 mã khi tồn đổi (UI cập nhật tại chỗ, không tính lại cả team)."""
+    if rate <= 0:
+        return ""
+    if quantity <= 0:
+        return FLAG_OUT
+    return FLAG_REORDER if quantity <= reorder_point else ""
+
+
+# ----------------------------------------------------------------------
+# 2. Tải + tính cho 1 team
+# ----------------------------------------------------------------------
+async def get_reorder_report(
+    team_id: int,
+    window: int = REORDER_WINDOW_DAYS,
+    lead_time: float = REORDER_LEAD_TIME_DAYS,
+) -> pd.DataFrame:
+    """
+    Tính trên loop nền (NumPy trong thread phụ). Số xuất lấy từ bảng tổng hợp
+    ngày (modules/rollups.py) → trễ tối đa 1 chu kỳ ROLLUP_REFRESH_INTERVAL.
+    """
+    end = date.today()  # chỉ tính các ngày đã trọn
+    start = end - timedelta(days=window)
+    async with acquire() as conn:
+        records = await registry.fetch(conn, REORDER_SQL, team_id, start, end)
+    return await asyncio.to_thread(_from_records, records, window, lead_time=lead_time)
+
+
+# ----------------------------------------------------------------------
+# 3. Đo tốc độ: python -m modules.reorder --bench 50000
+# ----------------------------------------------------------------------
+def benchmark(components: int = 50_000, window: int = REORDER_WINDOW_DAYS,
+              active_ratio: float = 0.3, repeat: int = 5, seed: int = 0) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    ids = [f"C{i:06d}" for i in range(components)]
+    stock = rng.integers(0, 500, components).astype(np.float64)
+    # Mỗi mã xuất vào ~active_ratio số ngày, dạng thưa như dữ liệu thật
+    mask = rng.random((components, window)) < active_ratio
+    rows, offsets = np.nonzero(mask)
+    qty = rng.integers(1, 20, len(rows)).astype(np.float64)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = compute_reorder(ids, stock, rows, offsets, qty, window=window)
+        timings.append(time.perf_counter() - started)
+    return {
+        "components": components,
+        "window_days": window,
+        "series_points": len(rows),
+        "best_ms": round(min(timings) * 1000, 1),
+        "median_ms": round(sorted(timings)[len(timings) // 2] * 1000, 1),
+        "flagged": int((result["reorder_flag"] != "").sum()),
+    }
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Đo tốc độ tính điểm đặt hàng lại")
+    parser.add_argument("--bench", type=int, default=50_000, metavar="N", help="số mã giả")
+    parser.add_argument("--window", type=int, default=REORDER_WINDOW_DAYS)
+    args = parser.parse_args()
+    print(benchmark(args.bench, args.window))
@@ -0,0 +1,125 @@
+# warehouse_app/modules/rollups.py
+"""
+BÁO CÁO TIÊU HAO THEO TUẦN / THÁNG (db/migrations/0009_entry_rollups.sql)
+- refresh_rollups(): xử lý hàng đợi ngày bị thay đổi theo từng khúc
+  (mỗi khúc 1 transaction ngắn), 1 client tại 1 thời điểm nhờ advisory lock
+- RollupScheduler: chạy lúc khởi động + định kỳ trên loop nền
+- get_rollup(): chỉ đọc entry_rollups (không đụng inventory_entries)
+"""
+import asyncio
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from db.pool import acquire
+from db.metrics import instrument_module
+from db.statements import registry
+from modules.query_cache import cached_query, invalidate_query
+from config.settings import ROLLUP_REFRESH_INTERVAL, ROLLUP_BATCH_DAYS
+
+ROLLUP_LOCK_KEY = 74_205  # pg_advisory_lock – 1 client tính tổng hợp
+
+GRAINS = {"W": "Tuần", "M": "Tháng"}
+DIMENSIONS = {
+    "component": "Linh kiện",
+    "process": "Process",
+    "model": "Model",
+    "group": "Group",
+    "material": "Material",
+}
+
+# Tên linh kiện chỉ để hiển thị → lấy từ stock_balance (1 dòng / mã)
+ROLLUP_SQL = registry.register("rollup", """
+    SELECT r.period_start, r.dim_value, r.in_qty, r.out_qty, r.adj_qty, r.entries,
+           CASE WHEN r.dimension = 'component' THEN sb.component_name END AS label
+    FROM entry_rollups r
+    LEFT JOIN stock_balance sb
+           ON r.dimension = 'component'
+          AND sb.team_id = r.team_id AND sb.component_id = r.dim_value
+    WHERE r.team_id = $1 AND r.grain = $2 AND r.dimension = $3
+      AND r.period_start >= $4 AND r.period_start <= $5
+    ORDER BY r.dim_value, r.period_start
+""")
+
+
+# ----------------------------------------------------------------------
+# 1. Tính lại
+# ----------------------------------------------------------------------
+async def refresh_rollups(batch_days: int = ROLLUP_BATCH_DAYS) -> Dict[str, Any]:
+    """Xử lý hết hàng đợi. Trả về {"days": số (team, ngày) đã tính lại}."""
+    try:
+        async with acquire() as conn:
+            if await conn.fetchval("SELECT to_regproc('entry_rollups_refresh')") is None:
+                return {"days": 0}  # chưa chạy migration 0009
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", ROLLUP_LOCK_KEY):
+                return {"days": 0, "busy": True}
+            total = 0
+            teams = set()
+            try:
+                while True:
+                    async with conn.transaction():
+                        row = await conn.fetchrow(
+                            "SELECT days, team_ids FROM entry_rollups_refresh($1)", batch_days)
+                    total += row["days"]
+                    teams.update(row["team_ids"])
+                    if row["days"] < batch_days:
+                        break
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", ROLLUP_LOCK_KEY)
+        # get_rollup đã cache của các team này có thể thiếu kỳ vừa tính
+        # (cache tìm kiếm / tồn kho không liên quan → giữ nguyên)
+        for team_id in teams:
+            invalidate_query(get_rollup, team_id)
+        return {"days": total}
+    except Exception as e:
+        print(f"[ROLLUP] Lỗi tính tổng hợp: {e}")
+        return {"days": 0, "error": str(e)}
+
+
+class RollupScheduler:
+    def __init__(self, interval: float = ROLLUP_REFRESH_INTERVAL):
+        self.interval = interval
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Gọi trên loop nền (submit)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self.last_result = await refresh_rollups()
+            await asyncio.sleep(self.interval)
+
+
+rollups = RollupScheduler()
+
+
+async def start_rollups():
+    rollups.start()
+
+
+# ----------------------------------------------------------------------
+# 2. Đọc
+# ----------------------------------------------------------------------
+@cached_query
+async def get_rollup(team_id: int, grain: str, dimension: str,
+                     date_from: date, date_to: date) -> List[Dict[str, Any]]:
+    """
+    Các kỳ có period_start trong [date_from, date_to] (tuần bắt đầu thứ Hai,
+    tháng bắt đầu ngày 1). Mỗi dòng: period_start, dim_value, label,
+    in_qty, out_qty, adj_qty, entries.
+    """
+    async with acquire() as conn:
+        rows = await registry.fetch(conn, ROLLUP_SQL, team_id, grain, dimension,
+                                    date_from, date_to)
+        return [dict(r) for r in rows]
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
@@ -3,44 +3,73 @@
 TÌM KIẾM SIÊU TỐC - TẬN DỤNG INDEX ĐÃ TẠO
 - GIN: array, tsvector
 - pg_trgm: component_id, component_name
-- Composite: team_id + created_at
+- Composite: team_id + created_at (+ id cho phân trang keyset)
 - Full-text: plainto_tsquery('simple')
-"""
-from typing import List, Dict, Any, Optional
-import asyncpg
-from config.settings import DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME
 
+Bật bản sao cục bộ (modules/local_mirror.py) → search_entries / search_current_stock
+trả lời từ SQLite trên máy khi bản sao đã theo kịp, không đủ dữ liệu mới hỏi Postgres.
 
-async def get_connection() -> asyncpg.Connection:
-    return await asyncpg.connect(
-        user=DB_USER, password=DB_PASS, database=DB_NAME,
-        host=DB_HOST, port=DB_PORT, ssl=False, timeout=10.0
-    )
+SQL của search_entries / search_current_stock được chuẩn hóa theo "shape"
+(chỉ phụ thuộc bộ lọc nào có mặt, không phụ thuộc giá trị hay số phần tử)
+→ mỗi tổ hợp bộ lọc chỉ PREPARE 1 lần trên mỗi kết nối (db/statements.py).
 
+inventory_entries có thể được phân vùng theo tháng (db/migrations/0007_entries_partition.sql):
+mọi điều kiện thời gian viết dạng "ie.created_at <op> $n::timestamptz" để
+planner cắt tỉa partition (kể cả khi chạy plan generic của statement đã PREPARE).
+"""
+from datetime import date, datetime, time, timedelta
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from db.pool import acquire
+from db.metrics import instrument_module
+from db.statements import registry
+from config.settings import SEARCH_PAGE_SIZE
+from modules.query_cache import cached_query
+from modules.name_index import get_name_index
+from modules import local_mirror
+
+
+ENTRY_COLUMNS = """
+    ie.id, ie.component_id, ie.component_name, ie.group_name,
+    ie.process, ie.model, ie.size, ie.unit, ie.material,
+    ie.storage_location, ie.invoice, ie.modinvoice,
+    ie.status, ie.note, ie.quantity, ie.movement_type,
+    ie.created_at, ie.created_by
+"""
+# Keyset: thứ tự ổn định (created_at, id) – dùng idx_entries_team_created_id
+ENTRY_ORDER = "ORDER BY ie.created_at DESC, ie.id DESC"
 
-async def search_entries(
-    team_id: int,
-    movement_type: Optional[str] = None,
-    filters: Optional[Dict[str, Any]] = None,
-    limit: Optional[int] = None,   # ← None = FULL
-    offset: int = 0,
-) -> List[Dict[str, Any]]:
-    filters = filters or {}
+
+def _time_bounds(created_from, created_to) -> Tuple[Any, Any]:
+    """
+    Chuẩn hóa khoảng ngày thành [from, to) – ngày (date) hiểu là cả ngày đó.
+    Dạng nửa mở '<' cố định → 1 shape, cắt tỉa partition đúng biên tháng.
+    """
+    if isinstance(created_from, date) and not isinstance(created_from, datetime):
+        created_from = datetime.combine(created_from, time.min)
+    if isinstance(created_to, date) and not isinstance(created_to, datetime):
+        created_to = datetime.combine(created_to + timedelta(days=1), time.min)
+    elif isinstance(created_to, datetime):
+        # '<= t' ≡ '< t + 1µs' (timestamptz lưu tới micro giây)
+        created_to = created_to + timedelta(microseconds=1)
+    return created_from, created_to
+
+
+def _build_entry_where(
+    team_id: int, movement_type: Optional[str], filters: Optional[Dict[str, Any]]
+) -> Tuple[List[str], List[Any]]:
+    # Copy để không làm mất "movement_type" trong dict của nơi gọi
+    # (UI dùng lại cùng filters cho các trang tiếp theo)
+    filters = dict(filters or {})
     where: List[str] = ["ie.team_id = $1"]
     params: List[Any] = [team_id]
     idx = 2
 
     # movement_type truyền vào từ filters hoặc trực tiếp
-    movement_type = filters.pop("movement_type", None)
-    if movement_type:
-        if movement_type == "in":
-            # lọc "in"
-            where.append(f"ie.movement_type = ANY(${idx}::text[])")
-            params.append(["in", "adjustment"])
-        elif movement_type == "out":
-            # lọc"out"
-            where.append(f"ie.movement_type = ${idx}")
-            params.append("out")
+    movement_type = filters.pop("movement_type", None) or movement_type
+    if movement_type in ("in", "out"):
+        # "in" gồm cả điều chỉnh; cùng 1 dạng ANY cho cả 2 → cùng shape
+        where.append(f"ie.movement_type = ANY(${idx}::text[])")
+        params.append(["in", "adjustment"] if movement_type == "in" else ["out"])
         idx += 1
 
     if filters.get("component_id_exact"):
@@ -71,12 +100,9 @@ async def search_entries(
     for field in ("storage_location", "status"):
         val = filters.get(field)
         if val:
-            if isinstance(val, (list, tuple)) and val:
-                where.append(f"ie.{field} = ANY(${idx}::text[])")
-                params.append(val)
-            else:
-                where.append(f"ie.{field} = ${idx}")
-                params.append(val)
+            # 1 giá trị hay nhiều giá trị → cùng dạng ANY
+            where.append(f"ie.{field} = ANY(${idx}::text[])")
+            params.append(list(val) if isinstance(val, (list, tuple)) else [val])
             idx += 1
 
     if filters.get("invoice"):
@@ -110,13 +136,15 @@ async def search_entries(
     if filters.get("note_is_not_empty"):
         where.append("(ie.note IS NOT NULL AND ie.note != '')")
 
-    if filters.get("created_from"):
-        where.append(f"ie.created_at >= ${idx}")
-        params.append(filters["created_from"])
+    created_from, created_to = _time_bounds(
+        filters.get("created_from"), filters.get("created_to"))
+    if created_from:
+        where.append(f"ie.created_at >= ${idx}::timestamptz")
+        params.append(created_from)
         idx += 1
-    if filters.get("created_to"):
-        where.append(f"ie.created_at <= ${idx}")
-        params.append(filters["created_to"])
+    if created_to:
+        where.append(f"ie.created_at < ${idx}::timestamptz")
+        params.append(created_to)
         idx += 1
 
     if filters.get("q"):
@@ -124,115 +152,226 @@ async def search_entries(
         params.append(filters["q"])
         idx += 1
 
-    where_sql = " AND ".join(where)
+    return where, params
 
-    limit_clause = ""
-    if limit is not None:
-        limit_clause = f"LIMIT ${idx} OFFSET ${idx + 1}"
-        params.extend([limit, offset])
-        idx += 1
-    else:
-        limit_clause = f"OFFSET ${idx}"
-        params.append(offset)
+
+def _keyset_clause(where: List[str], params: List[Any], after) -> None:
+    """after = (created_at, id) của dòng cuối trang trước."""
+    if after:
+        n = len(params)
+        # So sánh theo hàng không cắt tỉa được partition → thêm cận trên
+        # created_at (thừa về logic) để trang sau bỏ qua các tháng mới hơn
+        where.append(f"ie.created_at <= ${n + 1}::timestamptz")
+        where.append(f"(ie.created_at, ie.id) < (${n + 1}::timestamptz, ${n + 2}::bigint)")
+        params.extend([after[0], after[1]])
+
+
+@cached_query
+async def search_entries(
+    team_id: int,
+    movement_type: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,   # ← None = FULL
+    offset: int = 0,
+    page_size: Optional[int] = None,
+    after: Optional[Tuple[Any, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    limit/offset giữ cho code cũ; page_size + after = phân trang keyset
+    (không OFFSET → trang sau nhanh như trang đầu).
+    """
+    if page_size is not None:
+        limit, offset = page_size, 0
+
+    local = None
+    if local_mirror.is_serving(team_id):
+        local, complete = await local_mirror.search_entries(
+            team_id, movement_type, filters, limit, offset, after)
+        if complete:
+            return local
+
+    where, params = _build_entry_where(team_id, movement_type, filters)
+    _keyset_clause(where, params, after)
+    idx = len(params) + 1
+
+    # Luôn có LIMIT/OFFSET (LIMIT NULL = không giới hạn) → không tách shape
+    limit_clause = f"LIMIT ${idx}::bigint OFFSET ${idx + 1}::bigint"
+    params.extend([limit, offset or 0])
 
     sql = f"""
-        SELECT
-            ie.id, ie.component_id, ie.component_name, ie.group_name,
-            ie.process, ie.model, ie.size, ie.unit, ie.material,
-            ie.storage_location, ie.invoice, ie.modinvoice,
-            ie.status, ie.note, ie.quantity, ie.movement_type,
-            ie.created_at, ie.created_by
+        SELECT {ENTRY_COLUMNS}
         FROM inventory_entries ie
-        WHERE {where_sql}
-        ORDER BY ie.created_at DESC
+        WHERE {" AND ".join(where)}
+        {ENTRY_ORDER}
         {limit_clause}
     """
 
-    conn = await get_connection()
     try:
-        rows = await conn.fetch(sql, *params)
-        return [dict(r) for r in rows]
-    finally:
-        await conn.close()
+        async with acquire() as conn:
+            rows = await registry.fetch(conn, sql, *params)
+            return [dict(r) for r in rows]
+    except local_mirror.OFFLINE_ERRORS:
+        if local is None:
+            raise
+        # Mất kết nối: trả phần bản sao có (thiếu phiếu cũ hơn LOCAL_MIRROR_ENTRY_DAYS)
+        return local
+
+
+async def search_entries_page(
+    team_id: int,
+    filters: Optional[Dict[str, Any]] = None,
+    page_size: int = SEARCH_PAGE_SIZE,
+    after: Optional[Tuple[Any, int]] = None,
+) -> Dict[str, Any]:
+    """
+    1 trang cho UI: {"rows": [...], "next_cursor": (created_at, id) | None}.
+    Lấy dư 1 dòng để biết còn trang sau hay không.
+    """
+    rows = await search_entries(
+        team_id, filters=filters, page_size=page_size + 1, after=after)
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1]["created_at"], rows[-1]["id"])
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+async def iter_entries(
+    team_id: int,
+    filters: Optional[Dict[str, Any]] = None,
+    batch_size: int = SEARCH_PAGE_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Duyệt toàn bộ kết quả bằng server-side cursor, mỗi lần yield 1 lô
+    → bộ nhớ chỉ giữ batch_size dòng (xuất file, báo cáo lớn).
+    Giữ 1 kết nối pool đến khi duyệt xong / aclose().
+    """
+    where, params = _build_entry_where(team_id, None, filters)
+    sql = f"""
+        SELECT {ENTRY_COLUMNS}
+        FROM inventory_entries ie
+        WHERE {" AND ".join(where)}
+        {ENTRY_ORDER}
+    """
+    async with acquire() as conn:
+        async with conn.transaction():  # cursor cần transaction
+            cursor = await conn.cursor(sql, *params)
+            while True:
+                rows = await cursor.fetch(batch_size)
+                if not rows:
+                    break
+                yield [dict(r) for r in rows]
 
 # Tạo gợi ý đặt tên linh kiện
 
 
 async def get_name_suggestions(team_id: int, prefix: str, limit: int = 10) -> List[str]:
-    print(f"[SQL DEBUG] team_id={team_id}, prefix='{prefix}'")
-    conn = await get_connection()
+    # Tra chỉ mục trong bộ nhớ (modules/name_index.py), chỉ query DB lần đầu
     try:
-        sql = """
-            SELECT DISTINCT ON (component_name) component_name
-            FROM inventory_entries
-            WHERE team_id = $1
-              AND component_name ILIKE $2 || '%'
-            ORDER BY component_name, similarity(component_name, $2) DESC
-            LIMIT $3
-        """
-        rows = await conn.fetch(sql, team_id, prefix, limit)
-        result = [row["component_name"] for row in rows]
-        print(f"[SQL RESULT] {len(result)} gợi ý: {result}")
-        return result
+        index = await get_name_index(team_id)
+        return index.search(prefix, limit)
     except Exception as e:
         print(f"[SQL ERROR] {e}")
         return []
-    finally:
-        await conn.close()
 
 
-async def search_current_stock(team_id: int, filters: dict):
-    conn = await get_connection()
-    try:
-        sql = "SELECT * FROM current_stock WHERE team_id = $1"
-        params = [team_id]
-        idx = 2
+STOCK_COLUMNS = """
+    component_id, component_name, group_name, process, model,
+    size, unit, team_id, material, storage_location, invoice,
+    modinvoice, status, note, created_by, created_at,
+    current_quantity
+"""
 
-        if "component_id" in filters:
-            sql += f" AND component_id = ${idx}"
-            params.append(filters["component_id"])
-            idx += 1
 
-        if "component_name_contains" in filters:
-            sql += f" AND component_name ILIKE ${idx}"
-            params.append(f"%{filters['component_name_contains']}%")
-            idx += 1
+def _build_stock_where(team_id: int, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    sql = "team_id = $1 AND current_quantity > 0"
+    params: List[Any] = [team_id]
+    idx = 2
 
-        if "size" in filters:
-            sql += f" AND size ILIKE ${idx}"
-            params.append(f"%{filters['size']}%")
-            idx += 1
+    if "component_id" in filters:
+        sql += f" AND component_id = ${idx}"
+        params.append(filters["component_id"])
+        idx += 1
 
-        if "status" in filters:
-            sql += f" AND status = ${idx}"
-            params.append(filters["status"])
-            idx += 1
+    if "component_name_contains" in filters:
+        sql += f" AND component_name ILIKE ${idx}"
+        params.append(f"%{filters['component_name_contains']}%")
+        idx += 1
 
-        if "invoice" in filters:
-            sql += f" AND invoice ILIKE ${idx}"
-            params.append(f"%{filters['invoice']}%")
-            idx += 1
+    if "size" in filters:
+        sql += f" AND size ILIKE ${idx}"
+        params.append(f"%{filters['size']}%")
+        idx += 1
 
-        if "modinvoice" in filters:
-            sql += f" AND modinvoice ILIKE ${idx}"
-            params.append(f"%{filters['modinvoice']}%")
-            idx += 1
+    if "status" in filters:
+        sql += f" AND status = ${idx}"
+        params.append(filters["status"])
+        idx += 1
+
+    if "invoice" in filters:
+        sql += f" AND invoice ILIKE ${idx}"
+        params.append(f"%{filters['invoice']}%")
+        idx += 1
+
+    if "modinvoice" in filters:
+        sql += f" AND modinvoice ILIKE ${idx}"
+        params.append(f"%{filters['modinvoice']}%")
+        idx += 1
+
+    if "note_contains" in filters:
+        sql += f" AND note ILIKE ${idx}"
+        params.append(f"%{filters['note_contains']}%")
+        idx += 1
 
-        if "note_contains" in filters:
-            sql += f" AND note ILIKE ${idx}"
-            params.append(f"%{filters['note_contains']}%")
+    # Array filters: phải chứa TẤT CẢ giá trị chọn – 1 tham số mảng
+    # (không phải 1 placeholder / giá trị) → shape không đổi theo số lượng
+    for key in ["group_name", "process", "model", "material"]:
+        if filters.get(key):
+            sql += f" AND {key} @> ${idx}::text[]"
+            params.append(list(filters[key]))
             idx += 1
 
-        # Array filters
-        for key in ["group_name", "process", "model", "material"]:
-            if key in filters:
-                for val in filters[key]:
-                    sql += f" AND ${idx} = ANY({key})"
-                    params.append(val)
-                    idx += 1
+    return sql, params
 
-        sql += " ORDER BY component_id LIMIT 1000"
-        rows = await conn.fetch(sql, *params)
+
+@cached_query
+async def search_current_stock(team_id: int, filters: dict):
+    if local_mirror.is_serving(team_id):
+        return await local_mirror.search_stock(team_id, filters)
+    where, params = _build_stock_where(team_id, filters)
+    sql = f"""
+        SELECT {STOCK_COLUMNS}
+        FROM stock_balance
+        WHERE {where}
+        ORDER BY component_id LIMIT 1000
+    """
+    async with acquire() as conn:
+        rows = await registry.fetch(conn, sql, *params)
         return [dict(r) for r in rows]
-    finally:
-        await conn.close()
+
+
+async def iter_current_stock(
+    team_id: int,
+    filters: Optional[Dict[str, Any]] = None,
+    batch_size: int = SEARCH_PAGE_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Như iter_entries nhưng cho tồn kho – cùng bộ lọc search_current_stock, không LIMIT."""
+    where, params = _build_stock_where(team_id, filters or {})
+    sql = f"""
+        SELECT {STOCK_COLUMNS}
+        FROM stock_balance
+        WHERE {where}
+        ORDER BY component_id
+    """
+    async with acquire() as conn:
+        async with conn.transaction():
+            cursor = await conn.cursor(sql, *params)
+            while True:
+                rows = await cursor.fetch(batch_size)
+                if not rows:
+                    break
+                yield [dict(r) for r in rows]
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
@@ -0,0 +1,234 @@
+# warehouse_app/modules/stock_refresh.py
+"""
+GOM YÊU CẦU REFRESH MATERIALIZED VIEW current_stock
+- Nhiều lần ghi liên tiếp → 1 lần REFRESH (debounce + trễ tối đa)
+- Nhiều client → chỉ 1 client refresh nhờ advisory lock, các client khác
+  nhận NOTIFY 'current_stock_refreshed' (kèm snapshot txid lấy ngay trước
+  REFRESH) và chỉ bỏ yêu cầu có txid ghi đã nằm trong snapshot đó
+- Cho UI biết "tồn kho (view) chưa đồng bộ từ lúc T" + thống kê thời gian refresh
+Chạy hoàn toàn trên loop nền (db/sync_wrapper.py).
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+from db.pool import acquire, connect_dedicated
+from config.settings import STOCK_REFRESH_DEBOUNCE, STOCK_REFRESH_MAX_DELAY
+
+REFRESH_CHANNEL = "current_stock_refreshed"
+REFRESH_LOCK_KEY = 74_201  # khóa advisory dùng chung cho mọi client
+
+
+class RefreshStats:
+    def __init__(self):
+        self.requests = 0           # số lần được yêu cầu refresh
+        self.coalesced = 0          # yêu cầu gộp vào lần refresh đang chờ
+        self.refreshes = 0          # số lần REFRESH thật sự
+        self.covered_by_peer = 0    # client khác đã refresh giúp
+        self.lock_busy = 0
+        self.failures = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration = 0.0
+
+    def record(self, duration: float):
+        self.refreshes += 1
+        self.total_duration += duration
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+
+    def snapshot(self) -> Dict[str, Any]:
+        avg = self.total_duration / self.refreshes if self.refreshes else 0.0
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "covered_by_peer": self.covered_by_peer,
+            "lock_busy": self.lock_busy,
+            "failures": self.failures,
+            "avg_duration_ms": round(avg * 1000, 1),
+            "max_duration_ms": round(self.max_duration * 1000, 1),
+            "last_duration_ms": round(self.last_duration * 1000, 1),
+        }
+
+
+class StockRefreshScheduler:
+    def __init__(self, debounce: float = STOCK_REFRESH_DEBOUNCE,
+                 max_delay: float = STOCK_REFRESH_MAX_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.stats = RefreshStats()
+
+        self.stale_since: Optional[datetime] = None
+        self.last_refreshed_at: Optional[datetime] = None
+
+        self._requested_gen = 0     # tăng mỗi lần yêu cầu
+        self._refreshed_gen = 0     # yêu cầu cuối cùng đã được phủ
+        self._dirty_at: Optional[float] = None       # monotonic
+        self._last_request: float = 0.0
+        # Yêu cầu chưa được phủ: (gen, txid của transaction ghi hoặc None)
+        self._pending: List[Tuple[int, Optional[int]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._listener = None
+
+    # -------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------
+    def request_refresh(self, txid: Optional[int] = None):
+        """
+        Gọi (trên loop nền) sau khi COMMIT 1 lần ghi vào inventory_entries.
+        txid: của transaction ghi (notify_team_changed trả về); None → chỉ
+        lần refresh của chính client này mới phủ được yêu cầu.
+        """
+        now = time.monotonic()
+        self.stats.requests += 1
+        self._requested_gen += 1
+        self._pending.append((self._requested_gen, txid))
+        self._last_request = now
+        if self._dirty_at is None:
+            self._dirty_at = now
+            self.stale_since = datetime.now()
+        else:
+            self.stats.coalesced += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def is_stale(self) -> bool:
+        return self._requested_gen > self._refreshed_gen
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "stale_since": self.stale_since,
+            "last_refreshed_at": self.last_refreshed_at,
+            **self.stats.snapshot(),
+        }
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._listener is not None:
+            try:
+                await self._listener.close()
+            except Exception:
+                pass
+            self._listener = None
+
+    # -------------------------------------------------------------
+    # Nội bộ
+    # -------------------------------------------------------------
+    async def _run(self):
+        await self._ensure_listener()
+        while self.is_stale():
+            now = time.monotonic()
+            deadline = min(self._last_request + self.debounce,
+                           self._dirty_at + self.max_delay)
+            if now < deadline:
+                await asyncio.sleep(deadline - now)
+                continue
+            if not await self._refresh_once():
+                await asyncio.sleep(self.debounce)  # lỗi / bận → thử lại sau
+
+    async def _refresh_once(self) -> bool:
+        gen = self._requested_gen
+        started = time.monotonic()
+        started_wall = datetime.now()
+        try:
+            async with acquire() as conn:
+                locked = await conn.fetchval(
+                    "SELECT pg_try_advisory_lock($1)", REFRESH_LOCK_KEY)
+                if not locked:
+                    # Client khác đang refresh → chờ NOTIFY hoặc thử lại sau
+                    self.stats.lock_busy += 1
+                    return False
+                try:
+                    # Snapshot lấy TRƯỚC REFRESH (REFRESH thấy ít nhất chừng
+                    # này) → client khác so với txid ghi của mình
+                    snapshot = await conn.fetchval(
+                        "SELECT txid_current_snapshot()::text")
+                    await conn.execute(
+                        "REFRESH MATERIALIZED VIEW CONCURRENTLY current_stock")
+                    duration = time.monotonic() - started
+                    await conn.execute(
+                        "SELECT pg_notify($1, $2)", REFRESH_CHANNEL,
+                        json.dumps({"duration": duration, "snapshot": snapshot}))
+                finally:
+                    await conn.execute(
+                        "SELECT pg_advisory_unlock($1)", REFRESH_LOCK_KEY)
+        except Exception as e:
+            print(f"[STOCK REFRESH] Lỗi: {e}")
+            self.stats.failures += 1
+            return False
+
+        self.stats.record(duration)
+        self.last_refreshed_at = datetime.now()
+        self._mark_covered(gen, started, started_wall)
+        return True
+
+    def _mark_covered(self, gen: int, started: float, started_wall: datetime):
+        """Các yêu cầu <= gen đã được phủ bởi lần refresh bắt đầu lúc started."""
+        self._refreshed_gen = max(self._refreshed_gen, gen)
+        self._pending = [p for p in self._pending if p[0] > gen]
+        if self.is_stale():
+            # Có lần ghi trong lúc refresh → vẫn cũ kể từ lúc bắt đầu refresh
+            self._dirty_at = started
+            self.stale_since = started_wall
+        else:
+            self._dirty_at = None
+            self.stale_since = None
+
+    async def _ensure_listener(self):
+        if self._listener is not None:
+            return
+        try:
+            self._listener = await connect_dedicated()
+            await self._listener.add_listener(REFRESH_CHANNEL, self._on_peer_refresh)
+        except Exception as e:
+            print(f"[STOCK REFRESH] Không LISTEN được: {e}")
+            self._listener = None
+
+    def _on_peer_refresh(self, conn, pid, channel, payload):
+        """Client khác (hoặc chính mình) vừa refresh xong."""
+        try:
+            snapshot = json.loads(payload).get("snapshot")
+        except Exception:
+            snapshot = None
+        self.last_refreshed_at = datetime.now()
+        if not self.is_stale() or not snapshot:
+            return
+        # Bỏ các yêu cầu mà lần ghi đã COMMIT trước snapshot của lần refresh đó;
+        # yêu cầu không có txid giữ lại cho lần refresh gộp của mình
+        self._pending = [p for p in self._pending
+                         if p[1] is None or not _visible_in_snapshot(p[1], snapshot)]
+        if not self._pending:
+            self.stats.covered_by_peer += 1
+            self._refreshed_gen = self._requested_gen
+            self._dirty_at = None
+            self.stale_since = None
+
+
+def _visible_in_snapshot(txid: int, snapshot: str) -> bool:
+    """txid đã COMMIT có nằm trong snapshot 'xmin:xmax:xip,...' không."""
+    try:
+        xmin, xmax, xip = snapshot.split(":")
+        if txid < int(xmin):
+            return True
+        if txid >= int(xmax):
+            return False
+        return str(txid) not in xip.split(",")
+    except ValueError:
+        return False
+
+
+scheduler = StockRefreshScheduler()
+
+
+def request_refresh(txid: Optional[int] = None):
+    """Tiện ích cho modules/inventory.py (gọi trong loop nền)."""
+    scheduler.request_refresh(txid)
+
+
+def get_refresh_status() -> Dict[str, Any]:
+    return scheduler.status()
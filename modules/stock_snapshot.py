@@ -0,0 +1,120 @@
+# warehouse_app/modules/stock_snapshot.py
+"""
+TỒN KHO TẠI 1 THỜI ĐIỂM (ảnh chụp cuối ngày – db/migrations/0008_stock_snapshot.sql)
+- take_stock_snapshots(): chụp các mốc 0h còn thiếu (mỗi mốc 1 transaction
+  ngắn, dựng tăng dần từ ảnh hôm trước), xóa ảnh ngày hết hạn
+- SnapshotScheduler: chạy lúc khởi động rồi kiểm tra lại định kỳ trên loop nền;
+  nhiều client → 1 client chụp nhờ advisory lock
+- get_stock_as_of(team_id, ts): ảnh gần nhất + các giao dịch giữa ảnh và ts
+  → báo cáo cuối tháng / đối soát không quét lại toàn bộ lịch sử
+"""
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+from db.pool import acquire
+from db.metrics import instrument_module
+from db.statements import registry
+from modules.query_cache import cached_query
+from config.settings import (
+    STOCK_SNAPSHOT_DAYS_BACK, STOCK_SNAPSHOT_KEEP_DAYS, STOCK_SNAPSHOT_CHECK_INTERVAL,
+)
+
+SNAPSHOT_LOCK_KEY = 74_204  # pg_advisory_lock – 1 client chụp ảnh tồn
+
+# Thuộc tính (tên, đơn vị...) lấy theo giao dịch mới nhất trong stock_balance
+STOCK_AS_OF_SQL = registry.register("stock_as_of", """
+    SELECT a.component_id, sb.component_name, sb.unit, sb.status,
+           a.quantity AS quantity_as_of, a.base_as_of
+    FROM stock_as_of($1, $2) a
+    LEFT JOIN stock_balance sb
+           ON sb.team_id = $1 AND sb.component_id = a.component_id
+    WHERE a.quantity > 0
+    ORDER BY a.component_id
+""")
+
+
+def _cutoff(ts: Union[date, datetime]) -> datetime:
+    """
+    Mốc "gồm mọi giao dịch created_at < cutoff":
+    ngày (date) → hết ngày đó theo giờ máy; thời điểm → tính cả giao dịch đúng lúc ts.
+    """
+    if not isinstance(ts, datetime):
+        return datetime.combine(ts + timedelta(days=1), time.min).astimezone()
+    if ts.tzinfo is None:
+        ts = ts.astimezone()
+    return ts + timedelta(microseconds=1)
+
+
+# ----------------------------------------------------------------------
+# 1. Đọc
+# ----------------------------------------------------------------------
+@cached_query
+async def get_stock_as_of(team_id: int, ts: Union[date, datetime]) -> List[Dict[str, Any]]:
+    """Tồn dương từng mã tại ts (date = tồn cuối ngày)."""
+    async with acquire() as conn:
+        rows = await registry.fetch(conn, STOCK_AS_OF_SQL, team_id, _cutoff(ts))
+        return [dict(r) for r in rows]
+
+
+# ----------------------------------------------------------------------
+# 2. Chụp + dọn
+# ----------------------------------------------------------------------
+async def take_stock_snapshots(days_back: int = STOCK_SNAPSHOT_DAYS_BACK,
+                               keep_days: int = STOCK_SNAPSHOT_KEEP_DAYS) -> Dict[str, Any]:
+    try:
+        async with acquire() as conn:
+            if await conn.fetchval("SELECT to_regproc('stock_snapshot_take')") is None:
+                return {"taken": 0, "pruned": 0}  # chưa chạy migration 0008
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", SNAPSHOT_LOCK_KEY):
+                return {"taken": 0, "pruned": 0}
+            try:
+                missing = await conn.fetch(
+                    "SELECT team_id, as_of FROM stock_snapshot_missing($1)", days_back)
+                # Mỗi mốc 1 transaction: khóa ghi của stock_snapshot_take ngắn nhất có thể
+                for r in missing:
+                    async with conn.transaction():
+                        await conn.execute(
+                            "SELECT stock_snapshot_take($1, $2)", r["team_id"], r["as_of"])
+                pruned = 0
+                if keep_days:
+                    pruned = await conn.fetchval("SELECT stock_snapshot_prune($1)", keep_days)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", SNAPSHOT_LOCK_KEY)
+        return {"taken": len(missing), "pruned": pruned}
+    except Exception as e:
+        print(f"[SNAPSHOT] Lỗi chụp tồn kho: {e}")
+        return {"taken": 0, "pruned": 0, "error": str(e)}
+
+
+class SnapshotScheduler:
+    def __init__(self, interval: float = STOCK_SNAPSHOT_CHECK_INTERVAL):
+        self.interval = interval
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Gọi trên loop nền (submit)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self.last_result = await take_stock_snapshots()
+            await asyncio.sleep(self.interval)
+
+
+snapshots = SnapshotScheduler()
+
+
+async def start_stock_snapshots():
+    snapshots.start()
+
+
+# Đo thời gian mọi hàm async công khai ở trên (db/metrics.py)
+instrument_module(__name__)
@@ -0,0 +1,263 @@
+# warehouse_app/modules/thumbnail_cache.py
+"""
+CACHE ẢNH THU NHỎ DÙNG CHUNG (input / output / inventory / modules/image.py)
+Ảnh linh kiện nằm trên share mạng (UNC) → mỗi lần chọn dòng đọc lại cả JPEG
+gốc rất chậm. Cache 2 tầng:
+  1. RAM: LRU QImage, giới hạn theo BYTE (THUMB_MEMORY_BYTES)
+  2. Đĩa local: file JPEG đã thu nhỏ, khóa theo (đường dẫn, mtime, size, kích thước)
+Ảnh gốc chỉ đọc khi cả 2 tầng trượt, giải mã thẳng ở kích thước nhỏ
+(QImageReader.setScaledSize). Kết quả stat() cũng được nhớ THUMB_STAT_TTL giây.
+Tải trong QThreadPool riêng, trả QImage (an toàn ngoài GUI thread) qua signal.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from PySide6.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, Signal
+from PySide6.QtGui import QImage, QImageReader
+
+from config.settings import (
+    THUMB_MEMORY_BYTES, THUMB_DISK_DIR, THUMB_DISK_MAX_BYTES,
+    THUMB_STAT_TTL, THUMB_LOADER_THREADS,
+)
+
+PRUNE_EVERY_WRITES = 200
+
+
+class ThumbnailStats:
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.source_reads = 0
+        self.missing = 0
+        self.evictions = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class _Signals(QObject):
+    # (đường dẫn gốc, kích thước yêu cầu, ảnh – null nếu không đọc được)
+    ready = Signal(str, QSize, QImage)
+
+
+class _LoadTask(QRunnable):
+    def __init__(self, cache: "ThumbnailCache", path: str, size: QSize, notify: bool):
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.size = size
+        self.notify = notify
+
+    def run(self):
+        try:
+            img = self.cache.load(self.path, self.size)
+        except Exception as e:
+            print(f"[THUMB] Lỗi tải {self.path}: {e}")
+            img = QImage()
+        finally:
+            self.cache._done(self.path, self.size, self.notify)
+        if self.notify:
+            self.cache.signals.ready.emit(self.path, self.size, img)
+
+
+class ThumbnailCache:
+    def __init__(self, memory_bytes: int = THUMB_MEMORY_BYTES,
+                 disk_dir: str = THUMB_DISK_DIR,
+                 disk_max_bytes: int = THUMB_DISK_MAX_BYTES):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.stats = ThumbnailStats()
+        self.signals = _Signals()
+
+        self._lock = threading.Lock()
+        # (path, w, h) → (chữ ký file, QImage)
+        self._memory: "OrderedDict[Tuple[str, int, int], Tuple[tuple, QImage]]" = OrderedDict()
+        self._memory_used = 0
+        self._stat_cache: Dict[str, Tuple[float, Optional[tuple]]] = {}
+        self._inflight = set()
+        self._writes = 0
+
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(THUMB_LOADER_THREADS)
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        except OSError as e:
+            print(f"[THUMB] Không tạo được thư mục cache: {e}")
+
+    # -------------------------------------------------------------
+    # API cho UI
+    # -------------------------------------------------------------
+    def peek(self, path: str, size: QSize) -> Optional[QImage]:
+        """Chỉ xem RAM (không I/O) – dùng để hiển thị ngay nếu có."""
+        with self._lock:
+            cached = self._stat_cache.get(path)
+            if cached is None or cached[0] < time.monotonic():
+                return None
+            item = self._memory.get((path, size.width(), size.height()))
+            if item is None or item[0] != cached[1]:
+                return None
+            self._memory.move_to_end((path, size.width(), size.height()))
+            self.stats.memory_hits += 1
+            return item[1]
+
+    def request(self, path: str, size: QSize):
+        """Tải nền, xong emit signals.ready(path, size, image)."""
+        self._submit(path, size, notify=True, priority=1)
+
+    def prefetch(self, paths: Iterable[str], size: QSize):
+        """Nạp trước ảnh các dòng lân cận (không emit)."""
+        for path in paths:
+            if path and self.peek(path, size) is None:
+                self._submit(path, size, notify=False, priority=0)
+
+    def invalidate(self, path: str):
+        """Gọi khi ảnh gốc vừa bị ghi đè (lưu ảnh mới cho linh kiện)."""
+        with self._lock:
+            self._stat_cache.pop(path, None)
+
+    # -------------------------------------------------------------
+    # Tải (chạy trong thread pool)
+    # -------------------------------------------------------------
+    def load(self, path: str, size: QSize) -> QImage:
+        sig = self._signature(path)
+        if sig is None:
+            self.stats.missing += 1
+            return QImage()
+
+        key = (path, size.width(), size.height())
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and item[0] == sig:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return item[1]
+
+        disk_path = self._disk_path(path, sig, size)
+        img = QImage(disk_path) if os.path.exists(disk_path) else QImage()
+        if not img.isNull():
+            self.stats.disk_hits += 1
+        else:
+            img = self._read_scaled(path, size)
+            if img.isNull():
+                return img
+            self.stats.source_reads += 1
+            self._save_disk(img, disk_path)
+
+        self._remember(key, sig, img)
+        return img
+
+    def _read_scaled(self, path: str, size: QSize) -> QImage:
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        original = reader.size()
+        if original.isValid() and (original.width() > size.width()
+                                   or original.height() > size.height()):
+            # JPEG được giải mã thẳng ở kích thước nhỏ → nhanh + ít RAM
+            reader.setScaledSize(original.scaled(size, Qt.KeepAspectRatio))
+        return reader.read()
+
+    def _signature(self, path: str) -> Optional[tuple]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._stat_cache.get(path)
+            if cached is not None and cached[0] >= now:
+                return cached[1]
+        try:
+            st = os.stat(path)
+            sig = (st.st_mtime_ns, st.st_size) if st.st_size > 0 else None
+        except OSError:
+            sig = None
+        with self._lock:
+            self._stat_cache[path] = (now + THUMB_STAT_TTL, sig)
+        return sig
+
+    def _remember(self, key, sig, img: QImage):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= old[1].sizeInBytes()
+            self._memory[key] = (sig, img)
+            self._memory_used += img.sizeInBytes()
+            while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_used -= evicted.sizeInBytes()
+                self.stats.evictions += 1
+
+    # -------------------------------------------------------------
+    # Cache đĩa
+    # -------------------------------------------------------------
+    def _disk_path(self, path: str, sig: tuple, size: QSize) -> str:
+        raw = f"{os.path.normcase(path)}|{sig[0]}|{sig[1]}|{size.width()}x{size.height()}"
+        name = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, name[:2], name + ".jpg")
+
+    def _save_disk(self, img: QImage, disk_path: str):
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp = f"{disk_path}.{threading.get_ident()}.tmp"
+            if img.save(tmp, "JPG", 90):
+                os.replace(tmp, disk_path)
+        except OSError as e:
+            print(f"[THUMB] Không ghi được cache đĩa: {e}")
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY_WRITES == 1
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Xóa file cũ nhất khi thư mục cache vượt THUMB_DISK_MAX_BYTES."""
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.disk_dir):
+            for n in names:
+                p = os.path.join(root, n)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+        if total <= self.disk_max_bytes:
+            return
+        for _, fsize, p in sorted(files):
+            try:
+                os.remove(p)
+                total -= fsize
+            except OSError:
+                pass
+            if total <= self.disk_max_bytes * 0.8:
+                break
+
+    # -------------------------------------------------------------
+    # Hàng đợi tải
+    # -------------------------------------------------------------
+    def _submit(self, path: str, size: QSize, notify: bool, priority: int):
+        key = (path, size.width(), size.height(), notify)
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+        self._pool.start(_LoadTask(self, path, size, notify), priority)
+
+    def _done(self, path: str, size: QSize, notify: bool):
+        # Chỉ bỏ key của task vừa xong – task kia (prefetch/hiển thị) có thể vẫn chạy
+        with self._lock:
+            self._inflight.discard((path, size.width(), size.height(), notify))
+
+
+_cache: Optional[ThumbnailCache] = None
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Tạo lần đầu khi đã có QApplication (signal/QThreadPool cần Qt)."""
+    global _cache
+    if _cache is None:
+        _cache = ThumbnailCache()
+    return _cache
@@ -0,0 +1,162 @@
+# warehouse_app/modules/ui/admin_tab.py
+"""
+TAB "HIỆU NĂNG DB" (CHỈ ADMIN)
+- Bảng op: số lần gọi, lỗi, độ trễ TB / p50 / p95 / max, số dòng,
+  số câu SQL, thời gian chờ pool (db/metrics.py)
+- Nhật ký câu SQL chậm + plan EXPLAIN (nếu bật METRICS_EXPLAIN_SLOW)
+- Xuất toàn bộ số liệu ra JSON
+"""
+from datetime import datetime
+
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QCheckBox, QLabel,
+    QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView,
+    QPlainTextEdit, QSplitter, QFileDialog, QMessageBox
+)
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QColor
+
+from db.metrics import metrics
+from db.statements import get_statement_stats
+from modules.query_cache import get_cache_stats
+
+OP_COLUMNS = [
+    ("op", "Op"), ("calls", "Lần gọi"), ("errors", "Lỗi"), ("avg_ms", "TB ms"),
+    ("p50_ms", "p50 ms"), ("p95_ms", "p95 ms"), ("max_ms", "Max ms"),
+    ("rows", "Số dòng"), ("statements", "Câu SQL"), ("sql_ms", "SQL ms"),
+    ("pool_waits", "Lấy kết nối"), ("pool_wait_ms", "Chờ pool ms"),
+]
+SLOW_COLUMNS = [("at", "Lúc"), ("op", "Op"), ("elapsed_ms", "ms"), ("sql", "SQL")]
+REFRESH_MS = 2000
+
+
+def _item(value) -> QTableWidgetItem:
+    item = QTableWidgetItem()
+    # Số để sắp xếp đúng, chuỗi giữ nguyên
+    item.setData(Qt.DisplayRole, value if isinstance(value, (int, float)) else str(value or ""))
+    return item
+
+
+class AdminTab(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        top = QHBoxLayout()
+        self.summary_label = QLabel("")
+        self.auto_check = QCheckBox("Tự làm mới")
+        self.auto_check.setChecked(True)
+        self.refresh_button = QPushButton("🔄 Làm mới")
+        self.reset_button = QPushButton("Xóa số liệu")
+        self.export_button = QPushButton("📤 Xuất JSON")
+        top.addWidget(self.summary_label, 1)
+        top.addWidget(self.auto_check)
+        top.addWidget(self.refresh_button)
+        top.addWidget(self.reset_button)
+        top.addWidget(self.export_button)
+        layout.addLayout(top)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.op_table = self._make_table([c[1] for c in OP_COLUMNS])
+        self.op_table.setSortingEnabled(True)
+        self.op_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        splitter.addWidget(self.op_table)
+
+        self.slow_table = self._make_table([c[1] for c in SLOW_COLUMNS])
+        self.slow_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        splitter.addWidget(self.slow_table)
+
+        self.plan_view = QPlainTextEdit()
+        self.plan_view.setReadOnly(True)
+        self.plan_view.setPlaceholderText("Chọn 1 câu chậm để xem SQL + plan")
+        splitter.addWidget(self.plan_view)
+        splitter.setSizes([400, 200, 150])
+        layout.addWidget(splitter, 1)
+
+        self._slow_rows = []
+        self.refresh_button.clicked.connect(self.refresh)
+        self.reset_button.clicked.connect(self.reset)
+        self.export_button.clicked.connect(self.export_json)
+        self.slow_table.itemSelectionChanged.connect(self.show_plan)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._auto_refresh)
+        self.timer.start(REFRESH_MS)
+        self.refresh()
+
+    @staticmethod
+    def _make_table(headers) -> QTableWidget:
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setSelectionMode(QAbstractItemView.SingleSelection)
+        table.verticalHeader().setVisible(False)
+        return table
+
+    def _auto_refresh(self):
+        if self.auto_check.isChecked() and self.isVisible():
+            self.refresh()
+
+    def refresh(self):
+        snap = metrics.snapshot()
+        pool = snap["pool"]
+        cache = get_cache_stats()
+        stmts = get_statement_stats()
+        self.summary_label.setText(
+            f"Từ {snap['started_at']} | pool: {pool['acquires']} lần lấy, "
+            f"chờ TB {pool['avg_wait_ms']} ms (max {pool['max_wait_ms']}) | "
+            f"cache trúng {cache['hit_ratio']:.0%} | "
+            f"prepared dùng lại {stmts['reuse_ratio']:.0%} | chậm ≥ {snap['slow_ms']:.0f} ms")
+
+        self.op_table.setSortingEnabled(False)
+        self.op_table.setRowCount(len(snap["ops"]))
+        for r, op in enumerate(snap["ops"]):
+            for c, (key, _) in enumerate(OP_COLUMNS):
+                item = _item(op[key])
+                if key == "errors" and op[key]:
+                    item.setForeground(QColor("#dc2626"))
+                    item.setToolTip(op["last_error"])
+                if key == "p95_ms" and op[key] >= snap["slow_ms"]:
+                    item.setForeground(QColor("#d97706"))
+                self.op_table.setItem(r, c, item)
+        self.op_table.setSortingEnabled(True)
+
+        # Giữ nguyên dòng đang chọn nếu nhật ký chậm không đổi
+        if len(snap["slow"]) != len(self._slow_rows) or (
+                snap["slow"] and snap["slow"][0] != self._slow_rows[0]):
+            self._slow_rows = snap["slow"]
+            self.slow_table.setRowCount(len(self._slow_rows))
+            for r, entry in enumerate(self._slow_rows):
+                for c, (key, _) in enumerate(SLOW_COLUMNS):
+                    self.slow_table.setItem(r, c, _item(entry[key]))
+
+    def show_plan(self):
+        rows = self.slow_table.selectionModel().selectedRows()
+        if not rows or rows[0].row() >= len(self._slow_rows):
+            self.plan_view.clear()
+            return
+        entry = self._slow_rows[rows[0].row()]
+        text = entry["sql"]
+        if entry.get("error"):
+            text += f"\n\nLỗi: {entry['error']}"
+        text += "\n\n" + (entry.get("plan") or "(chưa có plan – bật METRICS_EXPLAIN_SLOW)")
+        self.plan_view.setPlainText(text)
+
+    def reset(self):
+        metrics.reset()
+        self._slow_rows = []
+        self.plan_view.clear()
+        self.refresh()
+
+    def export_json(self):
+        default = f"db_metrics_{datetime.now():%Y%m%d_%H%M%S}.json"
+        path, _ = QFileDialog.getSaveFileName(self, "Xuất số liệu", default, "JSON (*.json)")
+        if not path:
+            return
+        try:
+            metrics.dump_json(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Lỗi", f"Không ghi được file:\n{e}")
+            return
+        QMessageBox.information(self, "Xong", f"Đã lưu: {path}")
@@ -0,0 +1,81 @@
+# warehouse_app/modules/ui/export_dialog.py
+"""
+HỘP THOẠI XUẤT FILE (modules/export.py)
+Chọn file → xuất trên loop nền, báo số dòng đã ghi, nút Hủy dừng giữa chừng.
+Dùng chung cho tab nhập / xuất / tồn kho.
+"""
+import os
+from datetime import datetime
+
+from PySide6.QtWidgets import QFileDialog, QMessageBox, QProgressDialog
+from PySide6.QtCore import Qt, Signal, Slot
+
+from modules.async_worker import AsyncWorker
+from modules.export import export_to_file
+
+FILE_FILTERS = "Excel (*.xlsx);;CSV (*.csv);;Parquet (*.parquet)"
+FILTER_EXT = {"Excel (*.xlsx)": ".xlsx", "CSV (*.csv)": ".csv", "Parquet (*.parquet)": ".parquet"}
+
+
+class ExportDialog(QProgressDialog):
+    # progress() được gọi trên loop nền → signal tự queue về GUI thread
+    progressed = Signal(int)
+
+    def __init__(self, kind, team_id, filters, path, parent=None):
+        super().__init__("Đang xuất...", "Hủy", 0, 0, parent)  # 0..0 = chạy vô định
+        self.setWindowTitle("Xuất dữ liệu")
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.path = path
+
+        self.progressed.connect(self._on_progress)
+        self.canceled.connect(self._cancel)
+
+        self.worker = AsyncWorker(export_to_file, kind, team_id, dict(filters or {}),
+                                  path, progress=self.progressed.emit)
+        self.worker.finished.connect(self._on_finished)
+        self.worker.error.connect(self._on_error)
+
+    def start(self):
+        self.show()
+        self.worker.start()
+        return self
+
+    @Slot(int)
+    def _on_progress(self, written):
+        self.setLabelText(f"Đã ghi {written:,} dòng...\n{os.path.basename(self.path)}")
+
+    def _cancel(self):
+        # Nút Hủy (close() cũng phát canceled → chỉ hủy khi còn chạy).
+        # Hủy task → export_to_file đóng cursor, xóa file dở
+        if self.worker.isRunning():
+            self.worker.cancel()
+            self.deleteLater()
+
+    def _on_finished(self, result):
+        self.close()
+        self.deleteLater()
+        QMessageBox.information(
+            self.parentWidget(), "Xuất dữ liệu",
+            f"Đã lưu {result['rows']:,} dòng ({result['seconds']} giây):\n{result['path']}")
+
+    def _on_error(self, msg):
+        self.close()
+        self.deleteLater()
+        QMessageBox.critical(self.parentWidget(), "Lỗi xuất dữ liệu", msg)
+
+
+def start_export(parent, kind, team_id, filters, name, folder=""):
+    """
+    Hỏi đường dẫn rồi chạy ExportDialog. kind: "entries" | "stock".
+    Trả về dialog (nơi gọi giữ tham chiếu) hoặc None nếu người dùng bỏ qua.
+    """
+    default = os.path.join(folder or "", f"{name}_{datetime.now():%Y%m%d_%H%M}.xlsx")
+    path, selected = QFileDialog.getSaveFileName(parent, "Xuất dữ liệu", default, FILE_FILTERS)
+    if not path:
+        return None
+    if not os.path.splitext(path)[1]:
+        path += FILTER_EXT.get(selected, ".xlsx")
+    return ExportDialog(kind, team_id, filters, path, parent).start()
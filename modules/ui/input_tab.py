@@ -2,74 +2,32 @@
 import os
 import shutil
 from typing import List, Optional, Dict, Any
-import asyncio
 from PySide6.QtWidgets import (
     QFileDialog, QMessageBox, QVBoxLayout, QCompleter,
-    QTableView, QLabel
+    QLabel, QPushButton
 )
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QPixmap
-from PySide6.QtCore import QStringListModel, Qt, QThread, Signal, QEvent, QObject
+from PySide6.QtGui import QPixmap
+from PySide6.QtCore import QStringListModel, Qt, QEvent, QObject
 
 from modules.inventory import (
-    add_entry, delete_entry, refresh_current_stock,
-    update_entry, generate_next_cid
+    add_entry, delete_entry, update_entry, generate_next_cid, release_cid,
+    cid_prefix
 )
-from modules.search import search_entries
+from modules.bulk_import import import_file
+from modules.name_index import get_name_index
+from modules.search import search_entries_page, get_name_suggestions
+from modules.autocomplete_worker import AutocompleteService
+from modules.async_worker import AsyncWorker
 from modules.ui.multiselect_dropdown import MultiSelectDropdown
+from modules.ui.export_dialog import start_export
+from modules.ui.table_model import attach_record_model, source_row, neighbour_rows
+from modules.thumbnail_cache import get_thumbnail_cache
 from config.global_vars import get_folders
 from config.settings import DEFAULT_IMAGE_PATH
 
-import logging
-logging.disable(logging.CRITICAL)
-
-
-# =====================================================
-# 1. Async Worker (chạy async trong QThread)
-# =====================================================
-class AsyncWorker(QThread):
-    finished = Signal(object)
-    error = Signal(str)
-
-    def __init__(self, coro, *args, **kwargs):
-        super().__init__()
-        self.coro = coro
-        self.args = args
-        self.kwargs = kwargs
-
-    def run(self):
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(
-                self.coro(*self.args, **self.kwargs))
-            self.finished.emit(result)
-        except Exception as e:
-            self.error.emit(str(e))
-        finally:
-            loop.close()
-
-
-# =====================================================
-# 2. Image Loader (không block UI)
-# =====================================================
-class ImageLoader(QThread):
-    finished = Signal(QPixmap)
-
-    def __init__(self, path: str, size):
-        super().__init__()
-        self.path = path
-        self.size = size
-
-    def run(self):
-        pixmap = QPixmap(self.path)
-        if not pixmap.isNull():
-            pixmap = pixmap.scaled(
-                self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.finished.emit(pixmap)
-
 
 # =====================================================
-# 3. Hover Preview Label
+# 1. Hover Preview Label (ảnh qua modules/thumbnail_cache.py)
 # =====================================================
 class HoverPreviewLabel(QLabel):
     def __init__(self, parent=None):
@@ -84,27 +42,37 @@ class HoverPreviewLabel(QLabel):
         """)
         self.setAlignment(Qt.AlignCenter)
         self.setScaledContents(True)
-        self.current_loader = None
-
-    def set_image(self, path: str):
-        if self.current_loader:
-            self.current_loader.finished.disconnect()
-            self.current_loader.terminate()
-            self.current_loader.wait()
+        self.current_path = None
+        get_thumbnail_cache().signals.ready.connect(self._on_thumbnail_ready)
 
-        if not path or not os.path.exists(path):
-            path = DEFAULT_IMAGE_PATH
+    def thumbnail_size(self):
+        return self.size()
 
-        self.current_loader = ImageLoader(path, self.size())
-        self.current_loader.finished.connect(self.setPixmap)
-        self.current_loader.start()
+    def set_image(self, path: str):
+        # Không os.path.exists() ở đây (chạm share mạng) – cache tự kiểm tra
+        self.current_path = path or DEFAULT_IMAGE_PATH
+        cache = get_thumbnail_cache()
+        img = cache.peek(self.current_path, self.thumbnail_size())
+        if img is not None:
+            self.setPixmap(QPixmap.fromImage(img))
+            return
+        cache.request(self.current_path, self.thumbnail_size())
+
+    def _on_thumbnail_ready(self, path, size, img):
+        if path != self.current_path or size != self.thumbnail_size():
+            return  # đã chọn dòng khác
+        if img.isNull():
+            if path != DEFAULT_IMAGE_PATH:
+                self.set_image(DEFAULT_IMAGE_PATH)
+            return
+        self.setPixmap(QPixmap.fromImage(img))
 
     def hide_zoom(self):
         pass  # placeholder
 
 
 # =====================================================
-# 4. InputTabController
+# 2. InputTabController
 # =====================================================
 class InputTabController(QObject):
     def __init__(self, ui, team_id, user_id, username, db_handler, options: dict):
@@ -118,30 +86,35 @@ class InputTabController(QObject):
 
         self.is_new = False
         self.is_editing = False
+        # Phân trang keyset: filters đang xem + con trỏ trang kế tiếp
+        self.current_filters = {"movement_type": "in"}
+        self.next_cursor = None
+        self.page_seq = 0  # tăng mỗi lần tìm mới → bỏ trang của lần tìm cũ về muộn
         self.editing_entry_id = None
+        self.allocated_cid = None  # mã tự sinh chưa lưu (trả lại nếu hủy)
         self.image_folder, self.invoice_folder = get_folders()
         self.selected_image_path_input = None
 
-        # Cache gợi ý tên linh kiện
-        self.name_suggestions_cache = []
+        # Gợi ý tên linh kiện: chỉ mục theo team (modules/name_index.py),
+        # tra qua dịch vụ debounce/hủy (modules/autocomplete_worker.py)
+        self.name_autocomplete = AutocompleteService(
+            get_name_suggestions, self.team_id, limit=20, parent=self)
+        self.name_autocomplete.suggestions_ready.connect(
+            self.on_name_suggestions_ready)
         self.name_completer = QCompleter()
         self.name_model = QStringListModel()
         self.name_completer.setModel(self.name_model)
-        self.name_completer.setCaseSensitivity(Qt.CaseInsensitive)
-        self.name_completer.setFilterMode(Qt.MatchContains)
+        # Chỉ mục đã lọc (bỏ dấu) → completer hiện nguyên danh sách
+        self.name_completer.setCompletionMode(
+            QCompleter.UnfilteredPopupCompletion)
         self.ui.input_component_name_lineedit.setCompleter(self.name_completer)
         self.ui.input_component_name_lineedit.textChanged.connect(
-            self.on_name_text_changed)
+            self.name_autocomplete.request)
 
         # === TABLE MODEL (PHẢI CÓ TRƯỚC) ===
-        self.col_indices = {}
-        self.table_model = QStandardItemModel()
-        self.ui.input_data_tableView.setModel(self.table_model)
-        self.ui.input_data_tableView.setEditTriggers(QTableView.NoEditTriggers)
-        self.ui.input_data_tableView.setSelectionBehavior(
-            QTableView.SelectRows)
-        self.ui.input_data_tableView.setSelectionMode(
-            QTableView.SingleSelection)
+        self.table_model, self.table_proxy = attach_record_model(
+            self.ui.input_data_tableView, self)
+        self.table_model.set_fetcher(self.load_next_page)
         self.ui.input_data_tableView.verticalHeader().setVisible(False)
 
         # === HOVER PREVIEW ===
@@ -226,6 +199,7 @@ class InputTabController(QObject):
         self.ui.input_delete_button.clicked.connect(self.delete_selected_item)
         self.ui.input_search_button.clicked.connect(self.search_items)
         self.ui.input_export_button.clicked.connect(self.export_to_excel)
+        self.setup_import_button()
 
         sm = self.ui.input_data_tableView.selectionModel()
         if sm:
@@ -235,13 +209,53 @@ class InputTabController(QObject):
     # Load bảng (async)
     # =====================================================
     def load_table_data_once(self):
-        worker = AsyncWorker(search_entries, team_id=self.team_id, filters={
-                             "movement_type": "in"})
-        worker.finished.connect(self.update_table_model)
-        worker.error.connect(
-            lambda msg: QMessageBox.critical(None, "Lỗi", msg))
+        self.load_first_page({"movement_type": "in"})
+
+    def load_first_page(self, filters: Dict[str, Any]):
+        self.current_filters = filters
+        self.next_cursor = None
+        self.page_seq += 1
+        seq = self.page_seq
+        worker = AsyncWorker(search_entries_page, self.team_id, filters=filters)
+        worker.finished.connect(lambda page: self._on_first_page(seq, page))
+        worker.error.connect(lambda msg: self._on_first_page_failed(seq, msg))
+        worker.start()
+
+    def _on_first_page(self, seq: int, page: Dict[str, Any]):
+        if seq != self.page_seq:
+            return
+        self.next_cursor = page["next_cursor"]
+        self.update_table_model(page["rows"])
+
+    def _on_first_page_failed(self, seq: int, msg: str):
+        if seq == self.page_seq:
+            QMessageBox.critical(None, "Lỗi", msg)
+
+    def load_next_page(self):
+        # Model gọi khi view cuộn hết các dòng đã tải (fetchMore)
+        if self.next_cursor is None:
+            self.table_model.fetch_failed()
+            return
+        seq = self.page_seq
+        worker = AsyncWorker(search_entries_page, self.team_id,
+                             filters=self.current_filters, after=self.next_cursor)
+        worker.finished.connect(lambda page: self._on_next_page(seq, page))
+        worker.error.connect(lambda msg: self._on_next_page_failed(seq, msg))
         worker.start()
 
+    def _on_next_page(self, seq: int, page: Dict[str, Any]):
+        if seq != self.page_seq:
+            return
+        self.next_cursor = page["next_cursor"]
+        self.table_model.append_rows(
+            page["rows"], has_more=self.next_cursor is not None)
+
+    def _on_next_page_failed(self, seq: int, msg: str):
+        if seq != self.page_seq:
+            return
+        self.table_model.fetch_failed()
+        QMessageBox.critical(None, "Lỗi", msg)
+
     def search_items(self):
         filters = {"movement_type": "in"}
         if self.ui.input_search_component_id_checkBox.isChecked():
@@ -253,58 +267,58 @@ class InputTabController(QObject):
             if name:
                 filters["component_name"] = name
 
-        worker = AsyncWorker(search_entries, self.team_id, filters=filters)
-        worker.finished.connect(self.update_table_model)
-        worker.error.connect(
-            lambda msg: QMessageBox.critical(None, "Lỗi", msg))
-        worker.start()
+        self.load_first_page(filters)
 
     def update_table_model(self, data: List[Dict[str, Any]]):
-        self.table_model.clear()
+        self.table_model.set_rows(
+            data, has_more=self.next_cursor is not None)
         if not data:
             self.clear_form()
             return
 
-        headers = list(data[0].keys())
-        self.table_model.setHorizontalHeaderLabels(headers)
-        self.col_indices = {h: i for i, h in enumerate(headers)}
-
-        for row_data in data:
-            items = []
-            for key in headers:
-                value = row_data.get(key, "")
-                if isinstance(value, list):
-                    value = ", ".join(str(v) for v in value)
-                item = QStandardItem(str(value))
-                item.setEditable(False)
-                items.append(item)
-            self.table_model.appendRow(items)
-
         self.ui.input_data_tableView.resizeColumnsToContents()
         self.ui.input_data_tableView.horizontalHeader().setStretchLastSection(True)
 
-        if self.table_model.rowCount() > 0:
-            idx = self.table_model.index(0, 0)
+        if self.table_proxy.rowCount() > 0:
+            idx = self.table_proxy.index(0, 0)
             self.ui.input_data_tableView.setCurrentIndex(idx)
 
+    def selected_row(self) -> int:
+        """Dòng (trong model gốc) đang chọn, -1 nếu chưa chọn."""
+        indexes = self.ui.input_data_tableView.selectedIndexes()
+        if not indexes:
+            return -1
+        return source_row(self.table_proxy, indexes[0])
+
+    # =====================================================
+    # Thay đổi từ client khác (modules/change_feed.py)
+    # =====================================================
+    def apply_change(self, changes: Dict[str, Any]):
+        if changes.get("reload"):
+            self.load_first_page(self.current_filters)
+            self.load_name_suggestions_cache()  # chỉ mục có thể đã bị bỏ
+            return
+        self.table_model.remove_keys("id", changes["deleted"])
+        rows = [r for r in changes["upserted"]
+                if r["movement_type"] in ("in", "adjustment")]
+        missing = self.table_model.update_rows(rows, "id")
+        # Phiếu mới chỉ chèn lên đầu khi đang xem danh sách mặc định (không lọc)
+        if missing and set(self.current_filters) == {"movement_type"}:
+            self.table_model.insert_rows_at(0, missing)
+
     # =====================================================
     # Chọn dòng
     # =====================================================
     def on_row_selected(self, selected=None, deselected=None):
-        indexes = self.ui.input_data_tableView.selectedIndexes()
-        if not indexes:
+        row = self.selected_row()
+        if row < 0:
             self.clear_form()
             return
 
-        row = indexes[0].row()
         self.block_form_signals(True)
 
         def get_value(col_name, default=""):
-            col = self.col_indices.get(col_name)
-            if col is None:
-                return default
-            item = self.table_model.item(row, col)
-            return item.text() if item else default
+            return self.table_model.text(row, col_name, default)
 
         component_id = get_value("component_id")
         component_name = get_value("component_name")
@@ -336,35 +350,34 @@ class InputTabController(QObject):
 
         self.block_form_signals(False)
 
-        # Ảnh: async
+        # Ảnh: async qua cache, nạp trước ảnh các dòng lân cận
         img_path = os.path.join(self.image_folder, f"{component_id}.jpg")
-        if not os.path.exists(img_path):
-            img_path = DEFAULT_IMAGE_PATH
         self.ui.input_images_label.set_image(img_path)
+        self.prefetch_neighbour_images()
+
+    def prefetch_neighbour_images(self):
+        rows = neighbour_rows(self.ui.input_data_tableView, self.table_proxy)
+        paths = [os.path.join(self.image_folder, f"{cid}.jpg")
+                 for cid in (self.table_model.text(r, "component_id") for r in rows)
+                 if cid]
+        get_thumbnail_cache().prefetch(
+            paths, self.ui.input_images_label.thumbnail_size())
 
     # =====================================================
     # Gợi ý tên
     # =====================================================
     def load_name_suggestions_cache(self):
-        try:
-            df = self.db_handler.read_data(
-                "inventory_entries", ["component_name", "team_id"])
-            df = df[df["team_id"] == self.team_id]
-            self.name_suggestions_cache = sorted(
-                set(df["component_name"].dropna().astype(
-                    str).str.strip().unique())
-            )
-        except:
-            self.name_suggestions_cache = []
-
-    def on_name_text_changed(self, text: str):
-        if len(text) < 2:
-            self.name_model.setStringList([])
+        # Nạp sẵn chỉ mục → lần gõ đầu tiên không phải chờ query DB
+        self.name_worker = AsyncWorker(get_name_index, self.team_id)
+        self.name_worker.error.connect(
+            lambda msg: print(f"[INPUT] Lỗi nạp gợi ý tên: {msg}"))
+        self.name_worker.start()
+
+    def on_name_suggestions_ready(self, text: str, suggestions: list, elapsed_ms: float):
+        if text != self.ui.input_component_name_lineedit.text().strip():
             return
-        filtered = [
-            v for v in self.name_suggestions_cache if text.lower() in v.lower()][:20]
-        self.name_model.setStringList(filtered)
-        if filtered:
+        self.name_model.setStringList(suggestions)
+        if suggestions and self.ui.input_component_name_lineedit.hasFocus():
             self.name_completer.complete()
 
     # =====================================================
@@ -421,22 +434,20 @@ class InputTabController(QObject):
             QMessageBox.critical(None, "Lỗi", str(e))
 
     def _after_save(self):
-        AsyncWorker(refresh_current_stock).start()
+        self.allocated_cid = None  # đã dùng, không trả lại
         self.finish_edit_mode()
         self.load_table_data_once()
         QMessageBox.information(None, "Thành công", "Đã thêm.")
 
     def edit_selected_item(self):
-        indexes = self.ui.input_data_tableView.selectedIndexes()
-        if not indexes:
+        row = self.selected_row()
+        if row < 0:
             QMessageBox.warning(None, "Lỗi", "Chọn dòng để sửa.")
             return
         if self.is_new:
             return
 
-        row = indexes[0].row()
-        self.editing_entry_id = int(self.table_model.item(
-            row, self.col_indices.get("id", 0)).text())
+        self.editing_entry_id = int(self.table_model.value(row, "id"))
         self.is_editing = True
         self.ui.input_new_button.setText("Save Edit")
         self.ui.input_delete_button.setText("Cancel")
@@ -482,7 +493,6 @@ class InputTabController(QObject):
             QMessageBox.critical(None, "Lỗi", str(e))
 
     def _after_save_edit(self):
-        AsyncWorker(refresh_current_stock).start()
         self.finish_edit_mode()
         self.load_table_data_once()
         QMessageBox.information(None, "Thành công", "Đã cập nhật.")
@@ -492,13 +502,11 @@ class InputTabController(QObject):
             self.finish_edit_mode()
             return
 
-        indexes = self.ui.input_data_tableView.selectedIndexes()
-        if not indexes:
+        row = self.selected_row()
+        if row < 0:
             return
 
-        row = indexes[0].row()
-        entry_id = int(self.table_model.item(
-            row, self.col_indices.get("id", 0)).text())
+        entry_id = int(self.table_model.value(row, "id"))
         if QMessageBox.question(None, "Xác nhận", f"Xóa ID={entry_id}?") == QMessageBox.Yes:
             worker = AsyncWorker(delete_entry, entry_id, self.user_id)
             worker.finished.connect(lambda: self._after_delete())
@@ -507,7 +515,6 @@ class InputTabController(QObject):
             worker.start()
 
     def _after_delete(self):
-        AsyncWorker(refresh_current_stock).start()
         self.load_table_data_once()
 
     def finish_edit_mode(self):
@@ -541,12 +548,12 @@ class InputTabController(QObject):
                 from PIL import Image
                 img = Image.open(self.selected_image_path_input).convert('RGB')
                 img.save(target_path, "JPEG", quality=90)
+            get_thumbnail_cache().invalidate(target_path)
             self.ui.input_images_label.set_image(target_path)
         except Exception as e:
             print(f"[SAVE IMAGE] Lỗi: {e}")
 
     def clear_form(self):
-        self.ui.input_images_label.current_loader = None
         for w in [
             self.ui.input_component_id_lineedit, self.ui.input_component_name_lineedit,
             self.ui.input_size_lineedit, self.ui.input_invoice_lineedit,
@@ -560,6 +567,7 @@ class InputTabController(QObject):
             sel.set_selected_items([])
         self.ui.input_images_label.set_image("")
         self.selected_image_path_input = None
+        self.release_allocated_cid()
 
     def on_auto_cid_changed(self, state):
         if state == 2:
@@ -571,10 +579,28 @@ class InputTabController(QObject):
             QMessageBox.warning(None, "Lỗi", "Chọn Storage Location.")
             self.ui.input_check_id_auto_checkBox.setChecked(False)
             return
+        # Tick lại cùng vị trí → dùng lại mã đã cấp, không tốn số mới
+        if self.allocated_cid and self.allocated_cid.startswith(cid_prefix(storage)):
+            self.ui.input_component_id_lineedit.setText(self.allocated_cid)
+            return
+        self.release_allocated_cid()
         worker = AsyncWorker(generate_next_cid, storage)
-        worker.finished.connect(
-            lambda cid: self.ui.input_component_id_lineedit.setText(cid) if cid else None)
+        worker.finished.connect(self._on_cid_generated)
+        worker.start()
+
+    def _on_cid_generated(self, cid):
+        if not cid:
+            return
+        self.allocated_cid = cid
+        self.ui.input_component_id_lineedit.setText(cid)
+
+    def release_allocated_cid(self):
+        if not self.allocated_cid:
+            return
+        worker = AsyncWorker(release_cid, self.allocated_cid)
+        worker.error.connect(lambda msg: print(f"[CID] Lỗi trả mã: {msg}"))
         worker.start()
+        self.allocated_cid = None
 
     def block_form_signals(self, block=True):
         for w in [
@@ -587,4 +613,55 @@ class InputTabController(QObject):
             w.blockSignals(block)
 
     def export_to_excel(self):
-        pass  # giữ nguyên
+        # Xuất thẳng từ DB với bộ lọc đang xem (modules/export.py)
+        self._export_dialog = start_export(
+            self.ui, "entries", self.team_id, self.current_filters, "nhap_kho",
+            self.invoice_folder)
+
+    # =====================================================
+    # Nhập hàng loạt từ CSV / XLSX (modules/bulk_import.py)
+    # =====================================================
+    def setup_import_button(self):
+        export_btn = self.ui.input_export_button
+        self.import_button = QPushButton("Import", export_btn.parentWidget())
+        self.import_button.setObjectName("input_import_button")
+        self.import_button.setMinimumSize(export_btn.minimumSize())
+        self.import_button.setFont(export_btn.font())
+        self.import_button.setStyleSheet(export_btn.styleSheet())
+        layout = self.ui.inputButtonLayout
+        layout.insertWidget(layout.indexOf(export_btn) + 1, self.import_button)
+        self.import_button.clicked.connect(self.import_from_file)
+
+    def import_from_file(self):
+        path, _ = QFileDialog.getOpenFileName(
+            None, "Chọn file nhập kho", self.invoice_folder or "",
+            "Excel/CSV (*.xlsx *.xls *.csv)")
+        if not path:
+            return
+        self.import_button.setEnabled(False)
+        worker = AsyncWorker(import_file, path, self.team_id, self.user_id)
+        worker.finished.connect(self._after_import)
+        worker.error.connect(self._import_failed)
+        worker.start()
+
+    def _after_import(self, result: Dict[str, Any]):
+        self.import_button.setEnabled(True)
+        errors = result.get("errors") or []
+        if errors:
+            lines = [f"Dòng {row}: {msg}" for row, msg in errors[:20]]
+            if len(errors) > 20:
+                lines.append(f"... và {len(errors) - 20} lỗi khác")
+            QMessageBox.warning(
+                None, "Lỗi dữ liệu",
+                f"{len(errors)}/{result.get('total', 0)} dòng lỗi, chưa nhập dòng nào.\n\n"
+                + "\n".join(lines))
+            return
+        self.load_table_data_once()
+        QMessageBox.information(
+            None, "Thành công",
+            f"Đã nhập {result['rows']} dòng trong {result['seconds']:.2f}s "
+            f"({result['rows_per_sec']:,.0f} dòng/giây).")
+
+    def _import_failed(self, msg: str):
+        self.import_button.setEnabled(True)
+        QMessageBox.critical(None, "Lỗi nhập file", msg)
@@ -1,17 +1,23 @@
 # warehouse_app/modules/ui/inventory_tab.py
 import os
-import asyncio
-import pandas as pd
 from PySide6.QtWidgets import (
-    QTableWidgetItem, QFileDialog, QMessageBox, QVBoxLayout
+    QFileDialog, QMessageBox, QVBoxLayout
 )
-from PySide6.QtGui import QPixmap
+from PySide6.QtGui import QPixmap, QColor
 from PySide6.QtCore import QObject, Qt, QEvent
 from modules.inventory import get_current_stock, get_component_info_from_stock
 from modules.options import get_all_categories
 from modules.search import search_current_stock
+from modules.reorder import get_reorder_report, reorder_flag, FLAG_OUT, FLAG_REORDER
+from modules.async_worker import AsyncWorker
+from db.sync_wrapper import run_async
 from config.global_vars import get_folders
 from modules.ui.multiselect_dropdown import MultiSelectDropdown
+from modules.ui.export_dialog import start_export
+from modules.ui.table_model import (
+    attach_record_model, replace_table_widget, source_row, neighbour_rows
+)
+from modules.thumbnail_cache import get_thumbnail_cache
 from modules.image_hover_preview import HoverPreviewLabel
 
 
@@ -26,10 +32,24 @@ class InventoryTabController(QObject):
 
         self.image_folder, _ = get_folders()
 
-        # === TẢI OPTIONS ===
-        self.options = asyncio.run(get_all_categories(self.team_id))
-
-        self.col_indices = {}  # BẮT BUỘC
+        # === TẢI OPTIONS (MainWindow đã nạp sẵn → không query lại) ===
+        self.options = getattr(self.ui, "options", None) or run_async(
+            get_all_categories(self.team_id))
+
+        self.current_filters = {}  # {} = danh sách tồn mặc định (không lọc)
+        # component_id → (nhu cầu / ngày, điểm đặt hàng lại) – modules/reorder.py
+        self.reorder = {}
+        self._reorder_worker = None
+
+        # === THAY QTableWidget BẰNG QTableView + MODEL DÙNG CHUNG ===
+        self.ui.inventory_data_tableView = replace_table_widget(
+            self.ui.inventory_data_tablewidget)
+        self.table_model, self.table_proxy = attach_record_model(
+            self.ui.inventory_data_tableView, self)
+        self.table_model.set_highlight("reorder_flag", {
+            FLAG_OUT: QColor("#fee2e2"),       # hết hàng, vẫn đang dùng
+            FLAG_REORDER: QColor("#fef3c7"),   # tồn ≤ điểm đặt hàng lại
+        })
 
         # === MULTISELECT ===
         self.setup_multiselect_widgets()
@@ -114,11 +134,17 @@ class InventoryTabController(QObject):
             self.ui.inventory_images_label.set_image(file_path)
 
     def display_image(self, component_id: str):
+        # Cache ảnh tự kiểm tra file, không có → label dùng ảnh mặc định
         image_path = os.path.join(self.image_folder, f"{component_id}.jpg")
-        default = "images/default.jpg"
-        path = image_path if os.path.exists(
-            image_path) and os.path.getsize(image_path) > 0 else default
-        self.ui.inventory_images_label.set_image(path)
+        self.ui.inventory_images_label.set_image(image_path)
+
+    def prefetch_neighbour_images(self):
+        rows = neighbour_rows(self.ui.inventory_data_tableView, self.table_proxy)
+        paths = [os.path.join(self.image_folder, f"{cid}.jpg")
+                 for cid in (self.table_model.text(r, "component_id") for r in rows)
+                 if cid]
+        get_thumbnail_cache().prefetch(
+            paths, self.ui.inventory_images_label.thumbnail_size())
 
     # =========================================================
     # KẾT NỐI NÚT (GIỐNG INPUT_TAB)
@@ -126,54 +152,37 @@ class InventoryTabController(QObject):
     def setup_connections(self):
         self.ui.inventory_search_button.clicked.connect(self.search_inventory)
         self.ui.inventory_export_button.clicked.connect(self.export_to_excel)
-        self.ui.inventory_data_tablewidget.currentCellChanged.connect(
-            self.on_row_selected)
+        self.ui.inventory_data_tableView.selectionModel().currentRowChanged.connect(
+            lambda current, _prev: self.on_row_selected(
+                source_row(self.table_proxy, current), 0))
 
     # =========================================================
     # TẢI TỒN KHO (GIỐNG INPUT_TAB)
     # =========================================================
     def load_inventory_table(self, data=None):
+        # CHƯA CÓ DỮ LIỆU → TẢI NỀN, XONG GỌI LẠI HÀM NÀY
+        if data is None:
+            self._run_query(get_current_stock, "Lỗi tải tồn kho",
+                            team_id=self.team_id)
+            self.load_reorder()
+            return
+
         try:
             # DỮ LIỆU ĐÃ CÓ → DÙNG NGAY (từ search hoặc cache)
-            if data is None:
-                data = asyncio.run(get_current_stock(team_id=self.team_id))
-
-            table = self.ui.inventory_data_tablewidget
+            # Model giữ dữ liệu theo cột, định dạng ô khi vẽ (table_model.py)
+            table = self.ui.inventory_data_tableView
+            self.table_model.set_rows([self._with_reorder(r) for r in data])
             if not data:
-                table.setRowCount(0)
                 self.clear_form()
                 return
 
-            # LẤY HEADER TỪ DÒNG ĐẦU
-            headers = list(data[0].keys())
-            table.setColumnCount(len(headers))
-            table.setHorizontalHeaderLabels(headers)
-            table.setRowCount(len(data))
-
-            # LƯU INDEX CỘT ĐỂ on_row_selected DÙNG SIÊU NHANH
-            self.col_indices = {}
-            for c, h in enumerate(headers):
-                self.col_indices[h] = c
-
-            # ĐỔ DỮ LIỆU VÀO BẢNG
-            for r, row in enumerate(data):
-                for c, key in enumerate(headers):
-                    value = row.get(key, "")
-                    if key == "current_quantity":
-                        value = str(int(value)) if value is not None else "0"
-                    elif isinstance(value, list):  # group_name, process, model, material
-                        value = ", ".join([str(v)
-                                          for v in value]) if value else ""
-                    table.setItem(r, c, QTableWidgetItem(str(value)))
-
             # TỐI ƯU HIỂN THỊ
             table.resizeColumnsToContents()
             table.horizontalHeader().setStretchLastSection(True)
 
             # TỰ ĐỘNG CHỌN DÒNG ĐẦU + HIỂN THỊ CHI TIẾT
-            if table.rowCount() > 0:
+            if self.table_proxy.rowCount() > 0:
                 table.selectRow(0)
-                self.on_row_selected(0, 0)
 
         except Exception as e:
             QMessageBox.critical(None, "Lỗi tải tồn kho", str(e))
@@ -244,33 +253,81 @@ class InventoryTabController(QObject):
             if loc:
                 filters["storage_location"] = [loc]
 
-        try:
-            if filters:
-                data = asyncio.run(search_current_stock(self.team_id, filters))
-            else:
-                data = asyncio.run(get_current_stock(team_id=self.team_id))
-            self.load_inventory_table(data)
-        except Exception as e:
-            QMessageBox.critical(None, "Lỗi tìm kiếm", str(e))
+        self.current_filters = filters
+        if filters:
+            self._run_query(search_current_stock, "Lỗi tìm kiếm",
+                            self.team_id, filters)
+        else:
+            self._run_query(get_current_stock, "Lỗi tìm kiếm",
+                            team_id=self.team_id)
+
+    def _run_query(self, coro, error_title, *args, **kwargs):
+        """Chạy query trên loop nền, xong đổ vào bảng."""
+        worker = AsyncWorker(coro, *args, **kwargs)
+        worker.finished.connect(self.load_inventory_table)
+        worker.error.connect(
+            lambda msg: QMessageBox.critical(None, error_title, msg))
+        worker.start()
+
+    # =========================================================
+    # CỜ ĐẶT HÀNG LẠI (modules/reorder.py)
+    # =========================================================
+    def load_reorder(self):
+        # Tính cho cả team trên loop nền; xong tô lại các dòng đang có
+        self._reorder_worker = AsyncWorker(get_reorder_report, self.team_id)
+        self._reorder_worker.finished.connect(self._on_reorder_loaded)
+        self._reorder_worker.error.connect(
+            lambda msg: print(f"[INVENTORY] Lỗi tính điểm đặt hàng: {msg}"))
+        self._reorder_worker.start()
+
+    def _on_reorder_loaded(self, report):
+        self.reorder = dict(zip(
+            report["component_id"],
+            zip(report["avg_daily"].tolist(), report["reorder_point"].tolist())))
+        rows = [{"component_id": cid, "current_quantity": qty}
+                for cid, qty in zip(self.table_model.values("component_id"),
+                                    self.table_model.values("current_quantity"))]
+        self.table_model.update_rows(
+            [self._with_reorder(r) for r in rows], "component_id")
+
+    def _with_reorder(self, row):
+        """Thêm days_of_cover / reorder_point / reorder_flag vào 1 dòng tồn."""
+        rate, point = self.reorder.get(row.get("component_id"), (0.0, 0.0))
+        qty = float(row.get("current_quantity") or 0)
+        return {
+            **row,
+            "days_of_cover": round(qty / rate, 1) if rate > 0 else None,
+            "reorder_point": point if rate > 0 else None,
+            "reorder_flag": reorder_flag(qty, rate, point),
+        }
+
+    # =========================================================
+    # THAY ĐỔI TỪ CLIENT KHÁC (modules/change_feed.py)
+    # =========================================================
+    def apply_change(self, changes):
+        if changes.get("reload"):
+            self.search_inventory()
+            return
+        self.table_model.remove_keys("component_id", changes["stock_removed"])
+        # Tồn đổi → tính lại cờ của đúng các mã đó
+        missing = self.table_model.update_rows(
+            [self._with_reorder(r) for r in changes["stock"]], "component_id")
+        # Mã mới có tồn: chỉ thêm khi đang xem danh sách mặc định
+        if missing and not self.current_filters:
+            self.table_model.insert_rows_at(self.table_model.rowCount(), missing)
 
     # =========================================================
     # XEM CHI TIẾT (GIỐNG INPUT_TAB)
     # =========================================================
     def on_row_selected(self, row, col):
-        if row < 0 or not hasattr(self, 'col_indices'):
+        if row < 0:
             self.clear_form()
             return
 
         try:
-            table = self.ui.inventory_data_tablewidget
-
             # HÀM LẤY GIÁ TRỊ SIÊU NHANH
             def get_value(col_name):
-                col = self.col_indices.get(col_name)
-                if col is None:
-                    return ""
-                item = table.item(row, col)
-                return item.text() if item else ""
+                return self.table_model.text(row, col_name)
 
             # === LẤY DỮ LIỆU ===
             component_id = get_value("component_id")
@@ -314,6 +371,7 @@ class InventoryTabController(QObject):
 
             # === ẢNH ===
             self.display_image(component_id)
+            self.prefetch_neighbour_images()
 
         except Exception as e:
             print(f"[INVENTORY] on_row_selected lỗi: {e}")
@@ -341,25 +399,8 @@ class InventoryTabController(QObject):
         self.ui.inventory_images_label.hide_zoom()
 
     # =========================================================
-    # XUẤT EXCEL (GIỐNG INPUT_TAB)
+    # XUẤT FILE (GIỐNG INPUT_TAB) – đọc thẳng từ DB, cùng bộ lọc đang xem
     # =========================================================
     def export_to_excel(self):
-        path, _ = QFileDialog.getSaveFileName(
-            None, "Xuất Excel", "", "Excel Files (*.xlsx)")
-        if not path:
-            return
-        try:
-            table = self.ui.inventory_data_tablewidget
-            headers = [table.horizontalHeaderItem(
-                c).text() for c in range(table.columnCount())]
-            data = []
-            for r in range(table.rowCount()):
-                row = []
-                for c in range(table.columnCount()):
-                    item = table.item(r, c)
-                    row.append(item.text() if item else "")
-                data.append(row)
-            pd.DataFrame(data, columns=headers).to_excel(path, index=False)
-            QMessageBox.information(None, "Xuất Excel", f"Đã lưu: {path}")
-        except Exception as e:
-            QMessageBox.critical(None, "Lỗi", str(e))
+        self._export_dialog = start_export(
+            self.ui, "stock", self.team_id, self.current_filters, "ton_kho")
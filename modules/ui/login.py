@@ -1,24 +1,7 @@
-import asyncio
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QPushButton, QLabel, QMessageBox
-from PySide6.QtCore import Signal, QThread, QObject
+from PySide6.QtCore import Signal
 from modules.auth import verify_user
-
-
-class LoginWorker(QObject):
-    finished = Signal(dict)
-    error = Signal(str)
-
-    def __init__(self, username, password):
-        super().__init__()
-        self.username = username
-        self.password = password
-
-    def run(self):
-        try:
-            result = asyncio.run(verify_user(self.username, self.password))
-            self.finished.emit(result or {})
-        except Exception as e:
-            self.error.emit(str(e))
+from modules.async_worker import AsyncWorker
 
 
 class LoginScreen(QWidget):
@@ -56,16 +39,10 @@ class LoginScreen(QWidget):
             return
 
         self.btn_login.setEnabled(False)
-        self.thread = QThread()
-        self.worker = LoginWorker(username, password)
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
+        self.worker = AsyncWorker(verify_user, username, password)
         self.worker.finished.connect(self.on_login_result)
         self.worker.error.connect(self.on_login_error)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.thread.start()
+        self.worker.start()
 
     def on_login_result(self, user):
         self.btn_login.setEnabled(True)
@@ -1,7 +1,7 @@
 # warehouse_app/modules/ui/main_window.py
 from PySide6.QtWidgets import QMainWindow, QStatusBar, QPushButton, QMessageBox, QInputDialog, QHBoxLayout, QWidget, QLabel, QTabWidget
 from PySide6.QtGui import QPixmap, QDesktopServices, QImage, QGuiApplication, QPainter, QColor, QPen, QMouseEvent, QKeyEvent
-from PySide6.QtCore import QStringListModel, Qt, QThread, QTimer, QUrl, QObject, QEvent
+from PySide6.QtCore import QStringListModel, Qt, QThread, QTimer, QUrl, QObject, QEvent, Signal
 from ui.screen_InventoryManager import Ui_MainWindow
 from modules.ui.input_tab import InputTabController
 from modules.ui.output_tab import OutputTabController
@@ -11,12 +11,35 @@ from config.settings import SOFTWARE_TITLE
 import os
 from config.global_vars import get_folders
 import subprocess
-import asyncio
+from db.sync_wrapper import run_async, submit
 from modules.options import get_all_categories  # ← Đảm bảo import
+from modules.stock_refresh import get_refresh_status
+from modules.query_cache import get_cache_stats
+from db.statements import get_statement_stats
+from modules import change_feed
+from modules.ui.admin_tab import AdminTab
+from modules.ui.report_tab import ReportTab
+from modules.local_mirror import get_mirror_status
 
 _OPTIONS_CACHE: dict = {}
 
 
+async def load_categories_once(team_id: int):
+    """Chỉ query DB 1 lần duy nhất cho mỗi team"""
+    if team_id not in _OPTIONS_CACHE:
+        try:
+            _OPTIONS_CACHE[team_id] = await get_all_categories(team_id)
+        except Exception as e:
+            print(f"[ERROR] load_categories_once: {e}")
+            _OPTIONS_CACHE[team_id] = {}
+    return _OPTIONS_CACHE[team_id]
+
+
+class ChangeFeedBridge(QObject):
+    """Nhận change set từ loop nền → emit sang GUI thread (queued)."""
+    changed = Signal(object)
+
+
 class MainWindow(QMainWindow, Ui_MainWindow):
     def __init__(self, user_info: dict):
         super().__init__()
@@ -50,6 +73,20 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.statusBar.addPermanentWidget(btn_open_invoice)  # ← PHẢI
 
+        # === 2b. TRẠNG THÁI ĐỒNG BỘ VIEW current_stock (BÁO CÁO) ===
+        self.stock_status_label = QLabel("")
+        self.stock_status_label.setStyleSheet("color: #555; padding: 0 10px;")
+        self.statusBar.addPermanentWidget(self.stock_status_label)
+        self.stock_status_timer = QTimer(self)
+        self.stock_status_timer.timeout.connect(self.update_stock_status)
+        self.stock_status_timer.start(2000)
+
+        # === 2c. BẢN SAO CỤC BỘ (modules/local_mirror.py) – ẩn khi không bật ===
+        self.mirror_status_label = QLabel("")
+        self.mirror_status_label.setStyleSheet("color: #555; padding: 0 10px;")
+        self.statusBar.addPermanentWidget(self.mirror_status_label)
+        self.stock_status_timer.timeout.connect(self.update_mirror_status)
+
         # === 3. TẠO LABEL ZOOM ẢNH Ở GIỮA MÀN HÌNH ===
         # centralwidget là widget trung tâm
         self.images_zoom_label = QLabel(self.centralwidget)
@@ -85,16 +122,24 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             else:
                 tab_widget.setTabVisible(i, True)   # HIỆN TAB
 
+        # Tab hiệu năng DB (db/metrics.py) – tạo bằng code, chỉ admin
+        if role == "admin":
+            tab_widget.addTab(AdminTab(self), "Hiệu năng DB")
+
         db_handler = DatabaseHandler()
 
         team_id = user_info.get("team_id")
+
+        # Tab báo cáo tiêu hao (chỉ đọc bảng tổng hợp – modules/rollups.py)
+        if role in ("admin", "manager"):
+            tab_widget.addTab(ReportTab(team_id, self), "Báo cáo")
         user_id = user_info.get("id")
 
-        # === LOAD OPTIONS 1 LẦN DUY NHẤT ===
+        # === LOAD OPTIONS 1 LẦN DUY NHẤT (main.py đã nạp sẵn trên loop nền) ===
         try:
-            loop = asyncio.get_event_loop()
-            self.options = loop.run_until_complete(
-                self.load_categories_once(team_id))
+            self.options = _OPTIONS_CACHE.get(team_id)
+            if self.options is None:
+                self.options = run_async(load_categories_once(team_id))
         except Exception as e:
             print(f"[ERROR] Không thể load options: {e}")
             self.options = {}
@@ -129,6 +174,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         #     username=username,
         #     db_handler=db_handler
         # )
+
+        # === CẬP NHẬT TRỰC TIẾP TỪ CLIENT KHÁC (LISTEN/NOTIFY) ===
+        self.change_bridge = ChangeFeedBridge(self)
+        self.change_bridge.changed.connect(self.on_remote_change)
+        submit(change_feed.subscribe(team_id, self.change_bridge.changed.emit))
+
+    def on_remote_change(self, changes: dict):
+        for name in ("input_tab_controller", "output_tab_controller", "inventory_controller"):
+            controller = getattr(self, name, None)
+            if controller is None:
+                continue
+            try:
+                controller.apply_change(changes)
+            except Exception as e:
+                print(f"[CHANGE FEED] {name}: {e}")
+
     # MỞ INVOICE TỪ invoice_folder
     # =========================================================
 
@@ -168,6 +229,60 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, "Không tìm thấy",
                                 f"Không tìm thấy file invoice chi tiết: {invoice_name}")
 
+    def update_stock_status(self):
+        """Hiển thị 'tồn kho (báo cáo) cũ từ T' + thời gian refresh gần nhất."""
+        status = get_refresh_status()
+        if status["stale_since"]:
+            text = f"Báo cáo tồn: chờ đồng bộ từ {status['stale_since']:%H:%M:%S}"
+            color = "#d97706"
+        elif status["last_refreshed_at"]:
+            text = f"Báo cáo tồn: đồng bộ lúc {status['last_refreshed_at']:%H:%M:%S}"
+            color = "#555"
+        else:
+            text, color = "", "#555"
+        self.stock_status_label.setText(text)
+        self.stock_status_label.setStyleSheet(f"color: {color}; padding: 0 10px;")
+        cache = get_cache_stats()
+        stmts = get_statement_stats()
+        self.stock_status_label.setToolTip(
+            f"Refresh: {status['refreshes']} lần, gộp {status['coalesced']} yêu cầu, "
+            f"TB {status['avg_duration_ms']} ms, lớn nhất {status['max_duration_ms']} ms\n"
+            f"Cache truy vấn: {cache['entries']} mục, trúng {cache['hit_ratio']:.0%} "
+            f"({cache['hits']}/{cache['hits'] + cache['misses']}), "
+            f"xóa do ghi {cache['invalidations']}\n"
+            f"Prepared: {stmts['fixed']} cố định + {stmts['shapes']} shape, "
+            f"dùng lại {stmts['reuse_ratio']:.0%} ({stmts['prepares']} lần prepare / "
+            f"{stmts['executions']} lần chạy)")
+
+    def update_mirror_status(self):
+        """'Bản sao: 12 giây trước' – đỏ khi quá LOCAL_MIRROR_STALE_AFTER / mất kết nối."""
+        status = get_mirror_status(self.user_info.get("team_id"))
+        if not status["enabled"]:
+            self.mirror_status_label.setVisible(False)
+            return
+        self.mirror_status_label.setVisible(True)
+        age = status["age"]
+        if age is None:
+            text = "Bản sao: đang tải lần đầu"
+        elif age < 60:
+            text = f"Bản sao: {int(age)} giây trước"
+        elif age < 3600:
+            text = f"Bản sao: {int(age // 60)} phút trước"
+        else:
+            text = f"Bản sao: {status['synced_at']:%d/%m %H:%M}"
+        color = "#dc2626" if status["stale"] and age is not None else "#555"
+        self.mirror_status_label.setText(text)
+        self.mirror_status_label.setStyleSheet(f"color: {color}; padding: 0 10px;")
+        if status["error"] and status["serving"]:
+            tip = f"Mất kết nối máy chủ, đang đọc dữ liệu cũ trên máy:\n{status['error']}"
+        elif status["error"]:
+            tip = f"Không đồng bộ được, đang đọc từ máy chủ:\n{status['error']}"
+        elif status["serving"]:
+            tip = "Tìm kiếm đang đọc bản sao trên máy"
+        else:
+            tip = "Vừa có thay đổi – đang đọc từ máy chủ tới khi đồng bộ xong"
+        self.mirror_status_label.setToolTip(tip)
+
     def cat_chuoi_invoice(self, text: str) -> str:
         # Bước 1: Chuẩn hóa các dấu gạch
         text = text.replace("\u2010", "-").replace("\u2013",
@@ -234,11 +349,4 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     async def load_categories_once(self, team_id: int):
         """Chỉ query DB 1 lần duy nhất cho mỗi team"""
-        global _OPTIONS_CACHE
-        if team_id not in _OPTIONS_CACHE:
-            try:
-                _OPTIONS_CACHE[team_id] = await get_all_categories(team_id)
-            except Exception as e:
-                print(f"[ERROR] load_categories_once: {e}")
-                _OPTIONS_CACHE[team_id] = {}
-        return _OPTIONS_CACHE[team_id]
+        return await load_categories_once(team_id)
@@ -1,16 +1,23 @@
 # warehouse_app/modules/ui/output_tab.py → SỬA TOÀN BỘ (CẬP NHẬT MỚI NHẤT)
 
 import os
-import asyncio
 from PySide6.QtWidgets import (
-    QMessageBox, QTableWidgetItem, QFileDialog, QVBoxLayout
+    QMessageBox, QFileDialog, QVBoxLayout, QPushButton
 )
 from PySide6.QtGui import QPixmap
 from PySide6.QtCore import QObject, Qt, QEvent
-from modules.inventory import add_entry, refresh_current_stock, get_component_info_from_stock
-from modules.search import search_entries
+from modules.inventory import issue_entry, get_component_info_from_stock
+from modules.search import search_entries_page
+from modules.async_worker import AsyncWorker
+from db.sync_wrapper import run_async
 from modules.ui.multiselect_dropdown import MultiSelectDropdown
+from modules.ui.table_model import (
+    attach_record_model, replace_table_widget, source_row, neighbour_rows
+)
+from modules.thumbnail_cache import get_thumbnail_cache
 from modules.image_hover_preview import HoverPreviewLabel  # ← THÊM IMPORT
+from modules.ui.pick_list_dialog import PickListDialog
+from modules.ui.export_dialog import start_export
 import logging
 
 
@@ -27,7 +34,17 @@ class OutputTabController(QObject):
         self.current_entry = None
         self.is_new = False  # ← TRẠNG THÁI TẠO MỚI
 
-        self.col_indices = {}  # BẮT BUỘC
+        # Phân trang keyset (model gọi fetchMore khi cuộn tới cuối bảng)
+        self.current_filters = {"movement_type": "out"}
+        self.next_cursor = None
+        self.page_seq = 0  # tăng mỗi lần tìm mới → bỏ trang của lần tìm cũ về muộn
+
+        # === THAY QTableWidget BẰNG QTableView + MODEL DÙNG CHUNG ===
+        self.ui.output_data_tableView = replace_table_widget(
+            self.ui.output_data_tablewidget)
+        self.table_model, self.table_proxy = attach_record_model(
+            self.ui.output_data_tableView, self)
+        self.table_model.set_fetcher(self.load_output_next_page)
 
         # === TẠO MULTISELECT CHO OUTPUT (GIỐNG INPUT) ===
         self.setup_multiselect_widgets()
@@ -35,6 +52,9 @@ class OutputTabController(QObject):
         # === THAY THẾ output_images_label BẰNG HoverPreviewLabel ===
         self.replace_image_label_with_hover()
 
+        # === NÚT PICK LIST (XUẤT NHIỀU MÃ 1 LẦN) ===
+        self.setup_pick_list_button()
+
         self.setup_connections()
         self.clear_form()
 
@@ -110,10 +130,9 @@ class OutputTabController(QObject):
     # HIỂN THỊ ẢNH (DÙNG HoverPreviewLabel)
     # =========================================================
     def display_image(self, image_path: str):
-        default = "images/default.jpg"
-        path = image_path if os.path.exists(
-            image_path) and os.path.getsize(image_path) > 0 else default
-        self.ui.output_images_label.set_image(path)
+        # Không kiểm tra file trên share ở đây: cache ảnh tự kiểm tra
+        # và label tự dùng ảnh mặc định nếu không có
+        self.ui.output_images_label.set_image(image_path)
 
     def select_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
@@ -121,6 +140,15 @@ class OutputTabController(QObject):
         if file_path:
             self.ui.output_images_label.set_image(file_path)
 
+    def prefetch_neighbour_images(self):
+        folder = self.input_controller.image_folder
+        rows = neighbour_rows(self.ui.output_data_tableView, self.table_proxy)
+        paths = [os.path.join(folder, f"{cid}.jpg")
+                 for cid in (self.table_model.text(r, "component_id") for r in rows)
+                 if cid]
+        get_thumbnail_cache().prefetch(
+            paths, self.ui.output_images_label.thumbnail_size())
+
     # =========================================================
     # KẾT NỐI
     # =========================================================
@@ -133,8 +161,9 @@ class OutputTabController(QObject):
             self.on_delete_or_cancel)  # ← SỬA
         self.ui.output_export_button.clicked.connect(self.export_to_excel)
         self.ui.output_search_button.clicked.connect(self.search_output_items)
-        self.ui.output_data_tablewidget.currentCellChanged.connect(
-            self.on_output_row_selected)
+        self.ui.output_data_tableView.selectionModel().currentRowChanged.connect(
+            lambda current, _prev: self.on_output_row_selected(
+                source_row(self.table_proxy, current), 0))
 
     # =========================================================
     # NÚT NEW → CHUYỂN SANG SAVE / CANCEL
@@ -175,6 +204,8 @@ class OutputTabController(QObject):
             if qty_out <= 0:
                 QMessageBox.warning(None, "Lỗi", "Số lượng > 0.")
                 return
+            # Kiểm tra nhanh theo số đã hiển thị; kiểm tra thật (khóa dòng
+            # tồn) nằm trong issue_entry – người khác có thể vừa xuất
             if qty_out > self.current_entry["current_quantity"]:
                 QMessageBox.warning(None, "Lỗi", "Vượt tồn kho.")
                 return
@@ -195,44 +226,80 @@ class OutputTabController(QObject):
                 "status": self.current_entry["status"],
                 "note": self.ui.output_note_textedit.toPlainText(),
                 "quantity": qty_out,
-                "movement_type": "out",
                 "created_by": self.user_id,
             }
 
-            entry_id = asyncio.run(add_entry(**data))
-            asyncio.run(refresh_current_stock())
-
-            QMessageBox.information(
-                None, "Thành công", f"Đã xuất {qty_out} cái (ID={entry_id}).")
-
-            # THOÁT CHẾ ĐỘ TẠO MỚI
-            self.is_new = False
-            self.ui.output_new_button.setText("➕ New")
-            self.ui.output_delete_button.setText("Delete")
-            self.ui.output_check_id_auto_checkBox.setEnabled(True)
-            self.clear_form()
-            self.load_output_table()
+            worker = AsyncWorker(issue_entry, **data)
+            worker.finished.connect(
+                lambda result: self._after_save_output(result, qty_out))
+            worker.error.connect(self._save_output_failed)
+            worker.start()
 
         except Exception as e:
             print(str(e))
             QMessageBox.critical(None, "Lỗi", str(e))
 
+    def _save_output_failed(self, msg):
+        QMessageBox.critical(None, "Lỗi", msg)
+        # Tồn có thể vừa bị người khác xuất → đọc lại số tồn mới
+        if self.current_entry:
+            self.on_auto_fill_from_input(2)
+
+    def _after_save_output(self, result, qty_out):
+        QMessageBox.information(
+            None, "Thành công",
+            f"Đã xuất {qty_out} cái (ID={result['id']}), còn tồn {result['balance']}.")
+
+        # THOÁT CHẾ ĐỘ TẠO MỚI
+        self.is_new = False
+        self.ui.output_new_button.setText("➕ New")
+        self.ui.output_delete_button.setText("Delete")
+        self.ui.output_check_id_auto_checkBox.setEnabled(True)
+        self.clear_form()
+        self.load_output_table()
+
     # =========================================================
     # XÓA DÒNG XUẤT KHO TRONG BẢNG
     # =========================================================
     def delete_selected_output(self):
-        row = self.ui.output_data_tablewidget.currentRow()
+        row = source_row(self.table_proxy,
+                         self.ui.output_data_tableView.currentIndex())
         if row < 0:
             QMessageBox.warning(None, "Lỗi", "Vui lòng chọn dòng để xóa.")
             return
 
-        entry_id = int(self.ui.output_data_tablewidget.item(row, 0).text())
+        entry_id = int(self.table_model.value(row, "id"))
         if QMessageBox.question(None, "Xác nhận", f"Xóa phiếu xuất ID={entry_id}?") == QMessageBox.Yes:
             from modules.inventory import delete_entry
-            asyncio.run(delete_entry(entry_id, self.user_id))
-            asyncio.run(refresh_current_stock())
-            self.load_output_table()
-            QMessageBox.information(None, "Xóa", f"Đã xóa ID={entry_id}")
+            worker = AsyncWorker(delete_entry, entry_id, self.user_id)
+            worker.finished.connect(lambda _: self._after_delete(entry_id))
+            worker.error.connect(
+                lambda msg: QMessageBox.critical(None, "Lỗi", msg))
+            worker.start()
+
+    def _after_delete(self, entry_id):
+        self.load_output_table()
+        QMessageBox.information(None, "Xóa", f"Đã xóa ID={entry_id}")
+
+    # =========================================================
+    # PICK LIST – QUÉT NHIỀU MÃ, XUẤT TRONG 1 TRANSACTION
+    # =========================================================
+    def setup_pick_list_button(self):
+        export_btn = self.ui.output_export_button
+        self.pick_list_button = QPushButton("📋 Pick list", export_btn.parentWidget())
+        self.pick_list_button.setObjectName("output_pick_list_button")
+        self.pick_list_button.setMinimumSize(export_btn.minimumSize())
+        self.pick_list_button.setFont(export_btn.font())
+        self.pick_list_button.setStyleSheet(export_btn.styleSheet())
+        layout = self.ui.outputButtonLayout
+        layout.insertWidget(layout.indexOf(export_btn) + 1, self.pick_list_button)
+        self.pick_list_button.clicked.connect(self.open_pick_list)
+
+    def open_pick_list(self):
+        dialog = PickListDialog(self.team_id, self.user_id,
+                                self.ui.output_data_tableView.window())
+        dialog.issued.connect(lambda _result: self.load_output_table())
+        dialog.exec()
 
     # =========================================================
     # XÓA FORM
@@ -266,49 +333,84 @@ class OutputTabController(QObject):
     # =========================================================
 
     def load_output_table(self, data=None):
+        # CHƯA CÓ DỮ LIỆU → TẢI NỀN, XONG GỌI LẠI HÀM NÀY
+        if data is None:
+            self.load_output_first_page({"movement_type": "out"})
+            return
+
         try:
-            # DỮ LIỆU ĐÃ CÓ → DÙNG NGAY
-            if data is None:
-                data = asyncio.run(
-                    search_entries(team_id=self.team_id, filters={
-                                   "movement_type": "out"})
-                )
-
-            table = self.ui.output_data_tablewidget
+            table = self.ui.output_data_tableView
+            self.table_model.set_rows(
+                data, has_more=self.next_cursor is not None)
             if not data:
-                table.setRowCount(0)
                 self.clear_form()
                 return
 
-            headers = list(data[0].keys())
-            table.setColumnCount(len(headers))
-            table.setHorizontalHeaderLabels(headers)
-            table.setRowCount(len(data))
-
-            # LƯU INDEX CỘT
-            self.col_indices = {}
-            for c, h in enumerate(headers):
-                self.col_indices[h] = c
-
-            # ĐỔ DỮ LIỆU
-            for r, row in enumerate(data):
-                for c, key in enumerate(headers):
-                    value = row.get(key, "")
-                    if isinstance(value, list):
-                        value = ", ".join([str(v)
-                                          for v in value]) if value else ""
-                    table.setItem(r, c, QTableWidgetItem(str(value)))
-
             table.resizeColumnsToContents()
 
             # TỰ ĐỘNG CHỌN DÒNG ĐẦU
-            if table.rowCount() > 0:
+            if self.table_proxy.rowCount() > 0:
                 table.selectRow(0)
-                self.on_output_row_selected(0, 0)
 
         except Exception as e:
             QMessageBox.critical(None, "Lỗi tải dữ liệu xuất", str(e))
 
+    def load_output_first_page(self, filters):
+        self.current_filters = filters
+        self.next_cursor = None
+        self.page_seq += 1
+        seq = self.page_seq
+        worker = AsyncWorker(search_entries_page, self.team_id, filters=filters)
+        worker.finished.connect(lambda page: self._on_output_first_page(seq, page))
+        worker.error.connect(lambda msg: self._on_output_first_page_failed(seq, msg))
+        worker.start()
+
+    def _on_output_first_page(self, seq, page):
+        if seq != self.page_seq:
+            return
+        self.next_cursor = page["next_cursor"]
+        self.load_output_table(page["rows"])
+
+    def _on_output_first_page_failed(self, seq, msg):
+        if seq == self.page_seq:
+            QMessageBox.critical(None, "Lỗi tải dữ liệu xuất", msg)
+
+    def load_output_next_page(self):
+        # Model gọi khi view cuộn hết các dòng đã tải (fetchMore)
+        if self.next_cursor is None:
+            self.table_model.fetch_failed()
+            return
+        seq = self.page_seq
+        worker = AsyncWorker(search_entries_page, self.team_id,
+                             filters=self.current_filters, after=self.next_cursor)
+        worker.finished.connect(lambda page: self._on_output_next_page(seq, page))
+        worker.error.connect(lambda msg: self._on_output_next_page_failed(seq, msg))
+        worker.start()
+
+    def _on_output_next_page(self, seq, page):
+        if seq != self.page_seq:
+            return
+        self.next_cursor = page["next_cursor"]
+        self.table_model.append_rows(
+            page["rows"], has_more=self.next_cursor is not None)
+
+    def _on_output_next_page_failed(self, seq, msg):
+        if seq != self.page_seq:
+            return
+        self.table_model.fetch_failed()
+        QMessageBox.critical(None, "Lỗi tải dữ liệu xuất", msg)
+
+    def apply_change(self, changes):
+        # Thay đổi từ client khác (modules/change_feed.py) → sửa bảng tại chỗ
+        if changes.get("reload"):
+            self.load_output_first_page(self.current_filters)
+            return
+        self.table_model.remove_keys("id", changes["deleted"])
+        rows = [r for r in changes["upserted"] if r["movement_type"] == "out"]
+        missing = self.table_model.update_rows(rows, "id")
+        if missing and set(self.current_filters) == {"movement_type"}:
+            self.table_model.insert_rows_at(0, missing)
+
     def search_output_items(self):
         filters = {"movement_type": "out"}
         if self.ui.output_search_component_id_checkBox.isChecked():
@@ -319,43 +421,24 @@ class OutputTabController(QObject):
             note = self.ui.output_note_textedit.toPlainText().strip()
             if note:
                 filters["note_contains"] = note
-        self.load_output_table(asyncio.run(
-            search_entries(self.team_id, filters=filters)))
+        self.load_output_first_page(filters)
 
     def export_to_excel(self):
-        path, _ = QFileDialog.getSaveFileName(
-            None, "Xuất Excel", "", "Excel Files (*.xlsx)")
-        if not path:
-            return
-        try:
-            import pandas as pd
-            table = self.ui.output_data_tablewidget
-            headers = [table.horizontalHeaderItem(
-                c).text() for c in range(table.columnCount())]
-            data = [[table.item(r, c).text() if table.item(r, c) else "" for c in range(table.columnCount())]
-                    for r in range(table.rowCount())]
-            pd.DataFrame(data, columns=headers).to_excel(path, index=False)
-            QMessageBox.information(None, "Xuất Excel", f"Đã lưu: {path}")
-        except Exception as e:
-            QMessageBox.critical(None, "Lỗi", str(e))
+        # Xuất thẳng từ DB với bộ lọc đang xem (modules/export.py)
+        self._export_dialog = start_export(
+            self.ui, "entries", self.team_id, self.current_filters, "xuat_kho")
 
     # =========================================================
     # KHI CHỌN DÒNG TRONG BẢNG XUẤT
     # =========================================================
     def on_output_row_selected(self, row, col):
-        if row < 0 or not hasattr(self, 'col_indices'):
+        if row < 0:
             self.clear_form()
             return
 
         try:
-            table = self.ui.output_data_tablewidget
-
             def get_value(col_name):
-                col = self.col_indices.get(col_name)
-                if col is None:
-                    return ""
-                item = table.item(row, col)
-                return item.text() if item else ""
+                return self.table_model.text(row, col_name)
 
             # === LẤY DỮ LIỆU ===
             component_id = get_value("component_id")
@@ -425,9 +508,18 @@ class OutputTabController(QObject):
             self.ui.output_check_id_auto_checkBox.setChecked(False)
             return
 
+        worker = AsyncWorker(get_component_info_from_stock, self.team_id, cid)
+        worker.finished.connect(lambda info: self._fill_from_stock(cid, info))
+        worker.error.connect(self._fill_from_stock_failed)
+        worker.start()
+
+    def _fill_from_stock_failed(self, msg):
+        print(f"[OUTPUT] auto fill lỗi: {msg}")
+        self.ui.output_check_id_auto_checkBox.setChecked(False)
+        QMessageBox.critical(None, "Lỗi", msg)
+
+    def _fill_from_stock(self, cid, info):
         try:
-            info = asyncio.run(
-                get_component_info_from_stock(self.team_id, cid))
             if not info:
                 QMessageBox.warning(None, "Không tồn kho",
                                     f"Không có mã: {cid}")
@@ -465,6 +557,7 @@ class OutputTabController(QObject):
             image_path = os.path.join(
                 self.input_controller.image_folder, f"{cid}.jpg")
             self.display_image(image_path)
+            self.prefetch_neighbour_images()
 
             self.ui.output_quantity_lineedit.setFocus()
 
@@ -477,13 +570,11 @@ class OutputTabController(QObject):
     # TÍNH TỒN KHO (KHÔNG DÙNG TRONG UI)
     # =========================================================
     def calculate_current_stock(self, component_id: str) -> float:
+        # Đọc 1 dòng stock_balance (trigger giữ tồn đã có dấu in/out) thay vì
+        # cộng lại mọi giao dịch của mã
         try:
-            all_entries = asyncio.run(search_entries(
-                team_id=self.team_id,
-                filters={"component_id_exact": component_id}
-            ))
-            total = sum(row.get("quantity", 0) for row in all_entries)
-            return max(0, total)
+            info = run_async(get_component_info_from_stock(self.team_id, component_id))
+            return max(0.0, float(info["current_quantity"])) if info else 0.0
         except Exception as e:
             print(f"[STOCK] Lỗi tính tồn: {e}")
             return 0.0
@@ -0,0 +1,181 @@
+# warehouse_app/modules/ui/pick_list_dialog.py
+"""
+HỘP THOẠI PICK LIST – quét / nhập nhiều mã rồi xuất 1 lần
+(ghi qua modules/pick_list.py trong 1 transaction)
+"""
+from collections import OrderedDict
+from typing import Any, Dict
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QSpinBox, QPushButton,
+    QTableWidget, QTableWidgetItem, QLabel, QMessageBox, QAbstractItemView,
+    QHeaderView
+)
+from PySide6.QtCore import Qt, Signal
+from PySide6.QtGui import QColor
+
+from modules.pick_list import check_pick_list, issue_pick_list
+from modules.async_worker import AsyncWorker
+
+COLUMNS = ["Mã", "Tên linh kiện", "SL xuất", "Tồn", "Vị trí"]
+
+
+class PickListDialog(QDialog):
+    issued = Signal(dict)  # kết quả issue_pick_list
+
+    def __init__(self, team_id: int, user_id: int, parent=None):
+        super().__init__(parent)
+        self.team_id = team_id
+        self.user_id = user_id
+        self.lines: "OrderedDict[str, int]" = OrderedDict()
+        self.check_worker = None
+        self.check_seq = 0
+
+        self.setWindowTitle("Xuất kho nhiều mã (Pick list)")
+        self.resize(720, 480)
+        layout = QVBoxLayout(self)
+
+        # === Quét mã ===
+        scan_row = QHBoxLayout()
+        self.scan_edit = QLineEdit()
+        self.scan_edit.setPlaceholderText("Quét / nhập mã linh kiện rồi Enter")
+        self.qty_spin = QSpinBox()
+        self.qty_spin.setRange(1, 1_000_000)
+        self.add_button = QPushButton("➕ Thêm")
+        scan_row.addWidget(self.scan_edit, 1)
+        scan_row.addWidget(QLabel("SL:"))
+        scan_row.addWidget(self.qty_spin)
+        scan_row.addWidget(self.add_button)
+        layout.addLayout(scan_row)
+
+        # === Danh sách dòng ===
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table, 1)
+
+        self.note_edit = QLineEdit()
+        self.note_edit.setPlaceholderText("Ghi chú chung cho các phiếu xuất")
+        layout.addWidget(self.note_edit)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        button_row = QHBoxLayout()
+        self.remove_button = QPushButton("Xóa dòng")
+        self.issue_button = QPushButton("💾 Xuất tất cả")
+        self.cancel_button = QPushButton("❌ Cancel")
+        button_row.addWidget(self.remove_button)
+        button_row.addStretch(1)
+        button_row.addWidget(self.issue_button)
+        button_row.addWidget(self.cancel_button)
+        layout.addLayout(button_row)
+
+        self.scan_edit.returnPressed.connect(self.add_line)
+        self.add_button.clicked.connect(self.add_line)
+        self.remove_button.clicked.connect(self.remove_selected)
+        self.issue_button.clicked.connect(self.issue_all)
+        self.cancel_button.clicked.connect(self.reject)
+        self.issue_button.setEnabled(False)
+
+    # =====================================================
+    # Thêm / xóa dòng
+    # =====================================================
+    def add_line(self):
+        cid = self.scan_edit.text().strip().upper()
+        if not cid:
+            return
+        # Quét lại cùng mã → cộng dồn số lượng
+        self.lines[cid] = self.lines.get(cid, 0) + self.qty_spin.value()
+        self.scan_edit.clear()
+        self.qty_spin.setValue(1)
+        self.scan_edit.setFocus()
+        self.refresh_lines()
+
+    def remove_selected(self):
+        row = self.table.currentRow()
+        if row < 0:
+            return
+        cid = self.table.item(row, 0).text()
+        self.lines.pop(cid, None)
+        self.refresh_lines()
+
+    # =====================================================
+    # Kiểm tra tồn (1 query cho cả danh sách)
+    # =====================================================
+    def refresh_lines(self):
+        self.issue_button.setEnabled(False)
+        if not self.lines:
+            self._show_lines([])
+            return
+        self.check_seq += 1
+        seq = self.check_seq
+        self.check_worker = AsyncWorker(
+            check_pick_list, self.team_id, list(self.lines.items()))
+        self.check_worker.finished.connect(
+            lambda result: self._on_checked(seq, result))
+        self.check_worker.error.connect(
+            lambda msg: self.status_label.setText(f"Lỗi kiểm tra tồn: {msg}"))
+        self.check_worker.start()
+
+    def _on_checked(self, seq: int, result: Dict[str, Any]):
+        if seq != self.check_seq:
+            return  # đã thêm / xóa dòng sau lần kiểm tra này
+        self._show_lines(result["lines"])
+        shortages = result["shortages"]
+        if shortages:
+            self.status_label.setText(
+                f"⚠ {len(shortages)} mã không đủ tồn – sửa trước khi xuất")
+        else:
+            self.status_label.setText(
+                f"{len(result['lines'])} mã, tổng {sum(self.lines.values())}")
+        self.issue_button.setEnabled(bool(result["lines"]) and not shortages)
+
+    def _show_lines(self, lines):
+        self.table.setRowCount(len(lines))
+        for r, line in enumerate(lines):
+            values = [line["component_id"], line["component_name"] or "-",
+                      line["requested"], line["available"],
+                      line["storage_location"] or ""]
+            for c, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if c in (2, 3):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                if not line["ok"]:
+                    item.setBackground(QColor("#fde2e2"))
+                self.table.setItem(r, c, item)
+        if not lines:
+            self.status_label.setText("")
+
+    # =====================================================
+    # Xuất
+    # =====================================================
+    def issue_all(self):
+        if not self.lines:
+            return
+        total = sum(self.lines.values())
+        if QMessageBox.question(
+                self, "Xác nhận",
+                f"Xuất {len(self.lines)} mã (tổng {total})?") != QMessageBox.Yes:
+            return
+        self.issue_button.setEnabled(False)
+        worker = AsyncWorker(issue_pick_list, self.team_id,
+                             list(self.lines.items()), self.user_id,
+                             self.note_edit.text().strip())
+        worker.finished.connect(self._after_issue)
+        worker.error.connect(self._issue_failed)
+        worker.start()
+
+    def _after_issue(self, result: Dict[str, Any]):
+        self.issued.emit(result)
+        QMessageBox.information(
+            self, "Thành công",
+            f"Đã xuất {result['rows']} mã trong {result['seconds']:.2f}s.")
+        self.accept()
+
+    def _issue_failed(self, msg: str):
+        QMessageBox.critical(self, "Lỗi xuất kho", msg)
+        self.refresh_lines()  # tồn có thể vừa đổi → kiểm tra lại
@@ -0,0 +1,180 @@
+# warehouse_app/modules/ui/report_tab.py
+"""
+TAB "BÁO CÁO" (ADMIN / MANAGER)
+Tiêu hao / nhập theo tuần hoặc tháng, theo linh kiện / process / model /
+group / material – đọc bảng tổng hợp entry_rollups (modules/rollups.py),
+xoay thành bảng: mỗi dòng 1 giá trị, mỗi cột 1 kỳ, cột cuối = tổng.
+"""
+from datetime import timedelta
+
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox, QLabel,
+    QDateEdit, QTableWidget, QTableWidgetItem, QAbstractItemView, QMessageBox
+)
+from PySide6.QtCore import Qt, QDate
+
+from modules.async_worker import AsyncWorker
+from modules.rollups import GRAINS, DIMENSIONS, get_rollup, refresh_rollups
+
+METRICS = {
+    "out_qty": "Xuất (tiêu hao)",
+    "in_qty": "Nhập",
+    "adj_qty": "Điều chỉnh",
+    "entries": "Số phiếu",
+}
+DEFAULT_WEEKS = 12
+
+
+def _number_item(value) -> QTableWidgetItem:
+    item = QTableWidgetItem()
+    item.setData(Qt.DisplayRole, int(value))
+    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+    return item
+
+
+class ReportTab(QWidget):
+    def __init__(self, team_id, parent=None):
+        super().__init__(parent)
+        self.team_id = team_id
+        self.rows = []
+        # Kỳ / chiều của self.rows (lúc bấm "Xem"), không phải giá trị combo hiện tại
+        self.rows_grain = "M"
+        self.rows_dimension = ""
+        self._worker = None
+        layout = QVBoxLayout(self)
+
+        top = QHBoxLayout()
+        self.grain_combo = QComboBox()
+        for key, label in GRAINS.items():
+            self.grain_combo.addItem(label, key)
+        self.dimension_combo = QComboBox()
+        for key, label in DIMENSIONS.items():
+            self.dimension_combo.addItem(label, key)
+        self.metric_combo = QComboBox()
+        for key, label in METRICS.items():
+            self.metric_combo.addItem(label, key)
+
+        today = QDate.currentDate()
+        self.from_edit = QDateEdit(today.addDays(-7 * DEFAULT_WEEKS))
+        self.to_edit = QDateEdit(today)
+        for edit in (self.from_edit, self.to_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+
+        self.view_button = QPushButton("📊 Xem")
+        self.refresh_button = QPushButton("🔄 Tính lại")
+        self.refresh_button.setToolTip("Cập nhật tổng hợp từ các phiếu mới (thường tự chạy định kỳ)")
+
+        for widget in (QLabel("Kỳ:"), self.grain_combo, QLabel("Theo:"), self.dimension_combo,
+                       QLabel("Số liệu:"), self.metric_combo, QLabel("Từ:"), self.from_edit,
+                       QLabel("Đến:"), self.to_edit, self.view_button, self.refresh_button):
+            top.addWidget(widget)
+        top.addStretch(1)
+        layout.addLayout(top)
+
+        self.table = QTableWidget(0, 0)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table, 1)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        self.view_button.clicked.connect(self.load)
+        self.refresh_button.clicked.connect(self.refresh)
+        # Đổi số liệu chỉ xoay lại dữ liệu đã tải, không query
+        self.metric_combo.currentIndexChanged.connect(self.render)
+
+    # -------------------------------------------------------------
+    # Tải
+    # -------------------------------------------------------------
+    def _period_range(self):
+        date_from = self.from_edit.date().toPython()
+        date_to = self.to_edit.date().toPython()
+        # Kỳ chứa ngày "Từ" cũng được tính (period_start có thể trước ngày đó)
+        if self.grain_combo.currentData() == "W":
+            date_from -= timedelta(days=date_from.weekday())
+        else:
+            date_from = date_from.replace(day=1)
+        return date_from, date_to
+
+    def load(self):
+        date_from, date_to = self._period_range()
+        grain = self.grain_combo.currentData()
+        dimension = self.dimension_combo.currentText()
+        self._set_busy(True, "Đang tải...")
+        self._worker = AsyncWorker(
+            get_rollup, self.team_id, grain,
+            self.dimension_combo.currentData(), date_from, date_to)
+        self._worker.finished.connect(
+            lambda rows: self._on_loaded(rows, grain, dimension))
+        self._worker.error.connect(self._on_error)
+        self._worker.start()
+
+    def refresh(self):
+        self._set_busy(True, "Đang tính lại tổng hợp...")
+        self._worker = AsyncWorker(refresh_rollups)
+        self._worker.finished.connect(self._on_refreshed)
+        self._worker.error.connect(self._on_error)
+        self._worker.start()
+
+    def _on_refreshed(self, result):
+        if result.get("error"):
+            self._on_error(result["error"])
+            return
+        self.load()
+
+    def _on_loaded(self, rows, grain, dimension):
+        self.rows = rows or []
+        self.rows_grain = grain
+        self.rows_dimension = dimension
+        self._set_busy(False, "")
+        self.render()
+
+    def _on_error(self, msg):
+        self._set_busy(False, "")
+        QMessageBox.critical(self, "Lỗi báo cáo", msg)
+
+    def _set_busy(self, busy, text):
+        self.view_button.setEnabled(not busy)
+        self.refresh_button.setEnabled(not busy)
+        self.status_label.setText(text)
+
+    # -------------------------------------------------------------
+    # Xoay bảng: dòng = giá trị, cột = kỳ
+    # -------------------------------------------------------------
+    def render(self):
+        metric = self.metric_combo.currentData()
+        monthly = self.rows_grain == "M"
+        periods = sorted({r["period_start"] for r in self.rows})
+        col_of = {p: i for i, p in enumerate(periods)}
+        pivot = {}
+        labels = {}
+        for r in self.rows:
+            values = pivot.setdefault(r["dim_value"], [0] * len(periods))
+            values[col_of[r["period_start"]]] += r[metric]
+            if r.get("label"):
+                labels[r["dim_value"]] = r["label"]
+        # Nhiều nhất lên đầu
+        ordered = sorted(pivot.items(), key=lambda kv: -sum(kv[1]))
+
+        headers = [self.rows_dimension, "Tên"] + [
+            p.strftime("%Y-%m") if monthly else p.strftime("%d/%m/%Y") for p in periods
+        ] + ["Tổng"]
+        self.table.setSortingEnabled(False)
+        self.table.clear()
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setRowCount(len(ordered))
+        for row, (value, counts) in enumerate(ordered):
+            self.table.setItem(row, 0, QTableWidgetItem(value))
+            self.table.setItem(row, 1, QTableWidgetItem(labels.get(value, "")))
+            for c, n in enumerate(counts):
+                self.table.setItem(row, 2 + c, _number_item(n))
+            self.table.setItem(row, 2 + len(counts), _number_item(sum(counts)))
+        self.table.setColumnHidden(1, not labels)
+        self.table.setSortingEnabled(True)
+        self.table.resizeColumnsToContents()
+        self.status_label.setText(
+            f"{len(ordered)} dòng × {len(periods)} kỳ – {self.metric_combo.currentText()}")
@@ -0,0 +1,322 @@
+# warehouse_app/modules/ui/table_model.py
+"""
+MODEL BẢNG DÙNG CHUNG CHO INPUT / OUTPUT / INVENTORY
+- Lưu dữ liệu theo CỘT (mỗi cột 1 list giá trị thô) → không tạo
+  QStandardItem / QTableWidgetItem cho từng ô
+- Định dạng chuỗi khi view cần vẽ (data()), chỉ cho các ô đang hiển thị
+- fetchMore(): lộ dần từng khúc dòng đã tải; hết thì gọi fetcher để lấy
+  trang tiếp theo từ DB (phân trang keyset – modules/search.py)
+- Sắp xếp qua RecordSortProxy (so sánh giá trị thô, không so chuỗi)
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+from PySide6.QtCore import (
+    QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt
+)
+from PySide6.QtWidgets import QAbstractItemView, QTableView
+
+from config.settings import THUMB_PREFETCH_RADIUS
+
+SORT_ROLE = Qt.UserRole + 1
+FETCH_CHUNK = 500  # số dòng lộ thêm mỗi lần view cuộn tới cuối
+
+
+def format_value(key: str, value: Any) -> str:
+    if value is None:
+        return "0" if key == "current_quantity" else ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if key == "current_quantity":
+        return str(int(value))
+    return str(value)
+
+
+def _sort_key(value: Any):
+    # None coi như chuỗi rỗng, list so theo chuỗi đã nối
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    return value
+
+
+class RecordTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.headers: List[str] = []
+        self.col_indices: Dict[str, int] = {}
+        self._columns: List[list] = []     # _columns[c][r]
+        self._loaded = 0                   # số dòng đã có trong bộ nhớ
+        self._visible = 0                  # số dòng đã báo cho view
+        self._has_more = False             # DB còn trang sau
+        self._fetch_pending = False
+        self._fetcher: Optional[Callable[[], None]] = None
+        self._highlight: Optional[tuple] = None   # (cột, {giá trị: QColor})
+
+    # -------------------------------------------------------------
+    # Nạp dữ liệu
+    # -------------------------------------------------------------
+    def set_fetcher(self, fetcher: Optional[Callable[[], None]]):
+        """fetcher() tải trang kế tiếp rồi gọi append_rows(rows, has_more)."""
+        self._fetcher = fetcher
+
+    def set_highlight(self, key: str, colors: Dict[Any, Any]):
+        """Tô nền cả dòng theo giá trị cột key (vd. cờ đặt hàng lại)."""
+        self._highlight = (key, colors)
+
+    def set_rows(self, rows: List[Dict[str, Any]], has_more: bool = False):
+        self.beginResetModel()
+        self.headers = list(rows[0].keys()) if rows else []
+        self.col_indices = {h: i for i, h in enumerate(self.headers)}
+        self._columns = [[row.get(h) for row in rows] for h in self.headers]
+        self._loaded = len(rows)
+        self._visible = min(self._loaded, FETCH_CHUNK)
+        self._has_more = has_more
+        self._fetch_pending = False
+        self.endResetModel()
+
+    def append_rows(self, rows: List[Dict[str, Any]], has_more: bool = False):
+        self._fetch_pending = False
+        self._has_more = has_more
+        if not rows:
+            return
+        if not self.headers:
+            self.set_rows(rows, has_more)
+            return
+        for c, h in enumerate(self.headers):
+            self._columns[c].extend(row.get(h) for row in rows)
+        self._loaded += len(rows)
+        self._expose(FETCH_CHUNK)
+
+    def fetch_failed(self):
+        self._fetch_pending = False
+
+    # -------------------------------------------------------------
+    # Cập nhật tại chỗ (modules/change_feed.py)
+    # -------------------------------------------------------------
+    def find_row(self, key: str, value: Any) -> int:
+        c = self.col_indices.get(key)
+        if c is None:
+            return -1
+        try:
+            return self._columns[c].index(value)
+        except ValueError:
+            return -1
+
+    def update_rows(self, rows: List[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+        """Ghi đè các dòng đã có (theo key), trả về các dòng chưa có."""
+        c_key = self.col_indices.get(key)
+        if c_key is None:
+            return list(rows)
+        positions = {v: r for r, v in enumerate(self._columns[c_key])}
+        missing = []
+        for row in rows:
+            r = positions.get(row.get(key))
+            if r is None:
+                missing.append(row)
+                continue
+            for c, h in enumerate(self.headers):
+                if h in row:
+                    self._columns[c][r] = row[h]
+            if r < self._visible:
+                self.dataChanged.emit(self.index(r, 0),
+                                      self.index(r, len(self.headers) - 1))
+        return missing
+
+    def insert_rows_at(self, position: int, rows: List[Dict[str, Any]]):
+        """Chèn dòng mới (vd. phiếu mới nhất lên đầu)."""
+        if not rows:
+            return
+        if not self.headers:
+            self.set_rows(rows)
+            return
+        position = max(0, min(position, self._visible))
+        self.beginInsertRows(QModelIndex(), position, position + len(rows) - 1)
+        for c, h in enumerate(self.headers):
+            self._columns[c][position:position] = [row.get(h) for row in rows]
+        self._loaded += len(rows)
+        self._visible += len(rows)
+        self.endInsertRows()
+
+    def remove_keys(self, key: str, values) -> int:
+        c_key = self.col_indices.get(key)
+        if c_key is None:
+            return 0
+        values = set(values)
+        removed = 0
+        # Xóa từ dưới lên để chỉ số các dòng phía trên không đổi
+        for r in range(self._loaded - 1, -1, -1):
+            if self._columns[c_key][r] not in values:
+                continue
+            visible = r < self._visible
+            if visible:
+                self.beginRemoveRows(QModelIndex(), r, r)
+            for col in self._columns:
+                del col[r]
+            self._loaded -= 1
+            if visible:
+                self._visible -= 1
+                self.endRemoveRows()
+            removed += 1
+        return removed
+
+    def _expose(self, count: int):
+        new_visible = min(self._loaded, self._visible + count)
+        if new_visible <= self._visible:
+            return
+        self.beginInsertRows(QModelIndex(), self._visible, new_visible - 1)
+        self._visible = new_visible
+        self.endInsertRows()
+
+    # -------------------------------------------------------------
+    # Truy cập theo dòng (dùng cho form chi tiết / xuất file)
+    # -------------------------------------------------------------
+    def value(self, row: int, key: str, default: Any = None) -> Any:
+        c = self.col_indices.get(key)
+        if c is None or not 0 <= row < self._loaded:
+            return default
+        return self._columns[c][row]
+
+    def values(self, key: str) -> list:
+        """Toàn bộ giá trị đã tải của 1 cột."""
+        c = self.col_indices.get(key)
+        return [] if c is None else self._columns[c][:self._loaded]
+
+    def text(self, row: int, key: str, default: str = "") -> str:
+        c = self.col_indices.get(key)
+        if c is None or not 0 <= row < self._loaded:
+            return default
+        return format_value(key, self._columns[c][row])
+
+    def iter_text_rows(self):
+        """Toàn bộ dòng đã tải (kể cả chưa hiển thị) dạng chuỗi."""
+        for r in range(self._loaded):
+            yield [format_value(h, self._columns[c][r])
+                   for c, h in enumerate(self.headers)]
+
+    # -------------------------------------------------------------
+    # QAbstractTableModel
+    # -------------------------------------------------------------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._visible
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            c = index.column()
+            return format_value(self.headers[c], self._columns[c][index.row()])
+        if role == SORT_ROLE:
+            return self._columns[index.column()][index.row()]
+        if role == Qt.BackgroundRole and self._highlight is not None:
+            key, colors = self._highlight
+            c = self.col_indices.get(key)
+            if c is not None:
+                return colors.get(self._columns[c][index.row()])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return section + 1
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._visible < self._loaded or (
+            self._has_more and self._fetcher is not None and not self._fetch_pending)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        if self._visible < self._loaded:
+            self._expose(FETCH_CHUNK)
+        elif self._has_more and self._fetcher is not None and not self._fetch_pending:
+            self._fetch_pending = True
+            self._fetcher()
+
+
+class RecordSortProxy(QSortFilterProxyModel):
+    """Sắp xếp theo giá trị thô (số, ngày) thay vì chuỗi hiển thị."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(SORT_ROLE)
+
+    def lessThan(self, left, right):
+        a = _sort_key(self.sourceModel().data(left, SORT_ROLE))
+        b = _sort_key(self.sourceModel().data(right, SORT_ROLE))
+        try:
+            return a < b
+        except TypeError:
+            return str(a) < str(b)
+
+
+# ----------------------------------------------------------------------
+# Tiện ích gắn model vào view
+# ----------------------------------------------------------------------
+def attach_record_model(view: QTableView, parent=None):
+    """Tạo model + proxy sắp xếp cho view, trả về (model, proxy)."""
+    model = RecordTableModel(parent)
+    proxy = RecordSortProxy(parent)
+    proxy.setSourceModel(model)
+    view.setModel(proxy)
+    # giữ thứ tự từ DB đến khi người dùng bấm header
+    view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+    view.setSortingEnabled(True)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    view.setSelectionMode(QAbstractItemView.SingleSelection)
+    return model, proxy
+
+
+def replace_table_widget(old) -> QTableView:
+    """Thay QTableWidget (file .ui) bằng QTableView cùng vị trí / style."""
+    view = QTableView(old.parentWidget())
+    view.setObjectName(old.objectName())
+    # selector "QTableWidget" trong stylesheet của Designer → QTableView
+    view.setStyleSheet(old.styleSheet().replace("QTableWidget", "QTableView"))
+    view.setFont(old.font())
+    view.setSizePolicy(old.sizePolicy())
+    view.setMinimumSize(old.minimumSize())
+    view.setAlternatingRowColors(old.alternatingRowColors())
+    layout = old.parentWidget().layout() if old.parentWidget() else None
+    if layout is not None:
+        layout.replaceWidget(old, view)
+    else:
+        view.setGeometry(old.geometry())
+    old.deleteLater()
+    return view
+
+
+def source_row(proxy: QSortFilterProxyModel, index) -> int:
+    """Dòng trong model gốc ứng với index của view (-1 nếu không có)."""
+    if index is None or not index.isValid():
+        return -1
+    return proxy.mapToSource(index).row()
+
+
+def neighbour_rows(view: QTableView, proxy: QSortFilterProxyModel,
+                   radius: int = THUMB_PREFETCH_RADIUS) -> List[int]:
+    """Dòng gốc của các dòng ngay trên/dưới dòng đang chọn (theo thứ tự hiển thị)."""
+    current = view.currentIndex()
+    if not current.isValid():
+        return []
+    rows = []
+    for offset in range(1, radius + 1):
+        for r in (current.row() + offset, current.row() - offset):
+            if 0 <= r < proxy.rowCount():
+                rows.append(source_row(proxy, proxy.index(r, 0)))
+    return rows
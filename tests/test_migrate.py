@@ -0,0 +1,67 @@
+# warehouse_app/tests/test_migrate.py
+"""Tách câu lệnh, nhận diện CREATE INDEX CONCURRENTLY, nạp file (db/migrate.py)."""
+import pytest
+
+pytest.importorskip("asyncpg")  # db.migrate import db.pool
+
+from db.migrate import (
+    MigrationError, NO_TRANSACTION_MARK, _INDEX_RE, load_migrations, split_statements,
+)
+
+
+def test_split_dollar_quoted_body():
+    sql = """
+        CREATE FUNCTION f() RETURNS INTEGER AS $$ SELECT 1; $$ LANGUAGE sql;
+        DO $body$ BEGIN PERFORM 1; END $body$;
+        SELECT $1;
+    """
+    assert split_statements(sql) == [
+        "CREATE FUNCTION f() RETURNS INTEGER AS $$ SELECT 1; $$ LANGUAGE sql",
+        "DO $body$ BEGIN PERFORM 1; END $body$",
+        "SELECT $1",
+    ]
+
+
+def test_split_doubled_quotes():
+    sql = """SELECT 'it''s; fine'; SELECT "a"";b" FROM t;"""
+    assert split_statements(sql) == ["SELECT 'it''s; fine'", 'SELECT "a"";b" FROM t']
+
+
+def test_split_skips_comments():
+    sql = "-- a; b\nSELECT 1; /* c; d */ SELECT 2;\n-- cuối file"
+    assert [s.split() for s in split_statements(sql)] == [["SELECT", "1"], ["SELECT", "2"]]
+
+
+def test_split_e_string_backslash_escape():
+    sql = r"SELECT E'x\'; y'; SELECT E'\\'; SELECT 'a\'; SELECT note'"
+    assert split_statements(sql) == [
+        r"SELECT E'x\'; y'", r"SELECT E'\\'", r"SELECT 'a\'", "SELECT note'",
+    ]
+
+
+def test_index_re():
+    m = _INDEX_RE.match(
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON inventory_entries (team_id, id)")
+    assert m and m.group("unique") and m.group("name") == "idx_a"
+    assert m.group("table") == "inventory_entries"
+    assert m.group("rest") == "(team_id, id)"
+    assert _INDEX_RE.match("CREATE INDEX idx_b ON t (a)") is None
+
+
+def test_load_migrations(tmp_path):
+    (tmp_path / "0002_b.sql").write_text(f"{NO_TRANSACTION_MARK}\nSELECT 2;", encoding="utf-8")
+    (tmp_path / "0001_a.sql").write_text("SELECT 1;\r\n", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("x", encoding="utf-8")
+    migrations = load_migrations(str(tmp_path))
+    assert [(m.version, m.name, m.transactional) for m in migrations] == [
+        (1, "a", True), (2, "b", False)]
+    assert migrations[0].sql == "SELECT 1;\n"  # CRLF → LF, checksum không đổi theo máy
+
+    (tmp_path / "0002_c.sql").write_text("SELECT 3;", encoding="utf-8")
+    with pytest.raises(MigrationError):
+        load_migrations(str(tmp_path))
+
+
+def test_repo_migrations_load():
+    versions = [m.version for m in load_migrations()]
+    assert versions == sorted(versions) and versions[0] == 1
@@ -0,0 +1,24 @@
+# warehouse_app/tests/test_name_index.py
+"""NameIndex: thêm tên sau lần nạp ban đầu (modules/name_index.py)."""
+import pytest
+
+pytest.importorskip("asyncpg")  # modules.name_index import db.pool
+
+from modules.name_index import NameIndex
+
+
+def test_add_after_load_is_not_duplicated():
+    index = NameIndex(["Bolt", "Cam bien"])
+    assert index.add("Zulu")
+    assert index.search("zu") == ["Zulu"]
+
+
+def test_add_after_load_keeps_prefix_order():
+    index = NameIndex(["Bolt", "Cam bien"])
+    for name in ("Zulu", "Cảm Biến Đo", "Bạc đạn", "Zeta"):
+        index.add(name)
+    assert not index.add("Zulu")
+    assert index.search("b")[:2] == ["Bạc đạn", "Bolt"]  # tiền tố trước
+    assert index.search("cam") == ["Cam bien", "Cảm Biến Đo"]
+    assert index.search("z") == ["Zeta", "Zulu"]
+    assert len(index) == 6